@@ -0,0 +1,93 @@
+"""Shows the circuit breaker and hedged requests against a faulty stub, offline.
+
+Two scenarios run against ``StubServer`` with injected faults:
+
+* a geocoder that hangs past the read timeout, measured through
+  get_current_time with the circuit breaker off and on;
+* a forecast API with a slow tail, measured through the forecast fetch with
+  hedging off and on.
+
+Run from the city-assistant directory:
+
+    python -m benchmarks.bench_breaker --calls 40
+"""
+import argparse
+import os
+import time
+
+from city_assistant.tools import http_client
+from city_assistant.tools.circuit_breaker import breaker_stats, reset_breakers
+from city_assistant.tools.forecast import ForecastFetcher
+from city_assistant.tools.http_client import HttpClient
+from city_assistant.tools.tools import get_current_time
+
+from .stats import latency_summary
+from .stub_server import StubServer
+
+WARMUP_CALLS = 30
+
+
+def _summary(latencies: list, requests_made: int) -> dict:
+    return dict(calls=len(latencies), **latency_summary(latencies), upstream_requests=requests_made)
+
+
+def _use_client(client: HttpClient) -> None:
+    reset_breakers()
+    http_client.set_http_client(client)
+
+
+def _geocoder_down(stub: StubServer, calls: int, circuit_breaker: bool) -> dict:
+    # Unknown to the offline gazetteer, so every call goes to the geocoder.
+    _use_client(HttpClient(host_timeouts={"127.0.0.1": (0.5, 0.5)}, circuit_breaker=circuit_breaker))
+    requests_before = stub.request_count
+    latencies = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        get_current_time("Smallville")
+        latencies.append(time.perf_counter() - started)
+    return _summary(latencies, stub.request_count - requests_before)
+
+
+def _forecast_tail(stub: StubServer, calls: int, hedge: bool) -> dict:
+    _use_client(HttpClient(hedge=hedge))
+    fetcher = ForecastFetcher(freshness_seconds=0, stale_seconds=0)
+    # Collect the latency samples the hedging delay is based on.
+    for i in range(WARMUP_CALLS):
+        fetcher.get_forecast("stub-key", -10 - i * 0.01, 20)
+    requests_before = stub.request_count
+    latencies = []
+    for i in range(calls):
+        started = time.perf_counter()
+        # Distinct coordinates so that nothing is served from the cache.
+        fetcher.get_forecast("stub-key", 10 + i * 0.01, 20)
+        latencies.append(time.perf_counter() - started)
+    return _summary(latencies, stub.request_count - requests_before)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=40)
+    args = parser.parse_args()
+
+    with StubServer() as stub:
+        os.environ["GEOCODE_BASE_URL"] = stub.url
+        os.environ["PIRATE_WEATHER_BASE_URL"] = stub.url
+        os.environ["GEOCODE_CACHE_PATH"] = ""
+        # The stub has no quota; benchmarks.bench_rate_limit covers the limiter.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+        stub.inject_fault("/search", delay_seconds=1.0)
+        print(f"geocoder down, no breaker : {_geocoder_down(stub, args.calls, circuit_breaker=False)}")
+        print(f"geocoder down, breaker    : {_geocoder_down(stub, args.calls, circuit_breaker=True)}")
+        print(f"breaker stats             : {breaker_stats()}")
+        stub.clear_faults()
+
+        stub.inject_fault("/forecast", delay_seconds=0.3, slow_rate=0.04)
+        calls = max(args.calls, 200)
+        print(f"forecast tail, no hedging : {_forecast_tail(stub, calls, hedge=False)}")
+        print(f"forecast tail, hedging    : {_forecast_tail(stub, calls, hedge=True)}")
+        print(f"breaker stats             : {breaker_stats()}")
+
+
+if __name__ == "__main__":
+    main()
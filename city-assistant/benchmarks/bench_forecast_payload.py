@@ -0,0 +1,55 @@
+"""Measures forecast bytes and decode time with and without block exclusion.
+
+Fetches the same forecast from the local stub as a full document and with the
+``exclude`` parameter the fetcher sends, then times decoding (plus projection
+for the slim variant). Run from the city-assistant directory:
+
+    python -m benchmarks.bench_forecast_payload --iterations 2000
+"""
+import argparse
+import http.client
+import json
+import time
+
+from city_assistant.tools.forecast import EXCLUDED_BLOCKS, project_forecast
+
+from .stub_server import StubServer
+
+
+def _fetch(stub: StubServer, query: str) -> bytes:
+    host, port = stub.url.split("//", 1)[1].split(":")
+    connection = http.client.HTTPConnection(host, int(port))
+    connection.request("GET", f"/forecast/key/35.68,139.65{query}")
+    body = connection.getresponse().read()
+    connection.close()
+    return body
+
+
+def _decode_us(body: bytes, iterations: int, project: bool) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        payload = json.loads(body)
+        if project:
+            project_forecast(payload)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with StubServer() as stub:
+        full = _fetch(stub, "")
+        slim = _fetch(stub, f"?exclude={EXCLUDED_BLOCKS}")
+
+    results = {
+        "full": {"bytes": len(full), "decode_us": round(_decode_us(full, args.iterations, False), 2)},
+        "excluded": {"bytes": len(slim), "decode_us": round(_decode_us(slim, args.iterations, True), 2)},
+    }
+    results["bytes_saved_pct"] = round(100 * (1 - len(slim) / len(full)), 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
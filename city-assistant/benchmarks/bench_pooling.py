@@ -0,0 +1,50 @@
+"""Compares per-call ``requests.get`` with the pooled HttpClient, offline.
+
+Run from the city-assistant directory:
+
+    python -m benchmarks.bench_pooling --calls 500
+"""
+import argparse
+import time
+
+import requests
+
+from city_assistant.tools.http_client import HttpClient
+
+from .stub_server import StubServer
+
+
+def _run(stub: StubServer, get, calls: int) -> dict:
+    url = f"{stub.url}/search"
+    connections_before = stub.connection_count
+    started = time.perf_counter()
+    for _ in range(calls):
+        response = get(url, params={"q": "london"})
+        response.raise_for_status()
+        response.json()
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": calls,
+        "seconds": round(elapsed, 4),
+        "us_per_call": round(elapsed / calls * 1e6, 1),
+        "connections": stub.connection_count - connections_before,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    with StubServer() as stub:
+        unpooled = _run(stub, lambda url, params: requests.get(url, params=params, timeout=10), args.calls)
+        client = HttpClient()
+        pooled = _run(stub, client.get, args.calls)
+        client.close()
+
+    print(f"requests.get : {unpooled}")
+    print(f"HttpClient   : {pooled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Forecast throughput under a simulated per-key quota, offline.
+
+``StubServer`` limits each API key to ``--quota`` forecast requests per
+second. The same burst of forecast fetches, from ``--concurrency`` threads,
+then runs with:
+
+* no client-side limiter, so calls over the quota come back as 429s;
+* the limiter on one key, so calls queue for a token or fall back to cache;
+* the limiter spreading calls over two keys.
+
+Every location has a cached payload that is already past its freshness
+window, so each call goes upstream but has something to fall back to. For
+each run the benchmark reports fresh and cached answers, errors, the 429s the
+upstream sent and latency. Run from the city-assistant directory:
+
+    python -m benchmarks.bench_rate_limit --quota 20 --calls 200 --concurrency 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from city_assistant.tools import http_client
+from city_assistant.tools.circuit_breaker import reset_breakers
+from city_assistant.tools.forecast import ForecastFetcher, forecast_key, project_forecast
+from city_assistant.tools.http_client import HttpClient
+from city_assistant.tools.rate_limit import rate_limit_stats, reset_rate_limiters
+
+from .stats import latency_summary
+from .stub_server import StubServer, forecast_payload
+
+LOCATIONS = 50
+RUNS = {
+    "no limiter": {"RATE_LIMIT_ENABLED": "false"},
+    "limiter, 1 key": {"RATE_LIMIT_ENABLED": "true"},
+    "limiter, 2 keys": {"RATE_LIMIT_ENABLED": "true", "PIRATE_WEATHER_API_KEYS": "stub-key-2"},
+}
+
+
+def _locations() -> list:
+    return [(-30 + i * 0.5, 20 + i * 0.5) for i in range(LOCATIONS)]
+
+
+def _run(stub: StubServer, settings: dict, calls: int, concurrency: int) -> dict:
+    os.environ.update(settings)
+    if "PIRATE_WEATHER_API_KEYS" not in settings:
+        os.environ.pop("PIRATE_WEATHER_API_KEYS", None)
+    reset_rate_limiters()
+    reset_breakers()
+    http_client.set_http_client(HttpClient())
+    fetcher = ForecastFetcher(freshness_seconds=0, stale_seconds=0)
+    locations = _locations()
+    for lat, lon in locations:
+        fetcher.store(forecast_key(lat, lon), project_forecast(forecast_payload(lat, lon)))
+    # Start every run with a full quota on the server.
+    time.sleep(2)
+
+    latencies = [0.0] * calls
+
+    def call(i: int) -> str:
+        started = time.perf_counter()
+        try:
+            payload = fetcher.get_forecast("stub-key", *locations[i % len(locations)])
+            outcome = "cached" if "age_seconds" in payload else "fresh"
+        except Exception:
+            outcome = "error"
+        latencies[i] = time.perf_counter() - started
+        return outcome
+
+    before = stub.request_counts
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(call, range(calls)))
+    elapsed = time.perf_counter() - started
+    after = stub.request_counts
+    return {
+        "fresh": outcomes.count("fresh"),
+        "cached": outcomes.count("cached"),
+        "errors": outcomes.count("error"),
+        "upstream_429s": after.get("throttled", 0) - before.get("throttled", 0),
+        "fresh_per_second": round(outcomes.count("fresh") / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quota", type=float, default=20.0, help="Forecast requests per second per key")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    with StubServer() as stub:
+        os.environ["PIRATE_WEATHER_BASE_URL"] = stub.url
+        # The client is told the quota, as it would be configured in production.
+        os.environ["RATE_LIMIT_FORECAST_PER_SECOND"] = str(args.quota)
+        os.environ["RATE_LIMIT_FORECAST_BURST"] = str(max(int(args.quota / 2), 1))
+        stub.set_quota("/forecast", per_second=args.quota, burst=max(int(args.quota / 2), 1))
+        for label, settings in RUNS.items():
+            print(f"{label:<16}: {_run(stub, settings, args.calls, args.concurrency)}")
+        print(f"limiter stats   : {rate_limit_stats()}")
+
+
+if __name__ == "__main__":
+    main()
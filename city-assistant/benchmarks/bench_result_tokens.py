@@ -0,0 +1,88 @@
+"""Compares the token size of prose and structured tool results.
+
+Builds get_weather, get_weather_many and get_current_time results for every
+place known to the stub, from the same fixture forecasts, once with the
+default prose format and once with CITY_ASSISTANT_RESULT_FORMAT=structured.
+The results are serialized as JSON, as they are sent to the model.
+
+Tokens are counted with ``tiktoken``'s cl100k_base encoding when it is
+available, and estimated as one token per four characters otherwise. Neither
+is Gemini's tokenizer, so treat the absolute numbers as estimates; the ratio
+between the formats is what matters. Run from the city-assistant directory:
+
+    python -m benchmarks.bench_result_tokens
+"""
+import argparse
+import json
+import math
+import os
+from zoneinfo import ZoneInfo
+
+from city_assistant.tools.forecast import EXCLUDED_BLOCKS, project_forecast
+from city_assistant.tools.tools import _batch_entry, _time_result, _weather_report
+
+from .stub_server import PLACES, forecast_payload
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # Not installed, or the encoding cannot be downloaded.
+    _ENCODING = None
+
+def count_tokens(text: str) -> int:
+    """Returns the token count of a text, estimated if tiktoken is missing."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _results() -> dict:
+    weather = []
+    times = []
+    for lat, lon, display_name, timezone in PLACES.values():
+        data = project_forecast(forecast_payload(lat, lon, EXCLUDED_BLOCKS))
+        weather.append(_weather_report(display_name, data))
+        times.append(_time_result(display_name, ZoneInfo(timezone)))
+    batch = {
+        "status": "success",
+        "results": [_batch_entry(name.title(), result) for name, result in zip(PLACES, weather)],
+    }
+    return {"get_weather": weather, "get_weather_many": [batch], "get_current_time": times}
+
+
+def _measure(result_format: str) -> dict:
+    os.environ["CITY_ASSISTANT_RESULT_FORMAT"] = result_format
+    return {
+        tool: sum(count_tokens(json.dumps(result, ensure_ascii=False)) for result in results) / len(results)
+        for tool, results in _results().items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--show", action="store_true", help="Print one result of each format")
+    args = parser.parse_args()
+
+    previous = os.environ.get("CITY_ASSISTANT_RESULT_FORMAT")
+    prose = _measure("prose")
+    structured = _measure("structured")
+    if args.show:
+        for result_format in ("prose", "structured"):
+            os.environ["CITY_ASSISTANT_RESULT_FORMAT"] = result_format
+            print(f"{result_format}: {json.dumps(_results()['get_weather'][0], ensure_ascii=False)}")
+    if previous is None:
+        os.environ.pop("CITY_ASSISTANT_RESULT_FORMAT", None)
+    else:
+        os.environ["CITY_ASSISTANT_RESULT_FORMAT"] = previous
+
+    counter = "tiktoken cl100k_base" if _ENCODING is not None else "4 characters per token estimate"
+    print(f"Tokens per result ({counter}, {len(PLACES)} places):")
+    for tool in prose:
+        saved = (1 - structured[tool] / prose[tool]) * 100
+        print(f"  {tool:<18} prose {prose[tool]:7.1f}   structured {structured[tool]:7.1f}   {saved:5.1f}% fewer")
+
+
+if __name__ == "__main__":
+    main()
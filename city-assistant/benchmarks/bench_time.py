@@ -0,0 +1,68 @@
+"""Per-call cost of the time fallback and the time report formatting.
+
+Compares the previous implementation, which built the city table, resolved a
+``ZoneInfo`` and parsed a ``strftime`` pattern on every call, with the
+timezone registry and ``format_now``. Run from the city-assistant directory:
+
+    python -m benchmarks.bench_time --iterations 100000
+"""
+import argparse
+import datetime
+import timeit
+from zoneinfo import ZoneInfo
+
+from city_assistant.tools.timezones import (
+    FALLBACK_CITY_TIMEZONES,
+    format_now,
+    get_timezone_registry,
+)
+from city_assistant.tools.tools import _get_time_fallback
+
+CITIES = ("London", "new york", "Tokyo", "Sao Paulo", "Honolulu", "Atlantis")
+
+
+def _legacy_time_fallback(city: str) -> dict:
+    # The implementation before the registry, kept here for comparison.
+    city_timezones = dict(FALLBACK_CITY_TIMEZONES)
+    city_lower = city.lower()
+    if city_lower in city_timezones:
+        tz = ZoneInfo(city_timezones[city_lower])
+        now = datetime.datetime.now(tz)
+        report = f'The current time in {city.title()} is {now.strftime("%Y-%m-%d %H:%M:%S %Z%z")}'
+        return {"status": "success", "report": report}
+    return {"status": "error", "error_message": f"Sorry, I don't have timezone information for '{city}'."}
+
+
+def _legacy_format(timezone_name: str) -> str:
+    return datetime.datetime.now(ZoneInfo(timezone_name)).strftime("%Y-%m-%d %H:%M:%S %Z%z")
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    seconds = min(timeit.repeat(fn, number=iterations, repeat=5))
+    return round(seconds / iterations * 1e6, 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+    n = args.iterations // len(CITIES)
+    registry = get_timezone_registry()
+    registry.city("London")
+
+    rows = {
+        "table lookup, legacy (dict build)": lambda: [dict(FALLBACK_CITY_TIMEZONES).get(c.lower()) for c in CITIES],
+        "table lookup, registry": lambda: [registry.city(c) for c in CITIES],
+        "zone + format, ZoneInfo() + strftime": lambda: [_legacy_format("Europe/London") for _ in CITIES],
+        "zone + format, registry + format_now": lambda: [
+            format_now(registry.zone("Europe/London")) for _ in CITIES
+        ],
+        "_get_time_fallback, legacy": lambda: [_legacy_time_fallback(c) for c in CITIES],
+        "_get_time_fallback, registry": lambda: [_get_time_fallback(c) for c in CITIES],
+    }
+    for label, fn in rows.items():
+        print(f"{label:<40} {_per_call_us(fn, n) / len(CITIES):8.3f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Latency and throughput of the city_assistant tools against a replay server.
+
+Runs get_lat_long, get_weather, get_current_time and _get_time_fallback
+against ``StubServer``, which replays recorded responses (see
+``benchmarks.record``) or synthetic ones, with configurable upstream latency
+and jitter. For every tool and concurrency level it reports p50/p95/p99
+latency, calls per second and the upstream requests made, and writes the
+results, with the telemetry histograms of the run, to a JSON file. Every run starts with empty caches; the cities are
+cycled, so later calls show the effect of caching and coalescing.
+
+Run from the city-assistant directory:
+
+    python -m benchmarks.bench_tools --latency 0.05 --jitter 0.02 \\
+        --concurrency 1,4,16 --output bench_tools.json
+    python -m benchmarks.bench_tools --compare bench_tools.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from city_assistant.tools import telemetry, tools
+from city_assistant.tools.circuit_breaker import reset_breakers
+from city_assistant.tools.forecast import get_forecast_fetcher
+from city_assistant.tools.geocode_cache import get_geocode_cache
+
+from .stats import latency_summary
+from .stub_server import StubServer, load_recordings
+
+TOOLS = {
+    "get_lat_long": tools.get_lat_long,
+    "get_weather": tools.get_weather,
+    "get_current_time": tools.get_current_time,
+    "_get_time_fallback": tools._get_time_fallback,
+}
+DEFAULT_CITIES = (
+    "London,Paris,Berlin,Madrid,Tokyo,New York,Hallstatt,Bruges,Sintra,Zermatt,Cusco"
+)
+
+
+def _reset_caches() -> None:
+    get_geocode_cache().clear()
+    get_forecast_fetcher().clear()
+    reset_breakers()
+
+
+def _request_delta(before: dict, after: dict) -> dict:
+    return {kind: after[kind] - before.get(kind, 0) for kind in after if after[kind] != before.get(kind, 0)}
+
+
+def run_tool(stub: StubServer, name: str, cities: list, calls: int, concurrency: int) -> dict:
+    """Calls one tool ``calls`` times from ``concurrency`` threads.
+
+    Returns:
+        dict: Latency percentiles, throughput and upstream request counts.
+    """
+    tool = TOOLS[name]
+    latencies = [0.0] * calls
+
+    def call(i: int) -> str:
+        started = time.perf_counter()
+        result = tool(cities[i % len(cities)])
+        latencies[i] = time.perf_counter() - started
+        return result["status"]
+
+    _reset_caches()
+    requests_before = stub.request_counts
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(call, range(calls)))
+    elapsed = time.perf_counter() - started
+    return {
+        "tool": name,
+        "concurrency": concurrency,
+        "calls": calls,
+        **latency_summary(latencies),
+        "calls_per_second": round(calls / elapsed, 1),
+        "errors": statuses.count("error"),
+        "upstream_requests": _request_delta(requests_before, stub.request_counts),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _compare(results: list, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (row["tool"], row["concurrency"]): row for row in json.load(f)["results"]
+        }
+    print(f"\nChange against {baseline_path}:")
+    for row in results:
+        previous = baseline.get((row["tool"], row["concurrency"]))
+        if previous is None:
+            continue
+        p95 = (row["p95_ms"] - previous["p95_ms"]) / max(previous["p95_ms"], 1e-9) * 100
+        throughput = (
+            (row["calls_per_second"] - previous["calls_per_second"])
+            / max(previous["calls_per_second"], 1e-9) * 100
+        )
+        print(f"  {row['tool']:<20} c={row['concurrency']:<3} p95 {p95:+7.1f}%   calls/s {throughput:+7.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tools", default=",".join(TOOLS), help="Comma separated tool names")
+    parser.add_argument("--cities", default=DEFAULT_CITIES, help="Comma separated cities to cycle through")
+    parser.add_argument("--calls", type=int, default=200, help="Calls per tool and concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma separated thread counts")
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random extra upstream latency, up to this")
+    parser.add_argument("--recordings", help="JSON file written by benchmarks.record")
+    parser.add_argument("--output", default="bench_tools.json", help="Where to write the results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.tools.split(",") if name.strip()]
+    cities = [city.strip() for city in args.cities.split(",") if city.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    recordings = load_recordings(args.recordings) if args.recordings else None
+
+    telemetry.reset()
+    results = []
+    with StubServer(recordings=recordings) as stub:
+        os.environ["GEOCODE_BASE_URL"] = stub.url
+        os.environ["PIRATE_WEATHER_BASE_URL"] = stub.url
+        os.environ.setdefault("PIRATE_WEATHER_API_KEY", "stub-key")
+        # The stub has no quota; benchmarks.bench_rate_limit covers the limiter.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        if args.latency or args.jitter:
+            stub.inject_fault("/", delay_seconds=args.latency, jitter_seconds=args.jitter)
+        for name in names:
+            for concurrency in levels:
+                row = run_tool(stub, name, cities, args.calls, concurrency)
+                results.append(row)
+                print(
+                    f"{name:<20} c={concurrency:<3} p50 {row['p50_ms']:>9.3f} ms  "
+                    f"p95 {row['p95_ms']:>9.3f} ms  p99 {row['p99_ms']:>9.3f} ms  "
+                    f"{row['calls_per_second']:>9.1f} calls/s  upstream {row['upstream_requests']}"
+                )
+
+    if args.compare:
+        _compare(results, args.compare)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "calls": args.calls,
+            "cities": cities,
+            "latency_seconds": args.latency,
+            "jitter_seconds": args.jitter,
+            "recordings": args.recordings,
+        },
+        "results": results,
+        "telemetry": telemetry.snapshot(),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Deterministic Pirate Weather style forecast documents for offline runs.
+
+The documents follow the shape of a real ``/forecast`` response: a
+``currently`` block plus 61 minutely, 48 hourly and 8 daily data points, an
+alerts list and flags. That makes their size and decode cost representative
+of what the tools download from the live API.
+"""
+import random
+
+BLOCKS = ("currently", "minutely", "hourly", "daily", "alerts", "flags")
+SUMMARIES = ("Clear", "Partly Cloudy", "Mostly Cloudy", "Overcast", "Light Rain", "Rain", "Breezy")
+ICONS = ("clear-day", "partly-cloudy-day", "cloudy", "cloudy", "rain", "rain", "wind")
+
+
+def _data_point(rng: random.Random, time: int, daily: bool = False) -> dict:
+    condition = rng.randrange(len(SUMMARIES))
+    point = {
+        "time": time,
+        "summary": SUMMARIES[condition],
+        "icon": ICONS[condition],
+        "precipIntensity": round(rng.uniform(0, 2), 4),
+        "precipProbability": round(rng.random(), 2),
+        "precipIntensityError": round(rng.uniform(0, 0.5), 4),
+        "precipType": "rain",
+        "temperature": round(rng.uniform(-5, 32), 2),
+        "apparentTemperature": round(rng.uniform(-8, 34), 2),
+        "dewPoint": round(rng.uniform(-10, 20), 2),
+        "humidity": round(rng.uniform(0.2, 1), 2),
+        "pressure": round(rng.uniform(990, 1030), 2),
+        "windSpeed": round(rng.uniform(0, 15), 2),
+        "windGust": round(rng.uniform(0, 25), 2),
+        "windBearing": rng.randrange(360),
+        "cloudCover": round(rng.random(), 2),
+        "uvIndex": round(rng.uniform(0, 10), 2),
+        "visibility": round(rng.uniform(1, 16), 2),
+        "ozone": round(rng.uniform(250, 400), 2),
+    }
+    if daily:
+        point.update({
+            "sunriseTime": time + 6 * 3600,
+            "sunsetTime": time + 19 * 3600,
+            "moonPhase": round(rng.random(), 2),
+            "temperatureHigh": round(rng.uniform(10, 35), 2),
+            "temperatureHighTime": time + 15 * 3600,
+            "temperatureLow": round(rng.uniform(-5, 15), 2),
+            "temperatureLowTime": time + 5 * 3600,
+            "temperatureMin": round(rng.uniform(-5, 15), 2),
+            "temperatureMax": round(rng.uniform(10, 35), 2),
+        })
+    return point
+
+
+def full_forecast(lat: float, lon: float, timezone: str = "UTC", time: int = 1760000000) -> dict:
+    """Returns a complete forecast document for a location."""
+    rng = random.Random(f"{lat:.2f},{lon:.2f}")
+    currently = _data_point(rng, time)
+    currently.update({"nearestStormDistance": 120.5, "nearestStormBearing": 45})
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "timezone": timezone,
+        "offset": 0,
+        "elevation": 35,
+        "currently": currently,
+        "minutely": {
+            "summary": "No precipitation for the hour.",
+            "icon": "clear",
+            "data": [
+                {"time": time + 60 * i, "precipIntensity": 0, "precipProbability": 0,
+                 "precipIntensityError": 0, "precipType": "none"}
+                for i in range(61)
+            ],
+        },
+        "hourly": {
+            "summary": "Partly cloudy throughout the day.",
+            "icon": "partly-cloudy-day",
+            "data": [_data_point(rng, time + 3600 * i) for i in range(48)],
+        },
+        "daily": {
+            "summary": "Light rain later in the week.",
+            "icon": "rain",
+            "data": [_data_point(rng, time + 86400 * i, daily=True) for i in range(8)],
+        },
+        "alerts": [
+            {
+                "title": "Wind Advisory",
+                "regions": ["Downtown", "Harbour"],
+                "severity": "advisory",
+                "time": time,
+                "expires": time + 43200,
+                "description": "Southwest winds 25 to 35 km/h with gusts up to 70 km/h expected. " * 4,
+                "uri": "https://alerts.weather.gov/",
+            }
+        ],
+        "flags": {
+            "sources": ["ETOPO1", "gfs", "gefs", "hrrrsubh", "hrrr_0-18", "nbm", "nbm_fcst", "hrrr_18-48"],
+            "sourceTimes": {"hrrr_0-18": "2025-10-09 08Z", "nbm": "2025-10-09 07Z", "gfs": "2025-10-09 00Z"},
+            "nearest-station": 0,
+            "units": "si",
+            "version": "V2.7.4",
+        },
+    }
+
+
+def apply_exclude(document: dict, exclude: str) -> dict:
+    """Drops the blocks named in an ``exclude`` query parameter, like the API does."""
+    excluded = {block.strip() for block in exclude.split(",") if block.strip()}
+    return {key: value for key, value in document.items() if key not in excluded}
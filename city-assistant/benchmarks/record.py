@@ -0,0 +1,70 @@
+"""Records live geocode and forecast responses for replay by the stub server.
+
+Looks each city up on the real APIs, as the tools would, and writes
+the raw response bodies to a JSON file that ``StubServer(recordings=...)``
+and ``bench_tools --recordings`` replay. The forecasts are recorded in full,
+without ``exclude``, so the replay can serve either shape. API keys are used
+for the requests only and never written to the file. Run from the
+city-assistant directory with PIRATE_WEATHER_API_KEY (and optionally
+GEOCODE_MAPS_API_KEY) set:
+
+    python -m benchmarks.record -o benchmarks/recordings.json London Hallstatt Cusco
+"""
+import argparse
+import json
+import os
+
+from city_assistant.tools.forecast import DEFAULT_BASE_URL, forecast_key
+from city_assistant.tools.http_client import HttpClient
+from city_assistant.tools.tools import get_lat_long
+
+from .stub_server import PLACES, query_key
+
+
+def record(cities: list, client: HttpClient) -> dict:
+    """Fetches the geocode result and forecast for every city.
+
+    Returns:
+        dict: {"geocode": {query: body}, "forecast": {"lat,lon": body}}.
+    """
+    geocode_url = os.getenv("GEOCODE_BASE_URL", "https://geocode.maps.co") + "/search"
+    forecast_base = os.getenv("PIRATE_WEATHER_BASE_URL", DEFAULT_BASE_URL)
+    api_key = os.environ["PIRATE_WEATHER_API_KEY"]
+    recordings = {"geocode": {}, "forecast": {}}
+    for city in cities:
+        response = client.get(
+            geocode_url, params={"q": city, "api_key": os.getenv("GEOCODE_MAPS_API_KEY", "")}
+        )
+        response.raise_for_status()
+        recordings["geocode"][query_key(city)] = response.json()
+        # Record the forecast where the tools will ask for it, which for
+        # gazetteer cities is the gazetteer's coordinate.
+        coords = get_lat_long(city)
+        if coords["status"] != "success":
+            print(f"{city}: not found")
+            continue
+        lat, lon = forecast_key(coords["latitude"], coords["longitude"])
+        response = client.get(f"{forecast_base}/forecast/{api_key}/{lat},{lon}")
+        response.raise_for_status()
+        recordings["forecast"][f"{lat},{lon}"] = response.json()
+        print(f"{city}: {lat},{lon}")
+    return recordings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cities", nargs="*", help="Cities to record; defaults to the stub's places")
+    parser.add_argument("-o", "--output", default="benchmarks/recordings.json")
+    args = parser.parse_args()
+
+    # The breaker would turn a rate-limited recording run into short circuits.
+    client = HttpClient(circuit_breaker=False)
+    recordings = record(args.cities or list(PLACES), client)
+    client.close()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(recordings, f, ensure_ascii=False, indent=1)
+    print(f"Wrote {len(recordings['geocode'])} geocode and {len(recordings['forecast'])} forecast responses to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
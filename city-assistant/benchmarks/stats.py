@@ -0,0 +1,16 @@
+"""Latency summaries shared by the benchmarks."""
+
+
+def percentile(samples: list, quantile: float) -> float:
+    """Returns the nearest-rank quantile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def latency_summary(latencies: list) -> dict:
+    """Returns p50/p95/p99 of latencies given in seconds, in milliseconds."""
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1e3, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3),
+    }
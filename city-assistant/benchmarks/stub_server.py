@@ -0,0 +1,340 @@
+"""Local stand-in for geocode.maps.co and the Pirate Weather forecast API.
+
+Serves canned responses over HTTP/1.1 keep-alive so the tools can be exercised
+and benchmarked offline. Point the tools at it with GEOCODE_BASE_URL and
+PIRATE_WEATHER_BASE_URL, or use ``StubServer`` from Python:
+
+    with StubServer() as stub:
+        os.environ["GEOCODE_BASE_URL"] = stub.url
+        os.environ["PIRATE_WEATHER_BASE_URL"] = stub.url
+
+Faults can be injected per path prefix to exercise timeouts, circuit
+breakers and hedged requests:
+
+    stub.inject_fault("/search", delay_seconds=2.0, error_rate=0.5)
+    stub.inject_fault("/forecast", delay_seconds=0.5, slow_rate=0.05)
+
+A per-key quota can be simulated too. Requests over it get a 429 with
+``Retry-After``, and every response under it carries ``RateLimit-*`` headers:
+
+    stub.set_quota("/forecast", per_second=5, burst=10)
+
+Responses recorded from the live APIs with ``benchmarks.record`` are replayed
+in preference to the synthetic ones:
+
+    StubServer(recordings=load_recordings("benchmarks/recordings.json"))
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .fixtures import apply_exclude, full_forecast
+
+PLACES = {
+    "london": (51.5074, -0.1278, "London, Greater London, England, United Kingdom", "Europe/London"),
+    "paris": (48.8566, 2.3522, "Paris, Île-de-France, France", "Europe/Paris"),
+    "berlin": (52.5200, 13.4050, "Berlin, Germany", "Europe/Berlin"),
+    "madrid": (40.4168, -3.7038, "Madrid, Comunidad de Madrid, Spain", "Europe/Madrid"),
+    "tokyo": (35.6762, 139.6503, "Tokyo, Japan", "Asia/Tokyo"),
+    "new york": (40.7128, -74.0060, "New York, United States", "America/New_York"),
+    # Not in the bundled gazetteer, so lookups of these reach the geocoder.
+    "hallstatt": (47.5622, 13.6493, "Hallstatt, Upper Austria, Austria", "Europe/Vienna"),
+    "bruges": (51.2093, 3.2247, "Bruges, West Flanders, Flanders, Belgium", "Europe/Brussels"),
+    "sintra": (38.8029, -9.3817, "Sintra, Lisbon, Portugal", "Europe/Lisbon"),
+    "zermatt": (46.0207, 7.7491, "Zermatt, Visp, Valais, Switzerland", "Europe/Zurich"),
+    "cusco": (-13.5319, -71.9675, "Cusco, Peru", "America/Lima"),
+}
+
+
+def load_recordings(path: str) -> dict:
+    """Reads recorded upstream responses written by ``benchmarks.record``."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def query_key(query: str) -> str:
+    """Normalizes a geocode query the way recordings are keyed."""
+    return " ".join(query.lower().split())
+
+
+def geocode_payload(query: str) -> list:
+    """Returns a geocode.maps.co style search result for a query."""
+    place = PLACES.get(query_key(query))
+    if place is None:
+        return []
+    lat, lon, display_name, _ = place
+    return [{"lat": str(lat), "lon": str(lon), "display_name": display_name}]
+
+
+def forecast_payload(lat: float, lon: float, exclude: str = "") -> dict:
+    """Returns a Pirate Weather style forecast document for a location."""
+    timezone = "UTC"
+    for place_lat, place_lon, _, place_tz in PLACES.values():
+        if abs(place_lat - lat) < 0.1 and abs(place_lon - lon) < 0.1:
+            timezone = place_tz
+    return apply_exclude(full_forecast(lat, lon, timezone), exclude)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY the
+    # body waits for the client's delayed ACK and adds ~40 ms per response.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        self._rate_headers = {}
+        quota = self.server.quota_for(parts.path)
+        if quota is not None and not self._take_quota(quota, parts):
+            return
+        fault = self.server.fault_for(parts.path)
+        if fault is not None:
+            if self.server.rng.random() < fault["slow_rate"]:
+                delay = fault["delay_seconds"] + self.server.rng.uniform(0, fault["jitter_seconds"])
+                if delay > 0:
+                    time.sleep(delay)
+            if self.server.rng.random() < fault["error_rate"]:
+                self._send_json({"error": "injected fault"}, status=fault["status"])
+                return
+        recordings = self.server.recordings
+        if parts.path.rstrip("/") == "/search":
+            self.server.count("geocode")
+            query = parse_qs(parts.query).get("q", [""])[0]
+            recorded = recordings.get("geocode", {}).get(query_key(query))
+            self._send_json(recorded if recorded is not None else geocode_payload(query))
+            return
+        segments = parts.path.strip("/").split("/")
+        if len(segments) == 3 and segments[0] == "forecast":
+            self.server.count("forecast")
+            try:
+                lat, lon = (float(value) for value in segments[2].split(","))
+            except ValueError:
+                self._send_json({"error": "bad coordinates"}, status=400)
+                return
+            exclude = parse_qs(parts.query).get("exclude", [""])[0]
+            recorded = recordings.get("forecast", {}).get(segments[2])
+            if recorded is not None:
+                self._send_json(apply_exclude(recorded, exclude))
+            else:
+                self._send_json(forecast_payload(lat, lon, exclude))
+            return
+        self.server.count("other")
+        self._send_json({"error": "not found"}, status=404)
+
+    def _take_quota(self, quota: dict, parts) -> bool:
+        # Forecast URLs carry the key in the path, geocode URLs in api_key.
+        segments = parts.path.strip("/").split("/")
+        if segments[0] == "forecast" and len(segments) > 1:
+            key = segments[1]
+        else:
+            key = parse_qs(parts.query).get("api_key", [""])[0]
+        with self.server.quota_lock:
+            now = time.monotonic()
+            tokens, updated = quota["buckets"].get(key, (quota["burst"], now))
+            tokens = min(quota["burst"], tokens + (now - updated) * quota["per_second"])
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            quota["buckets"][key] = (tokens, now)
+        reset = max(1 - tokens, 0) / quota["per_second"]
+        self._rate_headers = {
+            "RateLimit-Limit": str(quota["burst"]),
+            "RateLimit-Remaining": str(int(tokens)),
+            "RateLimit-Reset": f"{reset:.2f}",
+        }
+        if not allowed:
+            self.server.count("throttled")
+            self._rate_headers["Retry-After"] = f"{reset:.2f}"
+            self._send_json({"error": "rate limit exceeded"}, status=429)
+        return allowed
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in self._rate_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _ignore_disconnects(handle_error):
+    def quiet_handle_error(request, client_address):
+        # Clients that time out on an injected delay hang up mid-response.
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            handle_error(request, client_address)
+
+    return quiet_handle_error
+
+
+class StubServer:
+    """Runs the stub on a background thread; usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, recordings: Optional[dict] = None):
+        self._server = ThreadingHTTPServer((host, port), StubHandler)
+        self._server.daemon_threads = True
+        self._server.recordings = recordings or {}
+        self._server.request_counts = {}
+        self._server.connection_count = 0
+        self._server.count = self._count
+        self._count_lock = threading.Lock()
+        self._server.faults = {}
+        self._server.rng = random.Random(0)
+        self._server.fault_for = self._fault_for
+        self._server.quotas = {}
+        self._server.quota_lock = threading.Lock()
+        self._server.quota_for = self._quota_for
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        original_get_request = self._server.get_request
+
+        def counting_get_request():
+            # Every accepted socket is a new TCP connection from the client.
+            self._server.connection_count += 1
+            return original_get_request()
+
+        self._server.get_request = counting_get_request
+        self._server.handle_error = _ignore_disconnects(self._server.handle_error)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        with self._count_lock:
+            return sum(self._server.request_counts.values())
+
+    @property
+    def request_counts(self) -> dict:
+        """Requests served so far, keyed by "geocode", "forecast" and "other".
+
+        Requests turned away by a simulated quota are counted as "throttled".
+        """
+        with self._count_lock:
+            return dict(self._server.request_counts)
+
+    @property
+    def connection_count(self) -> int:
+        return self._server.connection_count
+
+    def inject_fault(
+        self,
+        path_prefix: str = "/",
+        delay_seconds: float = 0.0,
+        error_rate: float = 0.0,
+        status: int = 503,
+        slow_rate: float = 1.0,
+        jitter_seconds: float = 0.0,
+    ) -> None:
+        """Makes requests under a path slow and/or fail.
+
+        Args:
+            path_prefix (str): Requests whose path starts with this are affected,
+                e.g. "/search" for geocoding or "/forecast" for weather.
+            delay_seconds (float): Added before the affected responses.
+            error_rate (float): Share of requests answered with ``status``.
+            status (int): The error status code to answer with.
+            slow_rate (float): Share of requests that get the delay, e.g. 0.05
+                for a slow tail.
+            jitter_seconds (float): Up to this much is added to each delay,
+                uniformly at random.
+        """
+        self._server.faults[path_prefix] = {
+            "delay_seconds": delay_seconds,
+            "error_rate": error_rate,
+            "status": status,
+            "slow_rate": slow_rate,
+            "jitter_seconds": jitter_seconds,
+        }
+
+    def clear_faults(self) -> None:
+        """Removes every injected fault."""
+        self._server.faults.clear()
+
+    def set_quota(self, path_prefix: str = "/", per_second: float = 1.0, burst: int = 1) -> None:
+        """Rate limits requests under a path, per API key.
+
+        Args:
+            path_prefix (str): Requests whose path starts with this are limited.
+            per_second (float): Sustained requests per second allowed per key.
+            burst (int): Requests a key can make at once after being idle.
+        """
+        with self._server.quota_lock:
+            self._server.quotas[path_prefix] = {"per_second": per_second, "burst": burst, "buckets": {}}
+
+    def clear_quotas(self) -> None:
+        """Removes every simulated quota."""
+        with self._server.quota_lock:
+            self._server.quotas.clear()
+
+    def _count(self, kind: str) -> None:
+        with self._count_lock:
+            self._server.request_counts[kind] = self._server.request_counts.get(kind, 0) + 1
+
+    def _quota_for(self, path: str):
+        matches = [prefix for prefix in self._server.quotas if path.startswith(prefix)]
+        if not matches:
+            return None
+        return self._server.quotas[max(matches, key=len)]
+
+    def _fault_for(self, path: str):
+        matches = [prefix for prefix in self._server.faults if path.startswith(prefix)]
+        if not matches:
+            return None
+        return self._server.faults[max(matches, key=len)]
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fault-path", default="/", help="Path prefix the faults below apply to")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--quota", type=float, default=0.0, help="Requests per second allowed per API key")
+    parser.add_argument("--quota-burst", type=int, default=1, help="Burst allowed by --quota")
+    parser.add_argument("--recordings", help="JSON file written by benchmarks.record")
+    args = parser.parse_args()
+    server = StubServer(
+        port=args.port, recordings=load_recordings(args.recordings) if args.recordings else None
+    )
+    if args.delay or args.jitter or args.error_rate:
+        server.inject_fault(
+            args.fault_path,
+            delay_seconds=args.delay,
+            jitter_seconds=args.jitter,
+            error_rate=args.error_rate,
+        )
+    if args.quota:
+        server.set_quota(args.fault_path, per_second=args.quota, burst=args.quota_burst)
+    print(f"Serving stub upstreams on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
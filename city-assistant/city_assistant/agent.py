@@ -1,11 +1,14 @@
 from google.adk.agents import Agent
 
 from .prompt import agent_instruction
-from .tools.tools import get_weather, get_current_time
+from .tools.async_tools import get_weather, get_weather_many, get_current_time
+from .tools.prewarm import start_hot_city_warmer
 
 root_agent = Agent(
     model="gemini-2.5-flash",
     name="city_assistant",
     instruction=agent_instruction,
-    tools=[get_weather, get_current_time],
-)
\ No newline at end of file
+    tools=[get_weather, get_weather_many, get_current_time],
+)
+
+start_hot_city_warmer()
\ No newline at end of file
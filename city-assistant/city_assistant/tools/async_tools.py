@@ -0,0 +1,230 @@
+"""Native asyncio versions of the city assistant tools.
+
+ADK runs agents on an event loop, so these are the variants registered on
+``root_agent``: a slow upstream suspends only the calling session instead of
+blocking the loop or tying up a worker thread. Function names, arguments and
+return dicts match the synchronous tools in ``tools.py``, and both share the
+same geocode cache and forecast fetcher.
+"""
+import asyncio
+import os
+
+import httpx
+
+from .forecast import get_forecast_fetcher
+from .geocode_cache import get_geocode_cache, normalize_city
+from .http_client import decode_json, get_async_http_client
+from .rate_limit import active_rate_limiter, api_keys, check_response
+from .singleflight import get_flight
+from .telemetry import traced_tool
+from .tools import (
+    _batch_concurrency,
+    _batch_entry,
+    _batch_max_cities,
+    _dedupe_cities,
+    _gazetteer_lat_long,
+    _get_time_fallback,
+    _parse_geocode,
+    _time_report,
+    _weather_report,
+)
+from .tz_index import timezone_at
+
+
+@traced_tool
+async def get_lat_long(city: str) -> dict:
+    """Gets latitude and longitude coordinates for a specified city.
+
+    Exact matches in the offline gazetteer are answered locally, including the
+    timezone. Other names go to the geocode.maps.co API, and if that finds
+    nothing or is unreachable a close fuzzy match in the gazetteer is used.
+
+    Args:
+        city (str): The name of the city for which to retrieve coordinates.
+
+    Returns:
+        dict: status and result with lat/long or error msg.
+    """
+    local = _gazetteer_lat_long(city)
+    if local is not None:
+        return local
+
+    # Concurrent lookups of the same city share one upstream call
+    coords = dict(await get_flight("geocode").do_async(
+        normalize_city(city), lambda: _geocode_lat_long(city)
+    ))
+    if coords["status"] != "success":
+        return _gazetteer_lat_long(city, fuzzy=True) or coords
+    return coords
+
+
+async def _geocode_lat_long(city: str) -> dict:
+    """Looks a city up with the geocode.maps.co API, through the geocode cache."""
+    cache = get_geocode_cache()
+    # The cache's SQLite reads and writes would block the event loop
+    cached = await asyncio.to_thread(cache.get, city)
+    if cached is not None:
+        return cached
+
+    try:
+        url = os.getenv("GEOCODE_BASE_URL", "https://geocode.maps.co") + "/search"
+        params = {
+            "q": city,
+            "api_key": os.getenv("GEOCODE_MAPS_API_KEY", ""),  # Optional API key
+        }
+        limiter = active_rate_limiter("geocode")
+        if limiter is not None:
+            params["api_key"] = await limiter.acquire_async(
+                api_keys(params["api_key"], "GEOCODE_MAPS_API_KEYS")
+            )
+
+        response = await get_async_http_client().get(url, params=params)
+        check_response("geocode", limiter, params["api_key"], response)
+
+        coords = _parse_geocode(decode_json(response), city)
+        await asyncio.to_thread(cache.set, city, coords)
+        return coords
+
+    except httpx.HTTPError as e:
+        return {
+            "status": "error",
+            "error_message": f"Failed to fetch coordinates: {str(e)}",
+        }
+    except (KeyError, ValueError, IndexError) as e:
+        return {
+            "status": "error",
+            "error_message": f"Invalid response format from geocoding API: {str(e)}",
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": f"An unexpected error occurred: {str(e)}",
+        }
+
+
+@traced_tool
+async def get_weather(city: str) -> dict:
+    """Retrieves the current weather report for a specified city.
+
+    Args:
+        city (str): The name of the city for which to retrieve the weather report.
+
+    Returns:
+        dict: status and result or error msg.
+    """
+    api_key = os.getenv("PIRATE_WEATHER_API_KEY")
+
+    if not api_key:
+        return {
+            "status": "error",
+            "error_message": "Pirate Weather API key not found. Please set PIRATE_WEATHER_API_KEY environment variable.",
+        }
+
+    try:
+        coords_result = await get_lat_long(city)
+        if coords_result["status"] != "success":
+            return coords_result
+
+        data = await get_forecast_fetcher().get_forecast_async(
+            api_key, coords_result["latitude"], coords_result["longitude"]
+        )
+        return _weather_report(coords_result.get("display_name", city), data)
+
+    except httpx.HTTPError as e:
+        return {
+            "status": "error",
+            "error_message": f"Failed to fetch weather data: {str(e)}",
+        }
+    except KeyError as e:
+        return {
+            "status": "error",
+            "error_message": f"Invalid response format from weather API: {str(e)}",
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": f"An unexpected error occurred: {str(e)}",
+        }
+
+
+@traced_tool
+async def get_weather_many(cities: list[str]) -> dict:
+    """Retrieves the current weather report for several cities in one call.
+
+    Use this instead of repeated get_weather calls when the user asks about
+    more than one city. Repeated cities are looked up once.
+
+    Args:
+        cities (list[str]): The names of the cities to retrieve weather reports for.
+
+    Returns:
+        dict: status and a list of per-city results, each with its own status
+        and report or error msg.
+    """
+    unique_cities = _dedupe_cities(cities)
+    if not unique_cities:
+        return {
+            "status": "error",
+            "error_message": f"Please provide between 1 and {_batch_max_cities()} city names.",
+        }
+
+    semaphore = asyncio.Semaphore(_batch_concurrency())
+
+    async def bounded_get_weather(city: str) -> dict:
+        async with semaphore:
+            return await get_weather(city)
+
+    reports = await asyncio.gather(*(bounded_get_weather(city) for city in unique_cities))
+    return {
+        "status": "success",
+        "results": [_batch_entry(city, report) for city, report in zip(unique_cities, reports)],
+    }
+
+
+@traced_tool
+async def get_current_time(city: str) -> dict:
+    """Returns the current time in a specified city.
+
+    Args:
+        city (str): The name of the city for which to retrieve the current time.
+
+    Returns:
+        dict: status and result or error msg.
+    """
+    try:
+        coords_result = await get_lat_long(city)
+        if coords_result["status"] != "success":
+            return _get_time_fallback(city)
+
+        # Places found in the offline gazetteer already carry their timezone;
+        # anything else is resolved by the local coordinate index
+        timezone_name = coords_result.get("timezone") or timezone_at(
+            coords_result["latitude"], coords_result["longitude"]
+        )
+        if not timezone_name:
+            api_key = os.getenv("PIRATE_WEATHER_API_KEY")
+
+            if not api_key:
+                return {
+                    "status": "error",
+                    "error_message": "Pirate Weather API key not found. Please set PIRATE_WEATHER_API_KEY environment variable.",
+                }
+
+            timezone_name = await get_forecast_fetcher().get_timezone_async(
+                api_key, coords_result["latitude"], coords_result["longitude"]
+            )
+        display_name = coords_result.get("display_name", city)
+        return _time_report(display_name, timezone_name) or _get_time_fallback(city)
+
+    except httpx.HTTPError:
+        return _get_time_fallback(city)
+    except KeyError as e:
+        return {
+            "status": "error",
+            "error_message": f"Invalid response format from API: {str(e)}",
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "error_message": f"An unexpected error occurred: {str(e)}",
+        }
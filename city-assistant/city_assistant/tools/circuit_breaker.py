@@ -0,0 +1,246 @@
+"""Per-upstream circuit breakers for the geocoding and forecast APIs.
+
+A degraded upstream used to make every tool call wait for the full read
+timeout before the local fallbacks kicked in. Each upstream host gets a
+breaker that watches a rolling window of calls; once too many of them fail or
+are slow, the breaker opens and calls fail immediately with
+``CircuitOpenError`` so the tools go straight to their fallbacks. After
+``open_seconds`` a single probe call is let through: if it succeeds the
+breaker closes again, otherwise it stays open for another period.
+
+The breakers also keep recent latencies, which the HTTP clients use to pick
+the delay for hedged requests. ``breaker_stats`` reports state, trips and
+short-circuited calls per upstream.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+import requests
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_WINDOW_SIZE = 20
+DEFAULT_MIN_CALLS = 5
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL_SECONDS = 2.0
+DEFAULT_SLOW_CALL_RATE = 0.5
+DEFAULT_OPEN_SECONDS = 30.0
+LATENCY_SAMPLES = 200
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError, httpx.TransportError):
+    """Raised instead of calling an upstream whose circuit is open.
+
+    It is both a ``requests`` and an ``httpx`` connection error, so the sync
+    and async tools handle it exactly like an unreachable upstream.
+    """
+
+    def __init__(self, upstream: str, retry_after: float):
+        requests.exceptions.ConnectionError.__init__(
+            self, f"Circuit for {upstream} is open; retrying in {retry_after:.0f}s"
+        )
+        # httpx.HTTPError.request reads this attribute.
+        self._request = None
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Trips on the error or slow-call rate of a rolling window of calls."""
+
+    def __init__(
+        self,
+        name: str,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        min_calls: int = DEFAULT_MIN_CALLS,
+        failure_rate: float = DEFAULT_FAILURE_RATE,
+        slow_call_seconds: float = DEFAULT_SLOW_CALL_SECONDS,
+        slow_call_rate: float = DEFAULT_SLOW_CALL_RATE,
+        open_seconds: float = DEFAULT_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "short_circuited": 0,
+            "trips": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        """Returns "closed", "open" or "half_open"."""
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """Admits a call, or raises CircuitOpenError while the circuit is open."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if self._state == OPEN and remaining <= 0:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._counters["short_circuited"] += 1
+        raise CircuitOpenError(self.name, max(remaining, 0.0))
+
+    def record(self, latency: float, failed: bool) -> None:
+        """Records the outcome of an admitted call.
+
+        Args:
+            latency (float): Seconds the call took.
+            failed (bool): Whether the upstream errored or answered 5xx.
+        """
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["failures"] += failed
+            self._counters["slow_calls"] += slow
+            if not failed:
+                self._latencies.append(latency)
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if failed or slow:
+                    self._trip()
+                else:
+                    self._outcomes.clear()
+                    self._transition(CLOSED)
+                return
+            self._outcomes.append((failed, slow))
+            if self._state == CLOSED and self._should_trip():
+                self._trip()
+
+    def observe(self, latency: float) -> None:
+        """Keeps the latency of a successful call without judging the upstream."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def release(self) -> None:
+        """Forgets an admitted call that was cancelled before it finished."""
+        with self._lock:
+            self._probing = False
+
+    def note_hedge(self, won: bool) -> None:
+        """Counts a hedged attempt, and whether it beat the first one."""
+        with self._lock:
+            self._counters["hedges"] += 1
+            self._counters["hedge_wins"] += won
+
+    def latency_quantile(self, quantile: float, min_samples: int = 20) -> Optional[float]:
+        """Returns a quantile of recent successful call latencies.
+
+        Returns:
+            float: The latency in seconds, or None with too few samples.
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(quantile * len(samples)) - 1)]
+
+    def add_listener(self, listener: Callable[[str, str, str], None]) -> None:
+        """Calls ``listener(name, old_state, new_state)`` on every transition."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def stats(self) -> dict:
+        """Returns the state and counters of the breaker."""
+        p95 = self.latency_quantile(0.95, min_samples=1)
+        with self._lock:
+            return dict(
+                self._counters,
+                state=self._state,
+                p95_seconds=None if p95 is None else round(p95, 4),
+            )
+
+    def _should_trip(self) -> bool:
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return False
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        return failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate
+
+    def _trip(self) -> None:
+        self._opened_at = time.monotonic()
+        self._counters["trips"] += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        if previous == state:
+            return
+        logger.warning("Circuit for %s is now %s (was %s)", self.name, state, previous)
+        for listener in self._listeners:
+            try:
+                listener(self.name, previous, state)
+            except Exception:
+                logger.exception("Circuit breaker listener failed")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _env_settings() -> dict:
+    return {
+        "window_size": int(os.getenv("CIRCUIT_BREAKER_WINDOW", DEFAULT_WINDOW_SIZE)),
+        "min_calls": int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", DEFAULT_MIN_CALLS)),
+        "failure_rate": float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", DEFAULT_FAILURE_RATE)),
+        "slow_call_seconds": float(
+            os.getenv("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", DEFAULT_SLOW_CALL_SECONDS)
+        ),
+        "slow_call_rate": float(
+            os.getenv("CIRCUIT_BREAKER_SLOW_CALL_RATE", DEFAULT_SLOW_CALL_RATE)
+        ),
+        "open_seconds": float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", DEFAULT_OPEN_SECONDS)),
+    }
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """Returns the process-wide breaker for an upstream host."""
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = _breakers[upstream] = CircuitBreaker(upstream, **_env_settings())
+        return breaker
+
+
+def breaker_stats() -> dict:
+    """Returns the state and counters of every breaker, keyed by upstream."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def reset_breakers() -> None:
+    """Drops every breaker, e.g. between benchmark runs."""
+    with _breakers_lock:
+        _breakers.clear()
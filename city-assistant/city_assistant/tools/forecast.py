@@ -0,0 +1,415 @@
+"""Shared Pirate Weather forecast fetcher.
+
+get_weather and get_current_time both need the forecast document for the same
+coordinates. The fetcher keys payloads by rounded coordinates, keeps them for
+a short freshness window and coalesces concurrent requests, so a "time and
+weather" question costs one forecast call instead of two. The timezone field
+is kept separately with a much longer TTL.
+
+Within a grace window after the freshness window, a stale payload is still
+returned immediately, marked with its ``age_seconds``, while a background
+worker fetches a fresh one. A slow upstream then only delays the refresh, not
+the tool call.
+
+Forecast calls go through the "forecast" rate limiter (see ``rate_limit``).
+When the key's budget is exhausted, or the upstream's circuit breaker is
+open, the last payload seen for the location is returned, however old, with
+its ``age_seconds``, instead of an error.
+
+Requests ask the API to leave out the minutely, hourly, daily, alerts and
+flags blocks, and decoded payloads are projected down to the fields the tools
+read before they are cached.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from . import telemetry
+from .circuit_breaker import CircuitOpenError
+from .http_client import decode_json, get_async_http_client, get_http_client
+from .rate_limit import (
+    BACKGROUND,
+    INTERACTIVE,
+    RateLimitExceeded,
+    active_rate_limiter,
+    api_keys,
+    check_response,
+)
+from .singleflight import get_flight
+
+DEFAULT_BASE_URL = "https://api.pirateweather.net"
+DEFAULT_FRESHNESS_SECONDS = 300
+DEFAULT_STALE_SECONDS = 900
+DEFAULT_REFRESH_WORKERS = 2
+DEFAULT_TIMEZONE_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 4096
+# Two decimals is roughly 1 km, well below the forecast grid resolution.
+COORDINATE_PRECISION = 2
+# Blocks of the forecast document the tools never read.
+EXCLUDED_BLOCKS = "minutely,hourly,daily,alerts,flags"
+CURRENTLY_FIELDS = ("summary", "icon", "temperature", "apparentTemperature", "humidity", "windSpeed")
+# Extra keys, comma separated, that share the load with PIRATE_WEATHER_API_KEY.
+API_KEY_POOL_ENV = "PIRATE_WEATHER_API_KEYS"
+
+logger = logging.getLogger(__name__)
+
+
+def forecast_key(lat: float, lon: float) -> tuple:
+    """Returns the cache key for a coordinate pair."""
+    return round(lat, COORDINATE_PRECISION), round(lon, COORDINATE_PRECISION)
+
+
+def _forecast_url(api_key: str, lat: float, lon: float) -> str:
+    base_url = os.getenv("PIRATE_WEATHER_BASE_URL", DEFAULT_BASE_URL)
+    return f"{base_url}/forecast/{api_key}/{lat},{lon}"
+
+
+def project_forecast(payload: dict) -> dict:
+    """Keeps only the parts of a forecast document the tools read.
+
+    Args:
+        payload (dict): The decoded forecast document.
+
+    Returns:
+        dict: The timezone and the used fields of the ``currently`` block.
+    """
+    projected = {}
+    if payload.get("timezone"):
+        projected["timezone"] = payload["timezone"]
+    currently = payload.get("currently")
+    if currently is not None:
+        projected["currently"] = {
+            field: currently[field] for field in CURRENTLY_FIELDS if field in currently
+        }
+    return projected
+
+
+class ForecastFetcher:
+    """Caches and coalesces forecast requests keyed by rounded coordinates."""
+
+    def __init__(
+        self,
+        freshness_seconds: float = DEFAULT_FRESHNESS_SECONDS,
+        stale_seconds: float = DEFAULT_STALE_SECONDS,
+        timezone_ttl_seconds: float = DEFAULT_TIMEZONE_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.freshness_seconds = freshness_seconds
+        self.stale_seconds = stale_seconds
+        self.timezone_ttl_seconds = timezone_ttl_seconds
+        self.max_entries = max_entries
+        self._forecasts = OrderedDict()
+        self._timezones = OrderedDict()
+        self._flight = get_flight("forecast")
+        self._refreshing = set()
+        self._refresher = None
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "timezone_hits": 0,
+            "rate_limited": 0,
+            "circuit_open": 0,
+            "refresh_shed": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ForecastFetcher":
+        """Builds a fetcher configured from FORECAST_* environment variables."""
+        return cls(
+            freshness_seconds=float(
+                os.getenv("FORECAST_FRESHNESS_SECONDS", DEFAULT_FRESHNESS_SECONDS)
+            ),
+            stale_seconds=float(os.getenv("FORECAST_STALE_SECONDS", DEFAULT_STALE_SECONDS)),
+            timezone_ttl_seconds=float(
+                os.getenv("FORECAST_TIMEZONE_TTL_SECONDS", DEFAULT_TIMEZONE_TTL_SECONDS)
+            ),
+        )
+
+    def get_forecast(self, api_key: str, lat: float, lon: float) -> dict:
+        """Returns the forecast document for a location.
+
+        Callers arriving while another caller fetches the same key share
+        that fetch instead of issuing their own. A payload past its freshness
+        window but within the grace window is returned at once with an
+        ``age_seconds`` field and refreshed in the background. When the rate
+        limit leaves no budget or the circuit is open, the last payload seen
+        is returned instead.
+
+        Args:
+            api_key (str): The Pirate Weather API key.
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+
+        Returns:
+            dict: The decoded forecast payload.
+
+        Raises:
+            requests.exceptions.RequestException: If the upstream call fails,
+                or it is rate limited or its circuit is open and nothing is cached.
+        """
+        key = forecast_key(lat, lon)
+        payload = self._cached_forecast(api_key, key)
+        if payload is not None:
+            return payload
+
+        try:
+            return self._flight.do(key, lambda: self._load(api_key, key))
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            payload = self._last_known(key, e)
+            if payload is None:
+                raise
+            return payload
+
+    async def get_forecast_async(self, api_key: str, lat: float, lon: float) -> dict:
+        """Async counterpart of get_forecast sharing the same cache.
+
+        Concurrent callers on one event loop await a single in-flight fetch.
+
+        Args:
+            api_key (str): The Pirate Weather API key.
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+
+        Returns:
+            dict: The decoded forecast payload.
+
+        Raises:
+            httpx.HTTPError: If the upstream call fails.
+        """
+        key = forecast_key(lat, lon)
+        payload = self._cached_forecast(api_key, key)
+        if payload is not None:
+            return payload
+
+        try:
+            return await self._flight.do_async(key, lambda: self._load_async(api_key, key))
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            payload = self._last_known(key, e)
+            if payload is None:
+                raise
+            return payload
+
+    def get_timezone(self, api_key: str, lat: float, lon: float) -> str:
+        """Returns the IANA timezone name for a location.
+
+        Args:
+            api_key (str): The Pirate Weather API key.
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+
+        Returns:
+            str: The timezone name, "UTC" if the payload has none.
+        """
+        timezone = self._cached_timezone(forecast_key(lat, lon))
+        if timezone is not None:
+            return timezone
+        return self.get_forecast(api_key, lat, lon).get("timezone", "UTC")
+
+    async def get_timezone_async(self, api_key: str, lat: float, lon: float) -> str:
+        """Async counterpart of get_timezone sharing the same cache."""
+        timezone = self._cached_timezone(forecast_key(lat, lon))
+        if timezone is not None:
+            return timezone
+        payload = await self.get_forecast_async(api_key, lat, lon)
+        return payload.get("timezone", "UTC")
+
+    def refresh(self, api_key: str, lat: float, lon: float, priority: str = INTERACTIVE) -> dict:
+        """Fetches the forecast for a location even if the cached one is fresh.
+
+        Args:
+            api_key (str): The Pirate Weather API key.
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+            priority (str): Rate limit priority, BACKGROUND for prewarming.
+
+        Returns:
+            dict: The new forecast payload.
+
+        Raises:
+            requests.exceptions.RequestException: If the upstream call fails.
+        """
+        key = forecast_key(lat, lon)
+        with self._lock:
+            self._counters["refreshes"] += 1
+        return self._flight.do(key, lambda: self._fetch_and_store(api_key, key, priority))
+
+    def age(self, lat: float, lon: float) -> Optional[float]:
+        """Returns the age in seconds of the cached forecast, None if there is none."""
+        with self._lock:
+            entry = self._forecasts.get(forecast_key(lat, lon))
+        return None if entry is None else time.time() - entry[1]
+
+    def store(self, key: tuple, payload: dict) -> None:
+        """Records a freshly fetched payload and its timezone."""
+        now = time.time()
+        with self._lock:
+            self._put(self._forecasts, key, (payload, now))
+            if payload.get("timezone"):
+                self._put(
+                    self._timezones, key, (payload["timezone"], now + self.timezone_ttl_seconds)
+                )
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters."""
+        with self._lock:
+            return dict(self._counters)
+
+    def clear(self) -> None:
+        """Drops every cached payload and resets the counters."""
+        with self._lock:
+            self._forecasts.clear()
+            self._timezones.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def _cached_forecast(self, api_key: str, key: tuple) -> Optional[dict]:
+        with self._lock:
+            entry = self._forecasts.get(key)
+            if entry is None:
+                return None
+            payload, stored_at = entry
+            age = time.time() - stored_at
+            if age >= self.freshness_seconds + self.stale_seconds:
+                return None
+            self._forecasts.move_to_end(key)
+            if age < self.freshness_seconds:
+                self._counters["hits"] += 1
+                telemetry.count("cache.lookups", cache="forecast", result="hit")
+                return payload
+            self._counters["stale_hits"] += 1
+            telemetry.count("cache.lookups", cache="forecast", result="stale")
+        self._refresh_in_background(api_key, key)
+        return dict(payload, age_seconds=int(age))
+
+    def _fresh_forecast(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            entry = self._forecasts.get(key)
+            if entry is None or time.time() - entry[1] >= self.freshness_seconds:
+                return None
+            self._forecasts.move_to_end(key)
+            self._counters["hits"] += 1
+            telemetry.count("cache.lookups", cache="forecast", result="hit")
+            return entry[0]
+
+    def _last_known(self, key: tuple, error: Exception) -> Optional[dict]:
+        # Any payload, however old, beats an error while the budget is spent
+        # or the upstream is cut off.
+        with self._lock:
+            entry = self._forecasts.get(key)
+            if entry is None:
+                return None
+            self._counters["circuit_open" if isinstance(error, CircuitOpenError) else "rate_limited"] += 1
+        telemetry.count("cache.lookups", cache="forecast", result="fallback")
+        payload, stored_at = entry
+        return dict(payload, age_seconds=int(time.time() - stored_at))
+
+    def _cached_timezone(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._timezones.get(key)
+            if entry is None or entry[1] <= time.time():
+                telemetry.count("cache.lookups", cache="timezone", result="miss")
+                return None
+            self._timezones.move_to_end(key)
+            self._counters["timezone_hits"] += 1
+            telemetry.count("cache.lookups", cache="timezone", result="hit")
+            return entry[0]
+
+    def _put(self, table: OrderedDict, key: tuple, value: tuple) -> None:
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def _refresh_in_background(self, api_key: str, key: tuple) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(
+                    max_workers=DEFAULT_REFRESH_WORKERS, thread_name_prefix="forecast-refresh"
+                )
+            refresher = self._refresher
+        refresher.submit(self._background_refresh, api_key, key)
+
+    def _background_refresh(self, api_key: str, key: tuple) -> None:
+        with self._lock:
+            self._counters["refreshes"] += 1
+        try:
+            self._flight.do(key, lambda: self._fetch_and_store(api_key, key, BACKGROUND))
+        except (RateLimitExceeded, CircuitOpenError):
+            # Refreshes give way to interactive calls and to an open circuit;
+            # the next hit retries.
+            with self._lock:
+                self._counters["refresh_shed"] += 1
+        except Exception:
+            # The stale payload keeps being served until the grace window ends.
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+            logger.warning("Background refresh of forecast %s failed", key, exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _load(self, api_key: str, key: tuple) -> dict:
+        # A flight that finished just before this one started has already
+        # refreshed the entry.
+        payload = self._fresh_forecast(key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            self._counters["misses"] += 1
+        telemetry.count("cache.lookups", cache="forecast", result="miss")
+        return self._fetch_and_store(api_key, key)
+
+    def _fetch_and_store(self, api_key: str, key: tuple, priority: str = INTERACTIVE) -> dict:
+        limiter = active_rate_limiter("forecast")
+        if limiter is not None:
+            api_key = limiter.acquire(api_keys(api_key, API_KEY_POOL_ENV), priority)
+        response = get_http_client().get(
+            _forecast_url(api_key, *key), params={"exclude": EXCLUDED_BLOCKS}
+        )
+        return self._store_response(limiter, api_key, key, response)
+
+    async def _load_async(self, api_key: str, key: tuple) -> dict:
+        payload = self._fresh_forecast(key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            self._counters["misses"] += 1
+        telemetry.count("cache.lookups", cache="forecast", result="miss")
+        limiter = active_rate_limiter("forecast")
+        if limiter is not None:
+            api_key = await limiter.acquire_async(api_keys(api_key, API_KEY_POOL_ENV))
+        response = await get_async_http_client().get(
+            _forecast_url(api_key, *key), params={"exclude": EXCLUDED_BLOCKS}
+        )
+        return self._store_response(limiter, api_key, key, response)
+
+    def _store_response(self, limiter, api_key: str, key: tuple, response) -> dict:
+        check_response("forecast", limiter, api_key, response)
+        payload = project_forecast(decode_json(response))
+        self.store(key, payload)
+        return payload
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_forecast_fetcher() -> ForecastFetcher:
+    """Returns the process-wide forecast fetcher, creating it on first use."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = ForecastFetcher.from_env()
+    return _fetcher
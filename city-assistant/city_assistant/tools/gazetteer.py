@@ -0,0 +1,424 @@
+"""Offline gazetteer of populated places with fuzzy name matching.
+
+Resolves a city name to coordinates and an IANA timezone without any network
+call. Places are stored in a compact binary file that is memory-mapped, so a
+GeoNames-sized dataset (100k+ places) costs almost nothing to load and lookups
+take microseconds. Without a built file, the small seed list shipped in
+``city_assistant/data/seed_places.tsv`` is compiled in memory instead.
+
+Build the full dataset from a GeoNames dump (https://download.geonames.org/export/dump/):
+
+    python -m city_assistant.tools.gazetteer build cities500.txt \\
+        --country-info countryInfo.txt -o city_assistant/data/places.gaz
+
+File layout (little endian, every section 4-byte aligned):
+
+    header    magic, version, counts and section offsets (HEADER)
+    places    one PLACE record per searchable name, sorted by normalized name
+    zones     (string offset, length) per timezone name
+    trigrams  sorted u32 trigram hashes
+    postings  (first, count) into the posting list per trigram
+    list      u32 place record indices
+    strings   UTF-8 blob holding names, display names and zone names
+"""
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Iterable, NamedTuple, Optional
+
+from .geocode_cache import normalize_city
+
+MAGIC = b"CAGZ"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIIIIIII")
+# lat, lon, key offset, display name offset, key length, display name length,
+# zone index, population
+PLACE = struct.Struct("<ffIIBBHI")
+ZONE = struct.Struct("<II")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_PATH = os.path.join(DATA_DIR, "places.gaz")
+SEED_PATH = os.path.join(DATA_DIR, "seed_places.tsv")
+DEFAULT_MIN_SCORE = 0.8
+
+
+class Place(NamedTuple):
+    """A populated place and every name it can be searched by."""
+
+    names: tuple
+    display_name: str
+    latitude: float
+    longitude: float
+    timezone: str
+    population: int
+
+
+def trigrams(key: str) -> set:
+    """Returns the padded character trigrams of a normalized name."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_hash(trigram: str) -> int:
+    return zlib.crc32(trigram.encode("utf-8"))
+
+
+def _split_query(query: str) -> tuple:
+    """Splits "Paris, France" into the name key and qualifier keys."""
+    parts = [normalize_city(part) for part in query.split(",")]
+    return parts[0], [part for part in parts[1:] if part]
+
+
+def build_gazetteer(places: Iterable[Place]) -> bytes:
+    """Serializes places into the binary gazetteer format.
+
+    Args:
+        places: The places to index.
+
+    Returns:
+        bytes: The gazetteer file contents.
+    """
+    strings = bytearray()
+    string_offsets = {}
+
+    def intern(value: str, limit: int = 255) -> tuple:
+        encoded = value.encode("utf-8")[:limit].decode("utf-8", "ignore").encode("utf-8")
+        if encoded not in string_offsets:
+            string_offsets[encoded] = len(strings)
+            strings.extend(encoded)
+        return string_offsets[encoded], len(encoded)
+
+    zone_index = {}
+    zones = []
+    entries = []
+    for place in places:
+        if place.timezone not in zone_index:
+            zone_index[place.timezone] = len(zones)
+            zones.append(intern(place.timezone, limit=2 ** 32))
+        display = intern(place.display_name)
+        for key in {normalize_city(name) for name in place.names if name.strip()}:
+            entries.append((key.encode("utf-8")[:255], -place.population, place, display))
+
+    # Sort by name, then most populous first, so exact lookups hit the
+    # biggest place of that name.
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+    records = bytearray()
+    postings = {}
+    for index, (key_bytes, _, place, display) in enumerate(entries):
+        key_offset, key_length = intern(key_bytes.decode("utf-8", "ignore"))
+        records += PLACE.pack(
+            place.latitude,
+            place.longitude,
+            key_offset,
+            display[0],
+            key_length,
+            display[1],
+            zone_index[place.timezone],
+            min(place.population, 2 ** 32 - 1),
+        )
+        for trigram in trigrams(key_bytes.decode("utf-8", "ignore")):
+            postings.setdefault(_trigram_hash(trigram), []).append(index)
+
+    hashes = sorted(postings)
+    refs = bytearray()
+    posting_list = bytearray()
+    for trigram_hash in hashes:
+        refs += struct.pack("<II", len(posting_list) // 4, len(postings[trigram_hash]))
+        posting_list += struct.pack(f"<{len(postings[trigram_hash])}I", *postings[trigram_hash])
+
+    sections = [
+        bytes(records),
+        b"".join(ZONE.pack(*zone) for zone in zones),
+        struct.pack(f"<{len(hashes)}I", *hashes),
+        bytes(refs),
+        bytes(posting_list),
+        bytes(strings),
+    ]
+    offsets = []
+    body = bytearray()
+    for section in sections:
+        body += b"\0" * (-(HEADER.size + len(body)) % 4)
+        offsets.append(HEADER.size + len(body))
+        body += section
+    header = HEADER.pack(MAGIC, VERSION, 0, len(entries), len(zones), len(hashes), *offsets)
+    return header + bytes(body)
+
+
+class Gazetteer:
+    """Read-only view over a binary gazetteer buffer.
+
+    ``seed`` marks the in-memory gazetteer compiled from the bundled seed list.
+    """
+
+    def __init__(self, buffer, seed: bool = False):
+        self.seed = seed
+        (magic, version, _, self._count, zone_count, trigram_count,
+         self._places_offset, zones_offset, trigrams_offset, refs_offset,
+         postings_offset, self._strings_offset) = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a city_assistant gazetteer file")
+        self._buffer = buffer
+        view = memoryview(buffer)
+        self._hashes = view[trigrams_offset:trigrams_offset + 4 * trigram_count].cast("I")
+        self._refs = view[refs_offset:refs_offset + 8 * trigram_count].cast("I")
+        self._postings = view[postings_offset:self._strings_offset].cast("I")
+        self._zones = [
+            self._string(*ZONE.unpack_from(buffer, zones_offset + i * ZONE.size))
+            for i in range(zone_count)
+        ]
+        self._keys = _KeyView(self)
+
+    @classmethod
+    def open(cls, path: str) -> "Gazetteer":
+        """Memory-maps a gazetteer file."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_seed(cls, path: str = SEED_PATH) -> "Gazetteer":
+        """Compiles the bundled seed list into an in-memory gazetteer."""
+        return cls(build_gazetteer(read_seed(path)), seed=True)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def points(self) -> Iterable[tuple]:
+        """Yields (latitude, longitude, timezone) for every record."""
+        for offset in range(self._places_offset, self._places_offset + self._count * PLACE.size, PLACE.size):
+            lat, lon, _, _, _, _, zone, _ = PLACE.unpack_from(self._buffer, offset)
+            yield lat, lon, self._zones[zone]
+
+    def lookup(self, query: str) -> Optional[dict]:
+        """Finds a place by exact (normalized) name.
+
+        A query like "Paris, France" or "Portland, US" keeps only places whose
+        display name contains every qualifier after the first comma.
+
+        Args:
+            query (str): The place name to look up.
+
+        Returns:
+            dict: The most populous matching place, or None.
+        """
+        key, qualifiers = _split_query(query)
+        if not key:
+            return None
+        encoded = key.encode("utf-8")
+        index = bisect.bisect_left(self._keys, encoded)
+        while index < self._count and self._keys[index] == encoded:
+            place = self._place(index)
+            if _matches(place, qualifiers):
+                place["score"] = 1.0
+                return place
+            index += 1
+        return None
+
+    def prefix(self, prefix: str, limit: int = 10) -> list:
+        """Returns places whose normalized name starts with a prefix."""
+        encoded = normalize_city(prefix).encode("utf-8")
+        index = bisect.bisect_left(self._keys, encoded)
+        matches = []
+        while index < self._count and len(matches) < limit and self._keys[index].startswith(encoded):
+            matches.append(self._place(index))
+            index += 1
+        return matches
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.5) -> list:
+        """Finds places with names similar to the query.
+
+        The trigram index narrows the search to names sharing the most
+        trigrams with the query; those are scored by edit similarity, with
+        ties going to the larger place.
+
+        Args:
+            query (str): The (possibly misspelled) place name.
+            limit (int): Maximum number of places to return.
+            min_score (float): Minimum similarity between 0 and 1.
+
+        Returns:
+            list: Matching places, best first, each with a "score".
+        """
+        key, qualifiers = _split_query(query)
+        query_trigrams = trigrams(key) if key else set()
+        counts = Counter()
+        for trigram in query_trigrams:
+            trigram_hash = _trigram_hash(trigram)
+            position = bisect.bisect_left(self._hashes, trigram_hash)
+            if position < len(self._hashes) and self._hashes[position] == trigram_hash:
+                first, count = self._refs[2 * position], self._refs[2 * position + 1]
+                counts.update(self._postings[first:first + count])
+
+        scored = []
+        seen = set()
+        for index, _ in counts.most_common(limit * 10):
+            candidate = self._keys[index].decode("utf-8")
+            score = SequenceMatcher(None, key, candidate).ratio()
+            if score < min_score:
+                continue
+            place = self._place(index)
+            identity = (place["display_name"], place["latitude"], place["longitude"])
+            if identity in seen or not _matches(place, qualifiers):
+                continue
+            seen.add(identity)
+            place["score"] = round(score, 3)
+            scored.append(place)
+        scored.sort(key=lambda place: (-place["score"], -place["population"]))
+        return scored[:limit]
+
+    def resolve(self, query: str, min_score: float = DEFAULT_MIN_SCORE) -> Optional[dict]:
+        """Returns the exact match for a query, else the best fuzzy match."""
+        place = self.lookup(query)
+        if place is not None:
+            return place
+        matches = self.search(query, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return bytes(self._buffer[start:start + length]).decode("utf-8")
+
+    def _record(self, index: int) -> tuple:
+        return PLACE.unpack_from(self._buffer, self._places_offset + index * PLACE.size)
+
+    def _place(self, index: int) -> dict:
+        lat, lon, key_offset, name_offset, key_length, name_length, zone, population = self._record(index)
+        return {
+            "name": self._string(key_offset, key_length),
+            "display_name": self._string(name_offset, name_length),
+            "latitude": round(lat, 4),
+            "longitude": round(lon, 4),
+            "timezone": self._zones[zone],
+            "population": population,
+        }
+
+
+class _KeyView:
+    """Sequence of encoded place keys, so ``bisect`` can search the records."""
+
+    def __init__(self, gazetteer: Gazetteer):
+        self._gazetteer = gazetteer
+
+    def __len__(self) -> int:
+        return len(self._gazetteer)
+
+    def __getitem__(self, index: int) -> bytes:
+        record = self._gazetteer._record(index)
+        start = self._gazetteer._strings_offset + record[2]
+        return bytes(self._gazetteer._buffer[start:start + record[4]])
+
+
+def _matches(place: dict, qualifiers: list) -> bool:
+    display_name = normalize_city(place["display_name"])
+    return all(qualifier in display_name for qualifier in qualifiers)
+
+
+def read_seed(path: str = SEED_PATH) -> list:
+    """Reads the bundled tab-separated seed list."""
+    places = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, alternates, country, lat, lon, timezone, population = line.rstrip("\n").split("\t")
+            places.append(Place(
+                names=(name, *filter(None, alternates.split("|"))),
+                display_name=f"{name}, {country}",
+                latitude=float(lat),
+                longitude=float(lon),
+                timezone=timezone,
+                population=int(population),
+            ))
+    return places
+
+
+def read_geonames(path: str, country_info: Optional[str] = None, alternate_min_population: int = 1_000_000) -> Iterable[Place]:
+    """Reads places from a GeoNames ``citiesNNN.txt`` dump.
+
+    Args:
+        path (str): Path to the GeoNames dump.
+        country_info (str): Optional path to ``countryInfo.txt`` so display
+            names carry country names instead of ISO codes.
+        alternate_min_population (int): Places at least this large are also
+            indexed under their alternate names (e.g. "Bombay").
+
+    Yields:
+        Place: One entry per populated place.
+    """
+    countries = {}
+    if country_info:
+        with open(country_info, encoding="utf-8") as f:
+            for line in f:
+                if not line.startswith("#"):
+                    columns = line.rstrip("\n").split("\t")
+                    countries[columns[0]] = columns[4]
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 18 or not columns[17]:
+                continue
+            population = int(columns[14] or 0)
+            names = [columns[1], columns[2]]
+            if population >= alternate_min_population:
+                names += columns[3].split(",")
+            country = countries.get(columns[8], columns[8])
+            yield Place(
+                names=tuple(names),
+                display_name=f"{columns[1]}, {country}",
+                latitude=float(columns[4]),
+                longitude=float(columns[5]),
+                timezone=columns[17],
+                population=population,
+            )
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Returns the process-wide gazetteer, loading it on first use.
+
+    GAZETTEER_PATH selects a built file; otherwise ``data/places.gaz`` is used
+    when present, and the bundled seed list when it is not.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                path = os.getenv("GAZETTEER_PATH", DEFAULT_PATH)
+                _gazetteer = Gazetteer.open(path) if os.path.exists(path) else Gazetteer.from_seed()
+    return _gazetteer
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build a gazetteer file from a GeoNames dump.")
+    build.add_argument("geonames", help="GeoNames citiesNNN.txt file.")
+    build.add_argument("--country-info", help="GeoNames countryInfo.txt file.")
+    build.add_argument("--alternate-names-min-population", type=int, default=1_000_000)
+    build.add_argument("-o", "--output", default=DEFAULT_PATH)
+    query = commands.add_parser("query", help="Look up a place.")
+    query.add_argument("name")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        places = read_geonames(args.geonames, args.country_info, args.alternate_names_min_population)
+        data = build_gazetteer(places)
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f"Wrote {len(Gazetteer(data))} names ({len(data) / 1e6:.1f} MB) to {args.output}")
+    else:
+        for place in get_gazetteer().search(args.name) or [None]:
+            print(place)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Two-tier TTL cache for geocoding results.
+
+Lookups are served from an in-process LRU first and then from a SQLite file
+shared by every worker process on the host, so resolved coordinates survive
+restarts. Negative results ("no such city") are cached with a shorter TTL.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from . import telemetry
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "city_assistant", "geocode.sqlite3"
+)
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def normalize_city(city: str) -> str:
+    """Normalizes a city name into a cache key.
+
+    Folds case, strips diacritics and collapses whitespace so that
+    "  São  Paulo" and "sao paulo" share one entry.
+
+    Args:
+        city (str): The city name as given by the user or model.
+
+    Returns:
+        str: The normalized key.
+    """
+    decomposed = unicodedata.normalize("NFKD", city)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().replace(",", ", ").split())
+
+
+class GeocodeCache:
+    """LRU cache in front of a persistent SQLite store of geocoding results."""
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        negative_ttl_seconds: float = DEFAULT_NEGATIVE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_enabled = bool(path)
+        self._counters = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0}
+        if self._disk_enabled:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = self._connection()
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode ("
+                    " key TEXT PRIMARY KEY,"
+                    " result TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.commit()
+            except (OSError, sqlite3.Error):
+                # A read-only or missing cache directory must never break the
+                # tools; degrade to the in-process tier only.
+                self._disk_enabled = False
+
+    @classmethod
+    def from_env(cls) -> "GeocodeCache":
+        """Builds a cache configured from GEOCODE_CACHE_* environment variables."""
+        return cls(
+            path=os.getenv("GEOCODE_CACHE_PATH", DEFAULT_CACHE_PATH),
+            max_entries=int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(os.getenv("GEOCODE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            negative_ttl_seconds=float(
+                os.getenv("GEOCODE_CACHE_NEGATIVE_TTL_SECONDS", DEFAULT_NEGATIVE_TTL_SECONDS)
+            ),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, so keep one
+        # per thread. WAL lets several worker processes read while one writes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, city: str) -> Optional[dict]:
+        """Returns the cached result for a city, or None on a miss.
+
+        Args:
+            city (str): The city name to look up.
+
+        Returns:
+            dict: A copy of the cached get_lat_long result, or None.
+        """
+        key = normalize_city(city)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                result, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    telemetry.count("cache.lookups", cache="geocode", result="hit")
+                    return dict(result)
+                del self._memory[key]
+
+        entry = self._disk_get(key, now)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                telemetry.count("cache.lookups", cache="geocode", result="miss")
+                return None
+            self._counters["hits"] += 1
+            self._counters["disk_hits"] += 1
+            telemetry.count("cache.lookups", cache="geocode", result="disk_hit")
+            self._remember(key, *entry)
+        return dict(entry[0])
+
+    def set(self, city: str, result: dict) -> None:
+        """Stores a get_lat_long result.
+
+        Successful lookups use the regular TTL, anything else is treated as a
+        negative result and expires after the shorter negative TTL.
+
+        Args:
+            city (str): The city name that was looked up.
+            result (dict): The get_lat_long result to cache.
+        """
+        key = normalize_city(city)
+        ttl = self.ttl_seconds if result.get("status") == "success" else self.negative_ttl_seconds
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, dict(result), expires_at)
+        self._disk_set(key, result, expires_at)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the in-process entry count."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drops every entry from both tiers and resets the counters."""
+        with self._lock:
+            self._memory.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+        if self._disk_enabled:
+            try:
+                conn = self._connection()
+                conn.execute("DELETE FROM geocode")
+                conn.commit()
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key: str, result: dict, expires_at: float) -> None:
+        self._memory[key] = (result, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        if not self._disk_enabled:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT result, expires_at FROM geocode WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_set(self, key: str, result: dict, expires_at: float) -> None:
+        if not self._disk_enabled:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, result, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), expires_at),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache() -> GeocodeCache:
+    """Returns the process-wide geocode cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeocodeCache.from_env()
+    return _cache
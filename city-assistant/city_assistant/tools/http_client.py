@@ -0,0 +1,451 @@
+"""Shared, connection-pooled HTTP clients for the city assistant tools.
+
+Module-level ``requests.get`` opens a fresh TCP+TLS connection per call. The
+clients here keep keep-alive pools per host (urllib3 keeps one pool per
+scheme/host/port behind a single adapter) and apply per-host connect/read
+timeouts. ``AsyncHttpClient`` is the asyncio counterpart used by the async
+tools; it negotiates HTTP/2 when the ``h2`` package is installed. Tests and
+benchmarks can swap either client out with ``set_http_client`` and
+``set_async_http_client``.
+
+Every call goes through the circuit breaker of its upstream host (see
+``circuit_breaker``). With HTTP_HEDGE enabled, a GET that has not answered
+within the recent p95 latency of its host is sent a second time and the first
+response wins.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import telemetry
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_HOSTS = 10
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 3.05
+DEFAULT_READ_TIMEOUT_SECONDS = 10.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_HEDGE_MIN_DELAY_SECONDS = 0.05
+
+
+def parse_timeouts(spec: str) -> dict:
+    """Parses per-host timeouts from "host=connect:read,host=connect:read".
+
+    Args:
+        spec (str): The timeout specification, e.g. "geocode.maps.co=2:5".
+
+    Returns:
+        dict: Mapping of host name to a (connect, read) tuple in seconds.
+    """
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        host, _, values = item.partition("=")
+        connect, _, read = values.partition(":")
+        timeouts[host.strip().lower()] = (float(connect), float(read or connect))
+    return timeouts
+
+
+def _timeout_for(url: str, host_timeouts: dict, default_timeout: tuple) -> tuple:
+    host = (urlsplit(url).hostname or "").lower()
+    return host_timeouts.get(host, default_timeout)
+
+
+def _upstream(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def _is_failure(status_code: int) -> bool:
+    # Client errors are the caller's fault and say nothing about the upstream;
+    # a 429 is quota pressure, which the rate limiter handles.
+    return status_code >= 500
+
+
+def _hedge_delay(breaker: CircuitBreaker, quantile: float, min_delay: float) -> Optional[float]:
+    latency = breaker.latency_quantile(quantile)
+    return None if latency is None else max(latency, min_delay)
+
+
+def _record(breaker: CircuitBreaker, enforced: bool, started: float, failed: bool) -> None:
+    latency = time.monotonic() - started
+    if enforced:
+        breaker.record(latency, failed)
+    elif not failed:
+        # Latencies are still needed to pick the hedging delay.
+        breaker.observe(latency)
+
+
+def _admit(breaker: CircuitBreaker, upstream: str) -> None:
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        _count_error(upstream, "circuit_open")
+        raise
+
+
+def _count_error(upstream: str, error: str) -> None:
+    telemetry.count("upstream.errors", upstream=upstream, error=error)
+
+
+def _observe_response(current: telemetry.Span, upstream: str, status_code: int, failed: bool) -> None:
+    current.set_attribute("status_code", status_code)
+    telemetry.count("upstream.requests", upstream=upstream, status_code=status_code)
+    if failed:
+        current.set_error(f"HTTP {status_code}")
+        _count_error(upstream, str(status_code))
+
+
+def decode_json(response):
+    """Parses a JSON response body, recording the time in the decode phase."""
+    started = time.perf_counter()
+    data = response.json()
+    telemetry.record_phase(_upstream(str(response.url)), "decode", (time.perf_counter() - started) * 1e3)
+    return data
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_settings() -> dict:
+    return {
+        "pool_size": int(os.getenv("HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        "default_timeout": (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", DEFAULT_CONNECT_TIMEOUT_SECONDS)),
+            float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", DEFAULT_READ_TIMEOUT_SECONDS)),
+        ),
+        "host_timeouts": parse_timeouts(os.getenv("HTTP_HOST_TIMEOUTS", "")),
+        "circuit_breaker": _flag("HTTP_CIRCUIT_BREAKER", "true"),
+        "hedge": _flag("HTTP_HEDGE", "false"),
+        "hedge_quantile": float(os.getenv("HTTP_HEDGE_QUANTILE", DEFAULT_HEDGE_QUANTILE)),
+        "hedge_min_delay": float(
+            os.getenv("HTTP_HEDGE_MIN_DELAY_SECONDS", DEFAULT_HEDGE_MIN_DELAY_SECONDS)
+        ),
+    }
+
+
+class HttpClient:
+    """Thread-safe GET client with per-host keep-alive pools and timeouts.
+
+    All threads share one adapter, and therefore one set of connection pools,
+    but each thread gets its own ``requests.Session`` so that session state
+    such as cookies is never mutated concurrently.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_hosts: int = DEFAULT_POOL_HOSTS,
+        default_timeout: tuple = (DEFAULT_CONNECT_TIMEOUT_SECONDS, DEFAULT_READ_TIMEOUT_SECONDS),
+        host_timeouts: Optional[dict] = None,
+        circuit_breaker: bool = True,
+        hedge: bool = False,
+        hedge_quantile: float = DEFAULT_HEDGE_QUANTILE,
+        hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY_SECONDS,
+    ):
+        self.default_timeout = default_timeout
+        self.host_timeouts = dict(host_timeouts or {})
+        self.circuit_breaker = circuit_breaker
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self._hedge_pool = None
+        self._hedge_pool_lock = threading.Lock()
+        self._pool_size = pool_size
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_hosts,
+            pool_maxsize=pool_size,
+            pool_block=False,
+        )
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "HttpClient":
+        """Builds a client configured from HTTP_* environment variables."""
+        return cls(**_env_settings())
+
+    def timeout_for(self, url: str) -> tuple:
+        """Returns the (connect, read) timeout that applies to a URL."""
+        return _timeout_for(url, self.host_timeouts, self.default_timeout)
+
+    def get(self, url: str, params: Optional[dict] = None, **kwargs) -> requests.Response:
+        """Issues a GET request over a pooled connection.
+
+        Args:
+            url (str): The URL to fetch.
+            params (dict): Optional query parameters.
+            **kwargs: Passed through to ``requests.Session.get``.
+
+        Returns:
+            requests.Response: The response; the caller checks the status.
+
+        Raises:
+            CircuitOpenError: If the upstream's circuit is open.
+        """
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        upstream = _upstream(url)
+        breaker = get_breaker(upstream)
+        with telemetry.span("http GET", upstream=upstream) as current:
+            if self.circuit_breaker:
+                _admit(breaker, upstream)
+            started = time.monotonic()
+            try:
+                response = self._hedged_get(breaker, url, params, kwargs)
+            except Exception as e:
+                _record(breaker, self.circuit_breaker, started, failed=True)
+                _count_error(upstream, type(e).__name__)
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            failed = _is_failure(response.status_code)
+            _record(breaker, self.circuit_breaker, started, failed=failed)
+            _observe_response(current, upstream, response.status_code, failed)
+            # requests reads the body before returning; elapsed stops at the headers.
+            ttfb = response.elapsed.total_seconds()
+            telemetry.record_phase(upstream, "ttfb", ttfb * 1e3)
+            telemetry.record_phase(upstream, "body", max(time.monotonic() - started - ttfb, 0.0) * 1e3)
+            return response
+
+    def close(self) -> None:
+        """Closes every pooled connection."""
+        self._adapter.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+    def _hedged_get(
+        self, breaker: CircuitBreaker, url: str, params: Optional[dict], kwargs: dict
+    ) -> requests.Response:
+        delay = _hedge_delay(breaker, self.hedge_quantile, self.hedge_min_delay) if self.hedge else None
+        if delay is None:
+            return self._session().get(url, params=params, **kwargs)
+
+        pool = self._pool()
+        first = pool.submit(self._send, url, params, kwargs)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = pool.submit(self._send, url, params, kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                breaker.note_hedge(won=future is second)
+                for loser in pending:
+                    loser.add_done_callback(_discard_response)
+                return response
+        breaker.note_hedge(won=False)
+        raise error
+
+    def _send(self, url: str, params: Optional[dict], kwargs: dict) -> requests.Response:
+        return self._session().get(url, params=params, **kwargs)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._hedge_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=self._pool_size * 2, thread_name_prefix="http-hedge"
+                )
+            return self._hedge_pool
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
+
+def _discard_response(future) -> None:
+    # Releases the connection held by the slower of two hedged attempts.
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class AsyncHttpClient:
+    """asyncio GET client over a pooled ``httpx.AsyncClient``.
+
+    httpx connections are bound to the event loop that opened them, so
+    ``get_async_http_client`` keeps one client per running loop.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_hosts: int = DEFAULT_POOL_HOSTS,
+        default_timeout: tuple = (DEFAULT_CONNECT_TIMEOUT_SECONDS, DEFAULT_READ_TIMEOUT_SECONDS),
+        host_timeouts: Optional[dict] = None,
+        http2: bool = HTTP2_AVAILABLE,
+        circuit_breaker: bool = True,
+        hedge: bool = False,
+        hedge_quantile: float = DEFAULT_HEDGE_QUANTILE,
+        hedge_min_delay: float = DEFAULT_HEDGE_MIN_DELAY_SECONDS,
+    ):
+        self.default_timeout = default_timeout
+        self.host_timeouts = dict(host_timeouts or {})
+        self.circuit_breaker = circuit_breaker
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=pool_size * pool_hosts,
+                max_keepalive_connections=pool_size * pool_hosts,
+            ),
+        )
+
+    @classmethod
+    def from_env(cls) -> "AsyncHttpClient":
+        """Builds a client configured from HTTP_* environment variables."""
+        return cls(**_env_settings())
+
+    def timeout_for(self, url: str) -> httpx.Timeout:
+        """Returns the httpx timeout that applies to a URL."""
+        connect, read = _timeout_for(url, self.host_timeouts, self.default_timeout)
+        return httpx.Timeout(read, connect=connect)
+
+    async def get(self, url: str, params: Optional[dict] = None, **kwargs) -> httpx.Response:
+        """Issues a GET request over a pooled connection.
+
+        Args:
+            url (str): The URL to fetch.
+            params (dict): Optional query parameters.
+            **kwargs: Passed through to ``httpx.AsyncClient.get``.
+
+        Returns:
+            httpx.Response: The response; the caller checks the status.
+
+        Raises:
+            CircuitOpenError: If the upstream's circuit is open.
+        """
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        upstream = _upstream(url)
+        kwargs.setdefault("extensions", {"trace": telemetry.HttpxPhaseTimer(upstream)})
+        breaker = get_breaker(upstream)
+        with telemetry.span("http GET", upstream=upstream) as current:
+            if self.circuit_breaker:
+                _admit(breaker, upstream)
+            started = time.monotonic()
+            try:
+                response = await self._hedged_get(breaker, url, params, kwargs)
+            except Exception as e:
+                _record(breaker, self.circuit_breaker, started, failed=True)
+                _count_error(upstream, type(e).__name__)
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            failed = _is_failure(response.status_code)
+            _record(breaker, self.circuit_breaker, started, failed=failed)
+            _observe_response(current, upstream, response.status_code, failed)
+            return response
+
+    async def aclose(self) -> None:
+        """Closes every pooled connection."""
+        await self._client.aclose()
+
+    async def _hedged_get(
+        self, breaker: CircuitBreaker, url: str, params: Optional[dict], kwargs: dict
+    ) -> httpx.Response:
+        delay = _hedge_delay(breaker, self.hedge_quantile, self.hedge_min_delay) if self.hedge else None
+        if delay is None:
+            return await self._client.get(url, params=params, **kwargs)
+
+        first = asyncio.ensure_future(self._client.get(url, params=params, **kwargs))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            second = asyncio.ensure_future(self._client.get(url, params=params, **kwargs))
+            tasks.append(second)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    breaker.note_hedge(won=task is second)
+                    return task.result()
+        finally:
+            # Cancelling the slower attempt returns its connection to the pool.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        breaker.note_hedge(won=False)
+        raise error
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_async_override = None
+
+
+def get_http_client() -> HttpClient:
+    """Returns the process-wide HTTP client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient.from_env()
+    return _client
+
+
+def set_http_client(client: Optional[HttpClient]) -> None:
+    """Replaces the process-wide HTTP client, e.g. with one aimed at a stub.
+
+    Passing None drops the current client so the next call rebuilds it from
+    the environment.
+    """
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_async_http_client() -> AsyncHttpClient:
+    """Returns the async HTTP client for the running event loop."""
+    if _async_override is not None:
+        return _async_override
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = AsyncHttpClient.from_env()
+    return client
+
+
+def set_async_http_client(client: Optional[AsyncHttpClient]) -> None:
+    """Forces every event loop to use the given async client.
+
+    Passing None restores the default of one client per event loop.
+    """
+    global _async_override
+    with _client_lock:
+        _async_override = client
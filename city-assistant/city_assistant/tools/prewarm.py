@@ -0,0 +1,133 @@
+"""Keeps the forecasts of frequently asked-about cities warm.
+
+Cities listed in CITY_ASSISTANT_HOT_CITIES (comma separated) are resolved and
+fetched when the agent starts, then refreshed on a background thread before
+their cached forecast goes stale, so questions about them never wait for the
+forecast API.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+from .circuit_breaker import CircuitOpenError
+from .forecast import ForecastFetcher, get_forecast_fetcher
+from .rate_limit import BACKGROUND, RateLimitExceeded
+from .tools import get_lat_long
+
+DEFAULT_INTERVAL_SECONDS = 60
+# Refresh once a payload has used up this share of its freshness window.
+REFRESH_AT = 0.8
+
+logger = logging.getLogger(__name__)
+
+
+def hot_cities() -> list:
+    """Returns the cities named in CITY_ASSISTANT_HOT_CITIES."""
+    value = os.getenv("CITY_ASSISTANT_HOT_CITIES", "")
+    return [city.strip() for city in value.split(",") if city.strip()]
+
+
+class HotCityWarmer:
+    """Background thread that keeps a fixed set of forecasts fresh."""
+
+    def __init__(
+        self,
+        cities: list,
+        api_key: str,
+        fetcher: ForecastFetcher,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+    ):
+        self.cities = list(cities)
+        self.api_key = api_key
+        self.fetcher = fetcher
+        self.interval_seconds = interval_seconds
+        self._coordinates = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def warm_once(self) -> int:
+        """Refreshes every hot city whose forecast is missing or ageing.
+
+        Returns:
+            int: How many forecasts were fetched.
+        """
+        refresh_after = self.fetcher.freshness_seconds * REFRESH_AT
+        fetched = 0
+        for city in self.cities:
+            if self._stopped.is_set():
+                break
+            coords = self._resolve(city)
+            if coords is None:
+                continue
+            age = self.fetcher.age(*coords)
+            if age is not None and age < refresh_after:
+                continue
+            try:
+                self.fetcher.refresh(self.api_key, *coords, priority=BACKGROUND)
+                fetched += 1
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                # Prewarming yields to interactive calls and to an open
+                # breaker; retried next pass.
+                logger.debug("Prewarming %s deferred: %s", city, e)
+            except Exception:
+                logger.warning("Could not prewarm the forecast for %s", city, exc_info=True)
+        return fetched
+
+    def start(self) -> "HotCityWarmer":
+        """Starts the refresh thread; the first pass runs immediately."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="hot-city-warmer", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stops the refresh thread after its current pass."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.warm_once()
+            self._stopped.wait(self.interval_seconds)
+
+    def _resolve(self, city: str) -> Optional[tuple]:
+        coords = self._coordinates.get(city)
+        if coords is None:
+            result = get_lat_long(city)
+            if result["status"] != "success":
+                logger.warning("Hot city %s could not be resolved: %s", city, result.get("error_message"))
+                return None
+            coords = self._coordinates[city] = (result["latitude"], result["longitude"])
+        return coords
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_hot_city_warmer() -> Optional[HotCityWarmer]:
+    """Starts the process-wide warmer if hot cities and an API key are configured.
+
+    Returns:
+        HotCityWarmer: The running warmer, or None if there is nothing to warm.
+    """
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            cities = hot_cities()
+            api_key = os.getenv("PIRATE_WEATHER_API_KEY")
+            if not cities or not api_key:
+                return None
+            _warmer = HotCityWarmer(
+                cities,
+                api_key,
+                get_forecast_fetcher(),
+                interval_seconds=float(
+                    os.getenv("HOT_CITIES_REFRESH_SECONDS", DEFAULT_INTERVAL_SECONDS)
+                ),
+            ).start()
+        return _warmer
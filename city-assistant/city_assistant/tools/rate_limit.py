@@ -0,0 +1,363 @@
+"""Client-side rate limiting for the geocoding and forecast API keys.
+
+Every forecast call used to go straight out on one shared Pirate Weather key,
+so a burst of questions ran into the key's quota and the 429s surfaced as tool
+errors. Each upstream now has a ``RateLimiter`` holding one token bucket per
+API key. A call takes a token before it is sent:
+
+* interactive calls (a tool answering a user) wait up to ``max_wait_seconds``
+  for a token, in a bounded queue;
+* background calls (stale-while-revalidate refreshes, hot city prewarming)
+  never wait and only spend tokens while the bucket is above its reserve, so
+  they cannot starve interactive calls.
+
+Calls that cannot get a token raise ``RateLimitExceeded`` and the forecast
+fetcher answers them from its cache when it has anything for the location.
+The buckets also follow the ``RateLimit-*`` / ``X-RateLimit-*`` and
+``Retry-After`` headers of the responses, so the client slows down with the
+server's remaining quota rather than after the first 429.
+
+With several keys configured (PIRATE_WEATHER_API_KEYS, GEOCODE_MAPS_API_KEYS)
+each call goes out on the key that can serve it soonest.
+
+The limiters are opt-in (RATE_LIMIT_ENABLED=true): the geocode default of one
+request per second sheds concurrent lookups that used to go through. Without
+them a 429 still raises ``RateLimitExceeded``, so the cache fallback holds.
+"""
+import asyncio
+import email.utils
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+import requests
+
+from . import telemetry
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+DEFAULT_LIMITS = {
+    # geocode.maps.co allows one request per second on free keys.
+    "geocode": (1.0, 2),
+    # Pirate Weather quotas are per month; this only smooths bursts.
+    "forecast": (10.0, 20),
+}
+DEFAULT_MAX_WAIT_SECONDS = 2.0
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_BACKGROUND_RESERVE = 0.5
+# How long a key is parked after a 429 that carries no reset hint.
+DEFAULT_BLOCK_SECONDS = 60.0
+
+REMAINING_HEADERS = ("RateLimit-Remaining", "X-RateLimit-Remaining")
+RESET_HEADERS = ("RateLimit-Reset", "X-RateLimit-Reset")
+
+
+class RateLimitExceeded(requests.exceptions.RequestException, httpx.HTTPError):
+    """Raised when a call cannot be sent within the upstream's rate limit.
+
+    It is both a ``requests`` and an ``httpx`` error, so the sync and async
+    tools report it like any other failed upstream call.
+    """
+
+    def __init__(self, upstream: str, retry_after: float):
+        requests.exceptions.RequestException.__init__(
+            self, f"Rate limit for {upstream} reached; retry in {retry_after:.1f}s"
+        )
+        # httpx.HTTPError.request reads this attribute.
+        self._request = None
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket that can also be drained or parked by server hints.
+
+    A ``rate`` of 0 means no client-side limit; the bucket then only follows
+    the server's headers.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+
+    def wait_time(self, now: float, reserve: float = 0.0) -> float:
+        """Returns how long until a token can be taken, 0 if one is available now."""
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.rate <= 0:
+            return 0.0
+        needed = 1.0 + reserve - self.tokens
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self.tokens -= 1.0
+
+    def constrain(self, now: float, remaining: int, reset_seconds: Optional[float]) -> None:
+        """Applies the server's view of the remaining quota."""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0:
+            self.block(now, reset_seconds)
+
+    def block(self, now: float, seconds: Optional[float]) -> None:
+        """Parks the key, e.g. after a 429."""
+        self.tokens = min(self.tokens, 0.0)
+        if seconds is None:
+            seconds = DEFAULT_BLOCK_SECONDS
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(float(self.burst), self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+def _header_seconds(value: str, now: float) -> Optional[float]:
+    # Seconds to wait, an epoch timestamp, or an HTTP date (Retry-After).
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - now, 0.0)
+        except (TypeError, ValueError):
+            return None
+    if seconds > 1e9:
+        return max(seconds - now, 0.0)
+    return max(seconds, 0.0)
+
+
+def _first_header(headers, names: tuple) -> Optional[str]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            # Some servers send one value per policy, e.g. "10, 9".
+            return value.split(",")[0].strip()
+    return None
+
+
+def _mask(key: str) -> str:
+    return "..." + key[-4:] if len(key) > 8 else "*" * len(key)
+
+
+class RateLimiter:
+    """Per-key token buckets for one upstream, with priority-aware admission."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        background_reserve: float = DEFAULT_BACKGROUND_RESERVE,
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue = max_queue
+        self.background_reserve = background_reserve
+        self._buckets = {}
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._counters = {"granted": 0, "waited": 0, "shed": 0, "background_shed": 0, "throttled": 0}
+
+    def acquire(self, keys: list, priority: str = INTERACTIVE) -> str:
+        """Takes a token, waiting if allowed, and returns the key to use.
+
+        Args:
+            keys (list): The API keys that can serve the call.
+            priority (str): INTERACTIVE or BACKGROUND.
+
+        Returns:
+            str: The key the call should be sent with.
+
+        Raises:
+            RateLimitExceeded: If no key has a token within the allowed wait.
+        """
+        deadline = time.monotonic() + self.max_wait_seconds
+        queued = False
+        try:
+            while True:
+                key, wait = self._try_acquire(keys, priority, deadline, queued)
+                if key is not None:
+                    return key
+                queued = True
+                time.sleep(wait)
+        finally:
+            if queued:
+                with self._lock:
+                    self._waiting -= 1
+
+    async def acquire_async(self, keys: list, priority: str = INTERACTIVE) -> str:
+        """Async counterpart of acquire; waiting does not block the event loop."""
+        deadline = time.monotonic() + self.max_wait_seconds
+        queued = False
+        try:
+            while True:
+                key, wait = self._try_acquire(keys, priority, deadline, queued)
+                if key is not None:
+                    return key
+                queued = True
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                with self._lock:
+                    self._waiting -= 1
+
+    def observe(self, key: str, response) -> None:
+        """Updates the key's bucket from the rate-limit headers of a response."""
+        headers = response.headers
+        remaining = _first_header(headers, REMAINING_HEADERS)
+        throttled = response.status_code == 429
+        if remaining is None and not throttled:
+            return
+        now = time.monotonic()
+        wall_now = time.time()
+        reset = _first_header(headers, RESET_HEADERS)
+        reset_seconds = _header_seconds(reset, wall_now) if reset is not None else None
+        with self._lock:
+            bucket = self._bucket(key)
+            if remaining is not None:
+                try:
+                    bucket.constrain(now, int(float(remaining)), reset_seconds)
+                except ValueError:
+                    pass
+            if throttled:
+                retry_after = headers.get("Retry-After")
+                seconds = _header_seconds(retry_after, wall_now) if retry_after else None
+                bucket.block(now, seconds if seconds is not None else reset_seconds)
+                self._counters["throttled"] += 1
+        if throttled:
+            telemetry.count("ratelimit.throttled", upstream=self.name)
+
+    def retry_after(self, key: str) -> float:
+        """Returns how long the key stays parked, 0 if it is usable."""
+        with self._lock:
+            return self._bucket(key).wait_time(time.monotonic())
+
+    def stats(self) -> dict:
+        """Returns admission counters and the state of every key's bucket."""
+        now = time.monotonic()
+        with self._lock:
+            buckets = {}
+            for key, bucket in self._buckets.items():
+                bucket.wait_time(now)
+                buckets[_mask(key)] = {
+                    "tokens": round(bucket.tokens, 2),
+                    "blocked_seconds": round(max(bucket.blocked_until - now, 0.0), 1),
+                }
+            return dict(self._counters, waiting=self._waiting, keys=buckets)
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _try_acquire(self, keys: list, priority: str, deadline: float, queued: bool) -> tuple:
+        now = time.monotonic()
+        reserve = self.background_reserve * self.burst if priority == BACKGROUND else 0.0
+        with self._lock:
+            waits = [(self._bucket(key).wait_time(now, reserve), key) for key in keys]
+            wait, key = min(waits, key=lambda item: item[0])
+            if wait <= 0:
+                self._buckets[key].take()
+                self._counters["granted"] += 1
+                return key, 0.0
+            # Background calls never wait; interactive ones only if the token
+            # arrives in time and the queue has room.
+            admit = (
+                priority != BACKGROUND
+                and now + wait <= deadline
+                and (queued or self._waiting < self.max_queue)
+            )
+            if not admit:
+                self._counters["background_shed" if priority == BACKGROUND else "shed"] += 1
+            elif not queued:
+                self._waiting += 1
+                self._counters["waited"] += 1
+        if not admit:
+            telemetry.count("ratelimit.shed", upstream=self.name, priority=priority)
+            raise RateLimitExceeded(self.name, wait)
+        return None, wait
+
+
+def api_keys(primary: str, pool_env: str) -> list:
+    """Returns the primary key followed by the extra keys listed in an env var."""
+    keys = [primary] if primary else []
+    for key in os.getenv(pool_env, "").split(","):
+        key = key.strip()
+        if key and key not in keys:
+            keys.append(key)
+    return keys or [""]
+
+
+def check_response(upstream: str, limiter: Optional[RateLimiter], key: str, response) -> None:
+    """Feeds a response to the limiter and raises on error statuses.
+
+    Works with ``requests`` and ``httpx`` responses. A 429 raises
+    ``RateLimitExceeded`` so callers can treat it like a shed call.
+    """
+    if limiter is not None:
+        limiter.observe(key, response)
+    if response.status_code == 429:
+        raise RateLimitExceeded(upstream, limiter.retry_after(key) if limiter is not None else 0.0)
+    response.raise_for_status()
+
+
+def rate_limiting_enabled() -> bool:
+    return os.getenv("RATE_LIMIT_ENABLED", "false").lower() not in ("0", "false", "no", "off")
+
+
+def active_rate_limiter(name: str) -> Optional[RateLimiter]:
+    """Returns the limiter for an upstream, or None if rate limiting is off."""
+    return get_rate_limiter(name) if rate_limiting_enabled() else None
+
+
+def _env_settings(name: str) -> dict:
+    rate, burst = DEFAULT_LIMITS.get(name, (0.0, 1))
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    return {
+        "rate": float(os.getenv(f"{prefix}_PER_SECOND", rate)),
+        "burst": int(os.getenv(f"{prefix}_BURST", burst)),
+        "max_wait_seconds": float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", DEFAULT_MAX_WAIT_SECONDS)),
+        "max_queue": int(os.getenv("RATE_LIMIT_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+        "background_reserve": float(
+            os.getenv("RATE_LIMIT_BACKGROUND_RESERVE", DEFAULT_BACKGROUND_RESERVE)
+        ),
+    }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """Returns the process-wide limiter for an upstream ("geocode" or "forecast")."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = RateLimiter(name, **_env_settings(name))
+        return limiter
+
+
+def rate_limit_stats() -> dict:
+    """Returns the counters and bucket state of every limiter, keyed by upstream."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def reset_rate_limiters() -> None:
+    """Drops every limiter, e.g. between benchmark runs."""
+    with _limiters_lock:
+        _limiters.clear()
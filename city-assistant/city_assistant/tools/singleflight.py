@@ -0,0 +1,121 @@
+"""Request coalescing ("single-flight") for identical concurrent lookups.
+
+When many sessions ask about the same city at once, only the first caller for
+a key runs the upstream call; everyone else arriving while it is in flight
+waits for and shares its result (or its exception). Works for threads via
+``do`` and for asyncio via ``do_async``. Each flight counts how many calls it
+collapsed, see ``flight_stats``.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self._counters = {"calls": 0, "executions": 0, "collapsed": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Runs ``fn`` unless a call for ``key`` is already in flight.
+
+        Args:
+            key: Identifies equivalent calls.
+            fn: The call to make; only the first caller for a key runs it.
+
+        Returns:
+            The result of the (possibly shared) call.
+        """
+        with self._lock:
+            self._counters["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters["executions"] += 1
+            else:
+                self._counters["collapsed"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of ``do``; callers share one task per event loop.
+
+        Args:
+            key: Identifies equivalent calls.
+            fn: Returns the awaitable to run; only called by the first caller.
+
+        Returns:
+            The result of the (possibly shared) call.
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            self._counters["calls"] += 1
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = loop.create_task(fn())
+                task.add_done_callback(lambda _: self._forget(task_key))
+                self._counters["executions"] += 1
+            else:
+                self._counters["collapsed"] += 1
+        # Shield so that one cancelled caller does not cancel the shared call.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Returns how many calls were made, executed and collapsed."""
+        with self._lock:
+            return dict(self._counters)
+
+    def _forget(self, task_key: tuple) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Returns the process-wide flight with the given name."""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def flight_stats() -> dict:
+    """Returns the counters of every flight, keyed by name."""
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
@@ -0,0 +1,318 @@
+"""Tracing spans, latency histograms and counters for the tools.
+
+Every tool call runs in a span, and the HTTP clients record how long each
+phase of an upstream call took, in the ``http.phase_ms`` histogram:
+
+* connect (DNS and TCP), tls, send and ttfb on the async httpx path;
+* ttfb and body on the sync requests path, since urllib3 does not expose
+  the connection phases;
+* decode for JSON parsing on both.
+
+Cache lookups and upstream errors are counted. Everything is aggregated in
+process: ``snapshot`` returns counts and approximate p50/p95/p99 per
+histogram series. When ``opentelemetry-api`` is installed (google-adk
+depends on it), spans, histograms and counters are also sent to the
+configured OpenTelemetry tracer and meter providers, and from there to
+whatever exporters the deployment set up. ``InMemoryExporter`` collects
+finished spans for tests and benchmarks:
+
+    exporter = telemetry.add_exporter(telemetry.InMemoryExporter())
+    get_weather("Paris")
+    exporter.find("get_weather")
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+try:
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:
+    otel_metrics = otel_trace = None
+
+INSTRUMENTATION_NAME = "city_assistant"
+# Upper bounds of the histogram buckets, in milliseconds.
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current_span = contextvars.ContextVar("city_assistant_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """A finished or running unit of work."""
+
+    __slots__ = ("name", "attributes", "span_id", "parent_id", "start_time", "duration_ms", "status", "error")
+
+    def __init__(self, name: str, attributes: dict, parent_id: Optional[int]):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = next(_span_ids)
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.duration_ms = None
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: str) -> None:
+        self.status = "error"
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, {self.duration_ms} ms, {self.status}, {self.attributes})"
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans, for tests and benchmarks."""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def find(self, name: str) -> list:
+        """Returns the finished spans with the given name, oldest first."""
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class Histogram:
+    """Bucketed distribution of values, one series per attribute set."""
+
+    def __init__(self, name: str, unit: str = "ms", boundaries: tuple = BUCKETS_MS):
+        self.name = name
+        self.unit = unit
+        self.boundaries = boundaries
+        self._series = {}
+        self._lock = threading.Lock()
+        self._otel = None
+        if otel_metrics is not None:
+            self._otel = otel_metrics.get_meter(INSTRUMENTATION_NAME).create_histogram(name, unit=unit)
+
+    def record(self, value: float, **attributes) -> None:
+        key = tuple(sorted(attributes.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"count": 0, "sum": 0.0, "buckets": [0] * (len(self.boundaries) + 1)}
+            series["count"] += 1
+            series["sum"] += value
+            series["buckets"][bisect.bisect_left(self.boundaries, value)] += 1
+        if self._otel is not None:
+            self._otel.record(value, attributes=attributes)
+
+    def snapshot(self) -> list:
+        """Returns count, mean and approximate p50/p95/p99 for every series."""
+        with self._lock:
+            series = [(dict(key), dict(value, buckets=list(value["buckets"]))) for key, value in self._series.items()]
+        return [
+            {
+                "attributes": attributes,
+                "count": value["count"],
+                "mean": round(value["sum"] / value["count"], 3),
+                "p50": self._quantile(value, 0.50),
+                "p95": self._quantile(value, 0.95),
+                "p99": self._quantile(value, 0.99),
+            }
+            for attributes, value in series
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def _quantile(self, series: dict, quantile: float) -> float:
+        # Upper bound of the bucket holding the quantile; values past the last
+        # boundary report the mean of the series instead.
+        rank = quantile * series["count"]
+        seen = 0
+        for index, count in enumerate(series["buckets"]):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.boundaries):
+                    return self.boundaries[index]
+                break
+        return round(series["sum"] / series["count"], 3)
+
+
+_histograms = {}
+_counters = {}
+_otel_counters = {}
+_exporters = []
+_lock = threading.Lock()
+
+
+def histogram(name: str, unit: str = "ms") -> Histogram:
+    """Returns the process-wide histogram with the given name."""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram(name, unit)
+        return hist
+
+
+def count(name: str, value: int = 1, **attributes) -> None:
+    """Adds to a counter, e.g. ``count("cache.lookups", cache="geocode", result="hit")``."""
+    key = (name, tuple(sorted(attributes.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        otel_counter = _otel_counters.get(name)
+        if otel_counter is None and otel_metrics is not None:
+            otel_counter = _otel_counters[name] = otel_metrics.get_meter(INSTRUMENTATION_NAME).create_counter(name)
+    if otel_counter is not None:
+        otel_counter.add(value, attributes=attributes)
+
+
+def add_exporter(exporter):
+    """Registers an exporter whose ``export(span)`` receives every finished span."""
+    with _lock:
+        _exporters.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter) -> None:
+    with _lock:
+        if exporter in _exporters:
+            _exporters.remove(exporter)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Times a block as a span nested under the current one.
+
+    An exception escaping the block marks the span as failed. The duration
+    also goes to the ``span.duration_ms`` histogram.
+    """
+    parent = _current_span.get()
+    current = Span(name, attributes, parent.span_id if parent is not None else None)
+    token = _current_span.set(current)
+    with contextlib.ExitStack() as stack:
+        otel_span = None
+        if otel_trace is not None:
+            otel_span = stack.enter_context(
+                otel_trace.get_tracer(INSTRUMENTATION_NAME).start_as_current_span(name, attributes=attributes)
+            )
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current.duration_ms = round((time.perf_counter() - started) * 1e3, 3)
+            _current_span.reset(token)
+            histogram("span.duration_ms").record(current.duration_ms, span=name, status=current.status)
+            if otel_span is not None:
+                otel_span.set_attributes(current.attributes)
+                if current.status == "error":
+                    otel_span.set_status(Status(StatusCode.ERROR, current.error))
+            with _lock:
+                exporters = list(_exporters)
+            for exporter in exporters:
+                exporter.export(current)
+
+
+def traced_tool(fn: Callable) -> Callable:
+    """Wraps a sync or async tool so every call runs in a span.
+
+    Results with ``"status": "error"`` mark the span as failed and are
+    counted in ``tool.errors``. The wrapper keeps the signature and
+    docstring, which ADK reads to build the tool declaration.
+    """
+    name = fn.__name__
+
+    def finish(current: Span, result: Any) -> Any:
+        if isinstance(result, dict) and result.get("status") == "error":
+            current.set_error(str(result.get("error_message", "error")))
+            count("tool.errors", tool=name)
+        return result
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with span(name, tool=name) as current:
+                return finish(current, await fn(*args, **kwargs))
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name, tool=name) as current:
+            return finish(current, fn(*args, **kwargs))
+
+    return wrapper
+
+
+def record_phase(upstream: str, phase: str, duration_ms: float) -> None:
+    """Records one phase of an upstream HTTP call."""
+    histogram("http.phase_ms").record(round(duration_ms, 3), upstream=upstream, phase=phase)
+
+
+class HttpxPhaseTimer:
+    """httpx ``trace`` extension that records connection and response phases.
+
+    httpcore reports DNS resolution as part of ``connect_tcp``, so the
+    connect phase includes it.
+    """
+
+    PHASES = {
+        "connection.connect_tcp": "connect",
+        "connection.start_tls": "tls",
+        "http11.send_request_headers": "send",
+        "http2.send_request_headers": "send",
+        "http11.receive_response_headers": "ttfb",
+        "http2.receive_response_headers": "ttfb",
+        "http11.receive_response_body": "body",
+        "http2.receive_response_body": "body",
+    }
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self._started = {}
+
+    async def __call__(self, event_name: str, info: dict) -> None:
+        step, _, event = event_name.rpartition(".")
+        phase = self.PHASES.get(step)
+        if phase is None:
+            return
+        if event == "started":
+            self._started[step] = time.perf_counter()
+        elif event in ("complete", "failed") and step in self._started:
+            record_phase(self.upstream, phase, (time.perf_counter() - self._started.pop(step)) * 1e3)
+
+
+def snapshot() -> dict:
+    """Returns every histogram and counter aggregated so far."""
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    return {
+        "histograms": {name: hist.snapshot() for name, hist in histograms.items()},
+        "counters": [
+            {"name": name, "attributes": dict(attributes), "value": value}
+            for (name, attributes), value in counters.items()
+        ],
+    }
+
+
+def reset() -> None:
+    """Clears the aggregated histograms and counters."""
+    with _lock:
+        histograms = list(_histograms.values())
+        _counters.clear()
+    for hist in histograms:
+        hist.clear()
@@ -0,0 +1,166 @@
+"""Pre-resolved timezones and fast local-time formatting for the time tools.
+
+``TimezoneRegistry`` keeps one ``ZoneInfo`` per IANA name, resolved once per
+process, plus the table of major cities used by the time fallback with a few
+common aliases. City keys are normalized like geocode cache keys, so
+"São Paulo", "sao  paulo" and "SAO PAULO" all hit the same entry.
+
+``format_now`` renders "YYYY-MM-DD HH:MM:SS TZ+HHMM", the format the tools have
+always returned, without going through ``strftime``, whose %Z/%z handling
+dominates the cost of a time report.
+"""
+import datetime
+import threading
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from .geocode_cache import normalize_city
+
+# IANA has about 600 names; the bound only guards against junk from upstream.
+MAX_ZONES = 2048
+# Bounds the memo of city spellings seen by the fallback.
+MAX_LOOKUPS = 4096
+
+# Cities the time fallback can answer without any API.
+FALLBACK_CITY_TIMEZONES = {
+    "new york": "America/New_York",
+    "london": "Europe/London",
+    "paris": "Europe/Paris",
+    "tokyo": "Asia/Tokyo",
+    "sydney": "Australia/Sydney",
+    "los angeles": "America/Los_Angeles",
+    "chicago": "America/Chicago",
+    "denver": "America/Denver",
+    "toronto": "America/Toronto",
+    "vancouver": "America/Vancouver",
+    "mexico city": "America/Mexico_City",
+    "sao paulo": "America/Sao_Paulo",
+    "buenos aires": "America/Argentina/Buenos_Aires",
+    "madrid": "Europe/Madrid",
+    "rome": "Europe/Rome",
+    "berlin": "Europe/Berlin",
+    "moscow": "Europe/Moscow",
+    "dubai": "Asia/Dubai",
+    "mumbai": "Asia/Kolkata",
+    "singapore": "Asia/Singapore",
+    "hong kong": "Asia/Hong_Kong",
+    "seoul": "Asia/Seoul",
+    "beijing": "Asia/Shanghai",
+    "shanghai": "Asia/Shanghai",
+    "melbourne": "Australia/Melbourne",
+    "perth": "Australia/Perth",
+    "auckland": "Pacific/Auckland",
+    "honolulu": "Pacific/Honolulu",
+}
+
+# Other names for the cities above, keyed by normalized alias.
+CITY_ALIASES = {
+    "nyc": "new york",
+    "new york city": "new york",
+    "la": "los angeles",
+    "cdmx": "mexico city",
+    "ciudad de mexico": "mexico city",
+    "bombay": "mumbai",
+    "peking": "beijing",
+    "hk": "hong kong",
+    "roma": "rome",
+    "moskva": "moscow",
+}
+
+
+def _zone_suffix(tzname: Optional[str], offset: Optional[datetime.timedelta]) -> str:
+    seconds = int(offset.total_seconds()) if offset is not None else 0
+    sign = "-" if seconds < 0 else "+"
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    suffix = f" {tzname or ''}{sign}{hours:02d}{minutes:02d}"
+    return suffix + f"{seconds:02d}" if seconds else suffix
+
+
+_suffixes = {}
+
+
+def format_now(tz: datetime.tzinfo) -> str:
+    """Returns the current time in a zone as "YYYY-MM-DD HH:MM:SS TZ+HHMM".
+
+    Produces the same text as ``strftime("%Y-%m-%d %H:%M:%S %Z%z")`` at a
+    fraction of the cost: the date and time come from ``isoformat``, which is
+    implemented in C, and the " TZ+HHMM" part is built once per zone offset.
+    """
+    now = datetime.datetime.now(tz)
+    key = (now.tzname(), now.utcoffset())
+    suffix = _suffixes.get(key)
+    if suffix is None:
+        suffix = _suffixes[key] = _zone_suffix(*key)
+    return now.isoformat(" ", "seconds")[:19] + suffix
+
+
+class TimezoneRegistry:
+    """Process-wide cache of ZoneInfo objects and fallback city timezones."""
+
+    def __init__(self, city_timezones: dict = FALLBACK_CITY_TIMEZONES, aliases: dict = CITY_ALIASES):
+        self._city_timezones = city_timezones
+        self._aliases = aliases
+        self._zones = {}
+        self._cities = None
+        self._lookups = {}
+        self._lock = threading.Lock()
+
+    def zone(self, name: str) -> Optional[ZoneInfo]:
+        """Returns the ZoneInfo for an IANA name, or None if it is unknown."""
+        try:
+            return self._zones[name]
+        except KeyError:
+            pass
+        try:
+            tz = ZoneInfo(name)
+        except Exception:
+            tz = None
+        # Unknown names are remembered too; they come from upstream payloads.
+        if len(self._zones) < MAX_ZONES:
+            self._zones[name] = tz
+        return tz
+
+    def city(self, city: str) -> Optional[tuple]:
+        """Looks a city up in the fallback table.
+
+        Args:
+            city (str): The city name as the user wrote it.
+
+        Returns:
+            tuple: (display name, ZoneInfo), or None if the city is not known.
+        """
+        # Most calls repeat a spelling already seen, which is one dict hit.
+        try:
+            return self._lookups[city]
+        except KeyError:
+            pass
+        cities = self._cities
+        if cities is None:
+            cities = self._build()
+        entry = cities.get(normalize_city(city))
+        if len(self._lookups) < MAX_LOOKUPS:
+            self._lookups[city] = entry
+        return entry
+
+    def _build(self) -> dict:
+        with self._lock:
+            if self._cities is None:
+                cities = {}
+                for key, name in self._city_timezones.items():
+                    tz = self.zone(name)
+                    if tz is not None:
+                        cities[normalize_city(key)] = (key.title(), tz)
+                for alias, key in self._aliases.items():
+                    if normalize_city(key) in cities:
+                        cities[normalize_city(alias)] = cities[normalize_city(key)]
+                self._cities = cities
+            return self._cities
+
+
+_registry = TimezoneRegistry()
+
+
+def get_timezone_registry() -> TimezoneRegistry:
+    """Returns the process-wide timezone registry."""
+    return _registry
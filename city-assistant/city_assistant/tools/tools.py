@@ -1,10 +1,49 @@
 import datetime
 import os
 import requests
-from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
 
+from . import telemetry
+from .forecast import get_forecast_fetcher
+from .gazetteer import get_gazetteer
+from .geocode_cache import get_geocode_cache, normalize_city
+from .http_client import decode_json, get_http_client
+from .rate_limit import active_rate_limiter, api_keys, check_response
+from .singleflight import get_flight
+from .telemetry import traced_tool
+from .timezones import format_now, get_timezone_registry
+from .tz_index import timezone_at
+
+@traced_tool
 def get_lat_long(city: str) -> dict:
-    """Gets latitude and longitude coordinates for a specified city using geocode.maps.co API.
+    """Gets latitude and longitude coordinates for a specified city.
+
+    Exact matches in the offline gazetteer are answered locally, including the
+    timezone. Other names go to the geocode.maps.co API, and if that finds
+    nothing or is unreachable a close fuzzy match in the gazetteer is used.
+
+    Args:
+        city (str): The name of the city for which to retrieve coordinates.
+
+    Returns:
+        dict: status and result with lat/long or error msg.
+    """
+    local = _gazetteer_lat_long(city)
+    if local is not None:
+        return local
+    
+    # Concurrent lookups of the same city share one upstream call
+    coords = dict(get_flight("geocode").do(normalize_city(city), lambda: _geocode_lat_long(city)))
+    if coords["status"] != "success":
+        return _gazetteer_lat_long(city, fuzzy=True) or coords
+    return coords
+
+
+def _geocode_lat_long(city: str) -> dict:
+    """Looks a city up with the geocode.maps.co API.
+
+    Results are served from the shared geocode cache when possible; both
+    successful lookups and "not found" answers are cached.
 
     Args:
         city (str): The name of the city for which to retrieve coordinates.
@@ -12,36 +51,30 @@ def get_lat_long(city: str) -> dict:
     Returns:
         dict: status and result with lat/long or error msg.
     """
+    cache = get_geocode_cache()
+    cached = cache.get(city)
+    if cached is not None:
+        return cached
+
     try:
-        # Geocode.maps.co API endpoint
-        url = "https://geocode.maps.co/search"
+        # Geocode.maps.co API endpoint (overridable to point at a local stub)
+        url = os.getenv("GEOCODE_BASE_URL", "https://geocode.maps.co") + "/search"
         params = {
             "q": city,
             "api_key": os.getenv("GEOCODE_MAPS_API_KEY", "")  # Optional API key
         }
+        limiter = active_rate_limiter("geocode")
+        if limiter is not None:
+            params["api_key"] = limiter.acquire(api_keys(params["api_key"], "GEOCODE_MAPS_API_KEYS"))
         
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
+        response = get_http_client().get(url, params=params)
+        check_response("geocode", limiter, params["api_key"], response)
         
-        data = response.json()
+        data = decode_json(response)
         
-        if not data or len(data) == 0:
-            return {
-                "status": "error",
-                "error_message": f"No coordinates found for city: {city}",
-            }
-        
-        # Get the first result (most relevant)
-        result = data[0]
-        lat = float(result["lat"])
-        lon = float(result["lon"])
-        
-        return {
-            "status": "success",
-            "latitude": lat,
-            "longitude": lon,
-            "display_name": result.get("display_name", city),
-        }
+        coords = _parse_geocode(data, city)
+        cache.set(city, coords)
+        return coords
         
     except requests.exceptions.RequestException as e:
         return {
@@ -60,6 +93,7 @@ def get_lat_long(city: str) -> dict:
         }
 
 
+@traced_tool
 def get_weather(city: str) -> dict:
     """Retrieves the current weather report for a specified city.
 
@@ -88,36 +122,10 @@ def get_weather(city: str) -> dict:
         lon = coords_result["longitude"]
         display_name = coords_result.get("display_name", city)
         
-        # Pirate Weather API endpoint using path parameters
-        url = f"https://api.pirateweather.net/forecast/{api_key}/{lat},{lon}"
-        
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Extract weather information from Pirate Weather API response
-        current = data["currently"]
-        temperature = current["temperature"]
-        feels_like = current["apparentTemperature"]
-        humidity = current["humidity"] * 100  # Convert to percentage
-        description = current["summary"]
-        wind_speed = current["windSpeed"]
-        
-        # Convert temperature to Fahrenheit for display
-        temp_fahrenheit = (temperature * 9/5) + 32
-        
-        report = (
-            f"The weather in {display_name} is {description} with a temperature of "
-            f"{temperature:.1f}°C ({temp_fahrenheit:.1f}°F). "
-            f"It feels like {feels_like:.1f}°C, with {humidity}% humidity and "
-            f"wind speed of {wind_speed} m/s."
-        )
+        # Shared with get_current_time so one question costs one forecast call
+        data = get_forecast_fetcher().get_forecast(api_key, lat, lon)
         
-        return {
-            "status": "success",
-            "report": report,
-        }
+        return _weather_report(display_name, data)
         
     except requests.exceptions.RequestException as e:
         return {
@@ -136,6 +144,7 @@ def get_weather(city: str) -> dict:
         }
 
 
+@traced_tool
 def get_current_time(city: str) -> dict:
     """Returns the current time in a specified city.
 
@@ -145,15 +154,6 @@ def get_current_time(city: str) -> dict:
     Returns:
         dict: status and result or error msg.
     """
-    # Get API key from environment variable
-    api_key = os.getenv("PIRATE_WEATHER_API_KEY")
-    
-    if not api_key:
-        return {
-            "status": "error",
-            "error_message": "Pirate Weather API key not found. Please set PIRATE_WEATHER_API_KEY environment variable.",
-        }
-    
     try:
         # First, get coordinates for the city
         coords_result = get_lat_long(city)
@@ -165,26 +165,25 @@ def get_current_time(city: str) -> dict:
         lon = coords_result["longitude"]
         display_name = coords_result.get("display_name", city)
         
-        # Get timezone from Pirate Weather API using path parameters
-        url = f"https://api.pirateweather.net/forecast/{api_key}/{lat},{lon}"
+        # Places found in the offline gazetteer already carry their timezone;
+        # anything else is resolved by the local coordinate index
+        timezone_name = coords_result.get("timezone") or timezone_at(lat, lon)
+        if not timezone_name:
+            # Get API key from environment variable
+            api_key = os.getenv("PIRATE_WEATHER_API_KEY")
+            
+            if not api_key:
+                return {
+                    "status": "error",
+                    "error_message": "Pirate Weather API key not found. Please set PIRATE_WEATHER_API_KEY environment variable.",
+                }
+            
+            # Get timezone from the shared forecast fetcher, which keeps it much
+            # longer than the weather data itself
+            timezone_name = get_forecast_fetcher().get_timezone(api_key, lat, lon)
         
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Get timezone from Pirate Weather API response
-        timezone_name = data.get("timezone", "UTC")
-        
-        try:
-            # Use the timezone from the API response
-            tz = ZoneInfo(timezone_name)
-            now = datetime.datetime.now(tz)
-            report = f'The current time in {display_name} is {now.strftime("%Y-%m-%d %H:%M:%S %Z%z")}'
-            return {"status": "success", "report": report}
-        except Exception:
-            # If timezone parsing fails, fall back to the fallback method
-            return _get_time_fallback(city)
+        # If timezone parsing fails, fall back to the fallback method
+        return _time_report(display_name, timezone_name) or _get_time_fallback(city)
         
     except requests.exceptions.RequestException as e:
         # Fallback to a simple timezone mapping for major cities
@@ -201,6 +200,226 @@ def get_current_time(city: str) -> dict:
         }
 
 
+@traced_tool
+def get_weather_many(cities: list[str]) -> dict:
+    """Retrieves the current weather report for several cities in one call.
+
+    Use this instead of repeated get_weather calls when the user asks about
+    more than one city. Repeated cities are looked up once.
+
+    Args:
+        cities (list[str]): The names of the cities to retrieve weather reports for.
+
+    Returns:
+        dict: status and a list of per-city results, each with its own status
+        and report or error msg.
+    """
+    unique_cities = _dedupe_cities(cities)
+    if not unique_cities:
+        return {
+            "status": "error",
+            "error_message": f"Please provide between 1 and {_batch_max_cities()} city names.",
+        }
+    
+    with ThreadPoolExecutor(max_workers=_batch_concurrency()) as executor:
+        reports = list(executor.map(get_weather, unique_cities))
+    
+    return {
+        "status": "success",
+        "results": [_batch_entry(city, report) for city, report in zip(unique_cities, reports)],
+    }
+
+
+def _gazetteer_lat_long(city: str, fuzzy: bool = False):
+    """Resolves a city in the offline gazetteer.
+
+    Args:
+        city (str): The name of the city.
+        fuzzy (bool): Accept close misspellings, not just exact names.
+
+    Returns:
+        dict: get_lat_long style result including the timezone, or None.
+    """
+    try:
+        gazetteer = get_gazetteer()
+        place = gazetteer.resolve(city) if fuzzy else gazetteer.lookup(city)
+    except (OSError, ValueError):
+        return None
+    telemetry.count("cache.lookups", cache="gazetteer", result="miss" if place is None else "hit")
+    if place is None:
+        return None
+    return {
+        "status": "success",
+        "latitude": place["latitude"],
+        "longitude": place["longitude"],
+        "display_name": place["display_name"],
+        "timezone": place["timezone"],
+    }
+
+
+def _parse_geocode(data: list, city: str) -> dict:
+    """Turns a geocode.maps.co search response into a get_lat_long result.
+
+    Args:
+        data (list): The decoded search response.
+        city (str): The city that was looked up.
+
+    Returns:
+        dict: status and result with lat/long or a "not found" error msg.
+
+    Raises:
+        KeyError, ValueError, IndexError: If the response is malformed.
+    """
+    if not data or len(data) == 0:
+        return {
+            "status": "error",
+            "error_message": f"No coordinates found for city: {city}",
+        }
+    
+    # Get the first result (most relevant)
+    result = data[0]
+    lat = float(result["lat"])
+    lon = float(result["lon"])
+    
+    return {
+        "status": "success",
+        "latitude": lat,
+        "longitude": lon,
+        "display_name": result.get("display_name", city),
+    }
+
+
+def _weather_report(display_name: str, data: dict) -> dict:
+    """Builds the get_weather result from a Pirate Weather forecast payload.
+
+    With CITY_ASSISTANT_RESULT_FORMAT=structured the result carries numeric
+    fields and a short condition code instead of an English sentence.
+
+    Args:
+        display_name (str): The resolved name of the location.
+        data (dict): The decoded forecast payload.
+
+    Returns:
+        dict: status and report, or status and the structured fields.
+
+    Raises:
+        KeyError: If the payload lacks a required field.
+    """
+    # Extract weather information from Pirate Weather API response
+    current = data["currently"]
+    temperature = current["temperature"]
+    feels_like = current["apparentTemperature"]
+    humidity = current["humidity"] * 100  # Convert to percentage
+    description = current["summary"]
+    wind_speed = current["windSpeed"]
+    
+    if _structured_results():
+        result = {
+            "status": "success",
+            "location": _short_location(display_name),
+            "cond": _condition_code(current),
+            "temp_c": round(temperature, 1),
+            "feels_c": round(feels_like, 1),
+            "rh_pct": round(humidity),
+            "wind_ms": round(wind_speed, 1),
+        }
+    else:
+        # Convert temperature to Fahrenheit for display
+        temp_fahrenheit = (temperature * 9/5) + 32
+        
+        report = (
+            f"The weather in {display_name} is {description} with a temperature of "
+            f"{temperature:.1f}°C ({temp_fahrenheit:.1f}°F). "
+            f"It feels like {feels_like:.1f}°C, with {humidity}% humidity and "
+            f"wind speed of {wind_speed} m/s."
+        )
+        
+        result = {
+            "status": "success",
+            "report": report,
+        }
+    # Served from cache past its freshness window while a refresh runs
+    if "age_seconds" in data:
+        result["age_seconds"] = data["age_seconds"]
+    return result
+
+
+def _condition_code(current: dict) -> str:
+    """Returns a short condition code such as "partly_cloudy" or "rain"."""
+    icon = current.get("icon")
+    if not icon:
+        return "_".join(current["summary"].lower().split())
+    for suffix in ("-day", "-night"):
+        icon = icon.removesuffix(suffix)
+    return icon.replace("-", "_")
+
+
+def _short_location(display_name: str) -> str:
+    """Shortens "London, Greater London, England, United Kingdom" to "London, United Kingdom"."""
+    parts = [part.strip() for part in display_name.split(",")]
+    return parts[0] if len(parts) < 3 else f"{parts[0]}, {parts[-1]}"
+
+
+def _time_report(display_name: str, timezone_name: str):
+    """Builds the get_current_time result for a timezone.
+
+    Args:
+        display_name (str): The resolved name of the location.
+        timezone_name (str): The IANA timezone of the location.
+
+    Returns:
+        dict: status and report, or None if the timezone is unknown.
+    """
+    tz = get_timezone_registry().zone(timezone_name)
+    if tz is None:
+        return None
+    return _time_result(display_name, tz)
+
+
+def _time_result(display_name: str, tz) -> dict:
+    if _structured_results():
+        return {
+            "status": "success",
+            "location": _short_location(display_name),
+            "time": datetime.datetime.now(tz).isoformat(timespec="seconds"),
+        }
+    report = f"The current time in {display_name} is {format_now(tz)}"
+    return {"status": "success", "report": report}
+
+
+def _structured_results() -> bool:
+    return os.getenv("CITY_ASSISTANT_RESULT_FORMAT", "prose").strip().lower() == "structured"
+
+
+def _batch_max_cities() -> int:
+    return int(os.getenv("WEATHER_BATCH_MAX_CITIES", "25"))
+
+
+def _batch_concurrency() -> int:
+    return max(1, int(os.getenv("WEATHER_BATCH_CONCURRENCY", "8")))
+
+
+def _dedupe_cities(cities: list) -> list:
+    """Drops blank and repeated city names, keeping the first spelling.
+
+    Returns an empty list if nothing is left or there are too many cities.
+    """
+    seen = set()
+    unique_cities = []
+    for city in cities or []:
+        key = normalize_city(str(city))
+        if key and key not in seen:
+            seen.add(key)
+            unique_cities.append(str(city).strip())
+    if len(unique_cities) > _batch_max_cities():
+        return []
+    return unique_cities
+
+
+def _batch_entry(city: str, result: dict) -> dict:
+    return {"city": city, **result}
+
+
 def _get_time_fallback(city: str) -> dict:
     """Fallback timezone lookup for major cities when API is unavailable.
     
@@ -210,54 +429,14 @@ def _get_time_fallback(city: str) -> dict:
     Returns:
         dict: status and result or error msg.
     """
-    # Major city timezone mapping
-    city_timezones = {
-        "new york": "America/New_York",
-        "london": "Europe/London",
-        "paris": "Europe/Paris",
-        "tokyo": "Asia/Tokyo",
-        "sydney": "Australia/Sydney",
-        "los angeles": "America/Los_Angeles",
-        "chicago": "America/Chicago",
-        "denver": "America/Denver",
-        "toronto": "America/Toronto",
-        "vancouver": "America/Vancouver",
-        "mexico city": "America/Mexico_City",
-        "sao paulo": "America/Sao_Paulo",
-        "buenos aires": "America/Argentina/Buenos_Aires",
-        "madrid": "Europe/Madrid",
-        "rome": "Europe/Rome",
-        "berlin": "Europe/Berlin",
-        "moscow": "Europe/Moscow",
-        "dubai": "Asia/Dubai",
-        "mumbai": "Asia/Kolkata",
-        "singapore": "Asia/Singapore",
-        "hong kong": "Asia/Hong_Kong",
-        "seoul": "Asia/Seoul",
-        "beijing": "Asia/Shanghai",
-        "shanghai": "Asia/Shanghai",
-        "melbourne": "Australia/Melbourne",
-        "perth": "Australia/Perth",
-        "auckland": "Pacific/Auckland",
-        "honolulu": "Pacific/Honolulu",
-    }
-    
-    city_lower = city.lower()
+    # Major city timezones, resolved once per process
+    entry = get_timezone_registry().city(city)
     
-    if city_lower in city_timezones:
-        try:
-            tz_identifier = city_timezones[city_lower]
-            tz = ZoneInfo(tz_identifier)
-            now = datetime.datetime.now(tz)
-            report = f'The current time in {city.title()} is {now.strftime("%Y-%m-%d %H:%M:%S %Z%z")}'
-            return {"status": "success", "report": report}
-        except Exception as e:
-            return {
-                "status": "error",
-                "error_message": f"Failed to get time for {city}: {str(e)}",
-            }
-    else:
+    if entry is None:
         return {
             "status": "error",
             "error_message": f"Sorry, I don't have timezone information for '{city}'. Please ensure the city name is spelled correctly or try a major city.",
         }
+    
+    display_name, tz = entry
+    return _time_result(display_name, tz)
@@ -0,0 +1,132 @@
+"""Coordinate to IANA timezone index.
+
+get_current_time only needs the timezone of a location, which used to mean
+downloading a full forecast document. This index answers it locally: the
+gazetteer's places are bucketed into a one-degree grid, and a coordinate takes
+the timezone of the nearest known place. With a GeoNames-sized gazetteer the
+nearest place is almost always a few kilometres away, so the answer matches
+the timezone polygons except right on a border. Coordinates with no place
+within TZ_INDEX_MAX_DISTANCE_KM get no answer and the caller falls back to the
+forecast API.
+
+The bundled seed list is far too sparse for this: its nearest place is often
+across a border (Lviv is closest to Krakow, Amritsar to Lahore). The index is
+therefore empty unless a built gazetteer is loaded, and every lookup falls
+back to the forecast API.
+
+The grid is built lazily, once per process, on the first lookup.
+"""
+import math
+import os
+import threading
+from typing import Optional
+
+from .gazetteer import get_gazetteer
+
+CELL_DEGREES = 1.0
+MAX_RINGS = 180
+DEFAULT_MAX_DISTANCE_KM = 25.0
+EARTH_RADIUS_KM = 6371.0
+
+
+def _cell(lat: float, lon: float) -> tuple:
+    return math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES)
+
+
+def _distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Equirectangular approximation; plenty for "which place is nearest".
+    dlon = (lon2 - lon1 + 180.0) % 360.0 - 180.0
+    x = math.radians(dlon) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_KM * math.hypot(x, y)
+
+
+class TimezoneIndex:
+    """Grid of known places answering nearest-timezone queries."""
+
+    def __init__(self, points, max_distance_km: float = DEFAULT_MAX_DISTANCE_KM):
+        self.max_distance_km = max_distance_km
+        self._cells = {}
+        seen = set()
+        for lat, lon, timezone in points:
+            point = (round(lat, 3), round(lon, 3), timezone)
+            if point not in seen:
+                seen.add(point)
+                self._cells.setdefault(_cell(lat, lon), []).append(point)
+
+    def __len__(self) -> int:
+        return sum(len(points) for points in self._cells.values())
+
+    def timezone_at(self, lat: float, lon: float) -> Optional[str]:
+        """Returns the timezone of the nearest known place.
+
+        Args:
+            lat (float): Latitude of the location.
+            lon (float): Longitude of the location.
+
+        Returns:
+            str: The IANA timezone name, or None if nothing is within range.
+        """
+        center_row, center_col = _cell(lat, lon)
+        best_timezone = None
+        best_distance = self.max_distance_km
+        ring = 0
+        # Every point in a ring is at least (ring - 1) cells away. Cells are
+        # narrowest in longitude and towards the pole, so measure with the
+        # width of a cell at the far edge of the ring.
+        while ring <= MAX_RINGS and (ring - 1) * _min_cell_km(lat, ring) <= best_distance:
+            for row, col in _ring_cells(center_row, center_col, ring):
+                for point_lat, point_lon, timezone in self._cells.get((row, col), ()):
+                    distance = _distance_km(lat, lon, point_lat, point_lon)
+                    if distance <= best_distance:
+                        best_distance = distance
+                        best_timezone = timezone
+            ring += 1
+        return best_timezone
+
+
+def _min_cell_km(lat: float, ring: int) -> float:
+    edge_lat = min(abs(lat) + (ring + 1) * CELL_DEGREES, 89.0)
+    return 111.0 * CELL_DEGREES * max(math.cos(math.radians(edge_lat)), 0.02)
+
+
+def _ring_cells(center_row: int, center_col: int, ring: int):
+    """Yields the grid cells at Chebyshev distance ``ring`` from the center."""
+    if ring == 0:
+        yield center_row, center_col
+        return
+    columns = int(360 / CELL_DEGREES)
+    for row in range(center_row - ring, center_row + ring + 1):
+        if row == center_row - ring or row == center_row + ring:
+            steps = range(-ring, ring + 1)
+        else:
+            steps = (-ring, ring)
+        for step in steps:
+            # Wrap around the antimeridian.
+            col = (center_col + step + columns // 2) % columns - columns // 2
+            yield row, col
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_timezone_index() -> TimezoneIndex:
+    """Returns the process-wide index, building it from the gazetteer on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                gazetteer = get_gazetteer()
+                _index = TimezoneIndex(
+                    () if gazetteer.seed else gazetteer.points(),
+                    max_distance_km=float(
+                        os.getenv("TZ_INDEX_MAX_DISTANCE_KM", DEFAULT_MAX_DISTANCE_KM)
+                    ),
+                )
+    return _index
+
+
+def timezone_at(lat: float, lon: float) -> Optional[str]:
+    """Returns the timezone for a coordinate from the process-wide index."""
+    return get_timezone_index().timezone_at(lat, lon)
@@ -0,0 +1,127 @@
+"""Compares polling ArgoCD with the watched application state cache, offline.
+
+Each round syncs an application on ``FakeArgoCD`` and waits for it to be
+synced and healthy, then answers a few status and resource-tree questions:
+once by polling the API the way the MCP tools do, once through
+``ArgoCDState``. Reported per mode: requests, response bytes, and how long
+after the sync finished its completion was noticed.
+
+The watch mode also starts waiting only ``--late-wait-seconds`` after
+triggering a sync that has finished by then, as when the model calls
+``wait_for_application`` a turn after ``sync_application``, once knowing the
+revision and once not; both waits must succeed without waiting.
+
+Run from the gitops directory:
+
+    python -m benchmarks.bench_argocd_state --applications 200 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import requests
+
+from gitops.tools.argocd_state import ArgoCDState
+
+from .fake_argocd import FakeArgoCD
+
+
+def _settled(app: dict) -> bool:
+    status = app["status"]
+    return (
+        not app.get("operation")
+        and status["operationState"].get("phase") not in ("Running", "Terminating")
+        and status["sync"]["status"] == "Synced"
+        and status["health"]["status"] == "Healthy"
+    )
+
+
+def _poll(fake: FakeArgoCD, names: list, sync_seconds: float, interval: float, queries: int) -> list:
+    session = requests.Session()
+    lags = []
+    for index, name in enumerate(names):
+        revision = f"{index + 1:040x}"
+        fake.sync(name, revision=revision, duration_seconds=sync_seconds)
+        finished = time.perf_counter() + sync_seconds
+        while True:
+            time.sleep(interval)
+            app = session.get(f"{fake.url}/api/v1/applications/{name}").json()
+            if app["status"]["sync"]["revision"] == revision and _settled(app):
+                break
+        lags.append(time.perf_counter() - finished)
+        for _ in range(queries):
+            session.get(f"{fake.url}/api/v1/applications").json()
+            session.get(f"{fake.url}/api/v1/applications/{name}/resource-tree").json()
+    return lags
+
+
+async def _watch(fake: FakeArgoCD, names: list, sync_seconds: float, queries: int, late_wait_seconds: float) -> tuple:
+    state = ArgoCDState(fake.url)
+    await asyncio.to_thread(state.start)
+    lags, late_waits = [], []
+    try:
+        for index, name in enumerate(names):
+            revision = f"{index + 1:040x}"
+            fake.sync(name, revision=revision, duration_seconds=sync_seconds)
+            finished = time.perf_counter() + sync_seconds
+            outcome = await state.wait_for(name, revision=revision, after_sync=True, timeout_seconds=30)
+            assert outcome["status"] == "success", outcome
+            lags.append(time.perf_counter() - finished)
+            for _ in range(queries):
+                state.applications()
+                await asyncio.to_thread(state.resource_tree, name)
+        for index, name in enumerate(names[:2]):
+            revision = f"{len(names) + index + 1:040x}"
+            fake.sync(name, revision=revision, duration_seconds=sync_seconds)
+            await asyncio.sleep(late_wait_seconds)
+            outcome = await state.wait_for(
+                name, revision=revision if index == 0 else "", after_sync=True, timeout_seconds=30
+            )
+            assert outcome["status"] == "success", outcome
+            late_waits.append(outcome["waited_seconds"])
+    finally:
+        state.stop()
+    return lags, late_waits
+
+
+def _report(mode: str, fake: FakeArgoCD, lags: list) -> dict:
+    return {
+        "mode": mode,
+        "requests": fake.request_counts,
+        "kib": round(fake.bytes_sent / 1024, 1),
+        "lag_ms_median": round(statistics.median(lags) * 1000, 1),
+        "lag_ms_max": round(max(lags) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--applications", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5, help="Syncs to wait for")
+    parser.add_argument("--sync-seconds", type=float, default=1.2, help="How long each sync takes")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls")
+    parser.add_argument("--queries", type=int, default=3, help="List and tree questions after each sync")
+    parser.add_argument(
+        "--late-wait-seconds", type=float, default=2.0, help="Delay before waiting on an already finished sync"
+    )
+    args = parser.parse_args()
+
+    results = []
+    with FakeArgoCD(applications=args.applications) as fake:
+        names = [app["metadata"]["name"] for app in fake._list()["items"]][: args.rounds]
+        lags = _poll(fake, names, args.sync_seconds, args.poll_interval, args.queries)
+        results.append(_report(f"poll every {args.poll_interval}s", fake, lags))
+    with FakeArgoCD(applications=args.applications) as fake:
+        names = [app["metadata"]["name"] for app in fake._list()["items"]][: args.rounds]
+        lags, late_waits = asyncio.run(
+            _watch(fake, names, args.sync_seconds, args.queries, args.late_wait_seconds)
+        )
+        results.append(dict(_report("watch", fake, lags), late_wait_ms=[round(wait * 1000, 1) for wait in late_waits]))
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
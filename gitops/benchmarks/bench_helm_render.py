@@ -0,0 +1,237 @@
+"""Measures how long checking many values files against one chart takes, offline.
+
+Writes a chart shaped like ``helm create`` output plus a per-region range
+(or uses ``--chart``), generates ``--files`` values files varying the image,
+replicas, regions, labels and environment, and runs ``check_values`` on each:
+schema validation, rendering of every template and the manifest checks. The
+chart is parsed once and cached; ``--reparse`` also times parsing it again
+for every file, as without the cache.
+
+Run from the gitops directory:
+
+    python -m benchmarks.bench_helm_render --files 500
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import yaml
+
+from gitops.tools.helm_values import LoadedChart, check_values, load_chart, merge_values, render_chart
+
+CHART_YAML = """\
+apiVersion: v2
+name: app
+version: 0.1.0
+appVersion: "1.0.0"
+"""
+
+VALUES_YAML = """\
+replicaCount: 1
+image:
+  repository: nginx
+  tag: "1.21.6"
+  pullPolicy: IfNotPresent
+service:
+  type: ClusterIP
+  port: 80
+labels: {}
+podAnnotations: {}
+env: []
+resources: {}
+regions:
+  us-west:
+    enabled: true
+    replicaCount: 2
+    labels:
+      region: us-west
+"""
+
+HELPERS = """\
+{{- define "app.fullname" -}}
+{{- if contains .Chart.Name .Release.Name }}
+{{- .Release.Name | trunc 63 | trimSuffix "-" }}
+{{- else }}
+{{- printf "%s-%s" .Release.Name .Chart.Name | trunc 63 | trimSuffix "-" }}
+{{- end }}
+{{- end }}
+
+{{- define "app.selectorLabels" -}}
+app.kubernetes.io/name: {{ .Chart.Name }}
+app.kubernetes.io/instance: {{ .Release.Name }}
+{{- end }}
+
+{{- define "app.labels" -}}
+helm.sh/chart: {{ printf "%s-%s" .Chart.Name .Chart.Version | replace "+" "_" }}
+{{ include "app.selectorLabels" . }}
+app.kubernetes.io/managed-by: {{ .Release.Service }}
+{{- end }}
+"""
+
+DEPLOYMENT = """\
+{{- $enabled := false }}
+{{- range $name, $region := .Values.regions }}
+{{- if $region.enabled }}
+{{- $enabled = true }}
+---
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {{ include "app.fullname" $ }}-{{ $name }}
+  labels:
+    {{- include "app.labels" $ | nindent 4 }}
+    {{- with $region.labels }}
+    {{- toYaml . | nindent 4 }}
+    {{- end }}
+spec:
+  replicas: {{ $region.replicaCount | default $.Values.replicaCount }}
+  selector:
+    matchLabels:
+      {{- include "app.selectorLabels" $ | nindent 6 }}
+      region: {{ $name | quote }}
+  template:
+    metadata:
+      {{- with $.Values.podAnnotations }}
+      annotations:
+        {{- toYaml . | nindent 8 }}
+      {{- end }}
+      labels:
+        {{- include "app.selectorLabels" $ | nindent 8 }}
+        region: {{ $name | quote }}
+    spec:
+      containers:
+        - name: {{ $.Chart.Name }}
+          image: "{{ $.Values.image.repository }}:{{ $.Values.image.tag | default $.Chart.AppVersion }}"
+          imagePullPolicy: {{ $.Values.image.pullPolicy }}
+          ports:
+            - containerPort: {{ $.Values.service.port }}
+          env:
+            - name: REGION_NAME
+              value: {{ $name | quote }}
+            {{- range $.Values.env }}
+            - name: {{ .name }}
+              value: {{ .value | quote }}
+            {{- end }}
+          resources:
+            {{- toYaml ($region.resources | default $.Values.resources) | nindent 12 }}
+{{- end }}
+{{- end }}
+{{- if not $enabled }}
+{{- fail "no region is enabled" }}
+{{- end }}
+"""
+
+SERVICE = """\
+apiVersion: v1
+kind: Service
+metadata:
+  name: {{ include "app.fullname" . }}
+  labels:
+    {{- include "app.labels" . | nindent 4 }}
+spec:
+  type: {{ .Values.service.type }}
+  ports:
+    - port: {{ .Values.service.port }}
+      targetPort: {{ .Values.service.port }}
+  selector:
+    {{- include "app.selectorLabels" . | nindent 4 }}
+"""
+
+
+def write_chart(path: str) -> None:
+    files = {
+        "Chart.yaml": CHART_YAML,
+        "values.yaml": VALUES_YAML,
+        "templates/_helpers.tpl": HELPERS,
+        "templates/deployment.yaml": DEPLOYMENT,
+        "templates/service.yaml": SERVICE,
+    }
+    for name, text in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def values_files(count: int, seed: int) -> list:
+    """Cluster values files as a GitOps repository holds them, as YAML text."""
+    rng = random.Random(seed)
+    regions = ["us-west", "us-east", "eu-west", "eu-central", "ap-south"]
+    files = []
+    for index in range(count):
+        chosen = rng.sample(regions, rng.randint(1, 3))
+        values = {
+            "replicaCount": rng.randint(1, 5),
+            "image": {"tag": f"1.{rng.randint(19, 27)}.{rng.randint(0, 9)}"},
+            "labels": {"team": f"team-{index % 40}", "environment": rng.choice(["dev", "staging", "prod"])},
+            "podAnnotations": {"prometheus.io/scrape": "true"} if rng.random() < 0.5 else {},
+            "env": [{"name": f"SETTING_{n}", "value": str(rng.randint(0, 1000))} for n in range(rng.randint(0, 6))],
+            "regions": {
+                region: {
+                    "enabled": True,
+                    "replicaCount": rng.randint(1, 10),
+                    "labels": {"region": region},
+                    "resources": {"limits": {"cpu": f"{rng.randint(1, 8) * 100}m", "memory": "256Mi"}},
+                }
+                for region in chosen
+            },
+        }
+        files.append(yaml.safe_dump(values, sort_keys=False))
+    return files
+
+
+def _percentile(ordered: list, quantile: float) -> float:
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500, help="values files to check")
+    parser.add_argument("--chart", default="", help="chart directory to use instead of the generated one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reparse", action="store_true", help="also time parsing the chart for every file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        chart_path = os.path.abspath(args.chart) if args.chart else os.path.join(scratch, "app")
+        if not args.chart:
+            write_chart(chart_path)
+        files = values_files(args.files, args.seed)
+
+        started = time.perf_counter()
+        chart = load_chart(chart_path)
+        load_ms = (time.perf_counter() - started) * 1e3
+
+        durations, failed, first_error = [], 0, None
+        started = time.perf_counter()
+        for text in files:
+            begin = time.perf_counter()
+            result = check_values(text, chart_path)
+            durations.append((time.perf_counter() - begin) * 1e3)
+            if result["status"] != "success":
+                failed += 1
+                first_error = first_error or (result.get("errors") or result.get("chart_errors") or [result])[0]
+        total = time.perf_counter() - started
+
+        ordered = sorted(durations)
+        print(f"chart: {chart.name} ({len(chart.files)} templates), parsed and loaded in {load_ms:.1f} ms")
+        print(f"checked {len(files)} values files in {total:.2f} s ({len(files) / total:.0f} files/s)")
+        print(
+            f"per file: p50 {_percentile(ordered, 0.50):.2f} ms, p95 {_percentile(ordered, 0.95):.2f} ms, "
+            f"max {ordered[-1]:.2f} ms, mean {statistics.mean(durations):.2f} ms"
+        )
+        print(f"failed: {failed}" + (f" (first: {first_error})" if first_error else ""))
+
+        if args.reparse:
+            started = time.perf_counter()
+            for text in files:
+                uncached = LoadedChart(chart_path)
+                render_chart(uncached, merge_values(uncached.defaults, yaml.safe_load(text)))
+            reparse = time.perf_counter() - started
+            print(f"parsing the chart for every file: {reparse:.2f} s ({reparse / total:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
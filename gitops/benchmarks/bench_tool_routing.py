@@ -0,0 +1,182 @@
+"""Measures what tool routing saves per model call, over the SCENARIOS.md prompts.
+
+For every prompt in docs/SCENARIOS.md, compares the first model call of the
+turn with every tool and the full instruction (GITOPS_TOOL_ROUTING=false)
+against the routed one: core tools, the families the prompt hints at,
+trimmed declarations and the matching instruction sections.
+
+The MCP tools' declarations come from the live servers; record them once,
+with the MCP servers and tokens configured as for the agent:
+
+    python -m benchmarks.bench_tool_routing --record
+
+Then, from the gitops directory:
+
+    python -m benchmarks.bench_tool_routing
+
+estimates tokens as characters / 4, offline. ``--live`` sends each prompt to
+the model in both configurations instead and reports the prompt token count
+and time to first token it measured (needs the Vertex AI or Gemini API
+settings from .env).
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+from types import SimpleNamespace
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.genai import types
+
+from gitops import agent
+from gitops.prompt import agent_instruction, core_instruction, family_instructions
+from gitops.tools.tool_router import ToolRouter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = os.path.join(HERE, "..", "docs", "SCENARIOS.md")
+RECORDED = os.path.join(HERE, "mcp_tools.json")
+_PROMPT = re.compile(r'^(?:\*\*Input:\*\*|#### \*\*You Ask:\*\*)\s*"(.+)"', re.MULTILINE)
+
+
+class _RecordedTool(BaseTool):
+    def __init__(self, declaration: dict):
+        super().__init__(name=declaration["name"], description=declaration.get("description", ""))
+        self._declaration = types.FunctionDeclaration.model_validate(declaration)
+
+    def _get_declaration(self):
+        return self._declaration
+
+    async def run_async(self, *, args, tool_context):
+        raise NotImplementedError("recorded tools are only declared")
+
+
+class _RecordedToolset(BaseToolset):
+    def __init__(self, tools: list):
+        super().__init__()
+        self._recorded = tools
+
+    async def get_tools(self, readonly_context=None) -> list:
+        return list(self._recorded)
+
+    async def close(self) -> None:
+        pass
+
+
+def scenario_prompts(path: str = SCENARIOS) -> list:
+    with open(path, encoding="utf-8") as f:
+        return _PROMPT.findall(f.read())
+
+
+async def _record(path: str) -> None:
+    declarations = []
+    for toolset in (agent.argocd_tools, agent.github_tools):
+        for tool in await toolset.get_tools():
+            declarations.append(tool._get_declaration().model_dump(mode="json", exclude_none=True))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(declarations, f, indent=1)
+    print(f"Recorded {len(declarations)} MCP tool declarations to {path}")
+
+
+def _router(recorded: list) -> ToolRouter:
+    local = [tool for tool in agent.tool_router.tools if not isinstance(tool, BaseToolset)]
+    return ToolRouter(
+        tools=[_RecordedToolset([_RecordedTool(declaration) for declaration in recorded]), *local],
+        instruction=core_instruction,
+        family_instructions=family_instructions,
+        full_instruction=agent_instruction,
+    )
+
+
+async def _request(router: ToolRouter, prompt: str, routed: bool) -> dict:
+    os.environ["GITOPS_TOOL_ROUTING"] = "true" if routed else "false"
+    context = SimpleNamespace(state={}, user_content=types.Content(role="user", parts=[types.Part(text=prompt)]))
+    started = time.perf_counter()
+    tools = await router.get_tools(context)
+    declarations = [tool._get_declaration() for tool in tools]
+    instruction = router.instruction(context)
+    return {
+        "tools": tools,
+        "declarations": declarations,
+        "instruction": instruction,
+        "chars": len(instruction) + sum(len(declaration.model_dump_json(exclude_none=True)) for declaration in declarations),
+        "routing_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+async def _measure_live(client, model: str, prompt: str, request: dict) -> dict:
+    config = types.GenerateContentConfig(
+        system_instruction=request["instruction"],
+        tools=[types.Tool(function_declarations=request["declarations"])],
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True),
+    )
+    started = time.perf_counter()
+    first = None
+    usage = None
+    async for chunk in await client.aio.models.generate_content_stream(model=model, contents=prompt, config=config):
+        if first is None:
+            first = time.perf_counter() - started
+        usage = chunk.usage_metadata or usage
+    return {"tokens": usage.prompt_token_count if usage else None, "ttft_ms": round(first * 1000, 1)}
+
+
+async def _run(args) -> None:
+    recorded = []
+    if os.path.exists(args.recorded):
+        with open(args.recorded, encoding="utf-8") as f:
+            recorded = json.load(f)
+    else:
+        print(f"No recorded MCP tools at {args.recorded}; counting the local tools only (see --record).")
+    router = _router(recorded)
+    client = None
+    if args.live:
+        from google import genai
+
+        client = genai.Client()
+    rows = []
+    for prompt in scenario_prompts(args.scenarios):
+        full = await _request(router, prompt, routed=False)
+        routed = await _request(router, prompt, routed=True)
+        row = {
+            "prompt": prompt[:60],
+            "tools": f"{len(routed['tools'])}/{len(full['tools'])}",
+            "est_tokens": f"{routed['chars'] // 4}/{full['chars'] // 4}",
+            "routing_ms": round(routed["routing_ms"], 2),
+        }
+        if client is not None:
+            row["live_full"] = await _measure_live(client, args.model, prompt, full)
+            row["live_routed"] = await _measure_live(client, args.model, prompt, routed)
+        rows.append((row, full, routed))
+        print(json.dumps(row))
+    saved = [1 - routed["chars"] / full["chars"] for _, full, routed in rows]
+    summary = {
+        "scenarios": len(rows),
+        "median_tokens_saved": f"{statistics.median(saved):.0%}",
+        "min_tokens_saved": f"{min(saved):.0%}",
+    }
+    if client is not None:
+        summary["median_ttft_ms"] = {
+            mode: statistics.median(row[f"live_{mode}"]["ttft_ms"] for row, _, _ in rows) for mode in ("full", "routed")
+        }
+    print(json.dumps(summary))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=SCENARIOS, help="Markdown file with the prompts")
+    parser.add_argument("--recorded", default=RECORDED, help="MCP tool declarations written by --record")
+    parser.add_argument("--record", action="store_true", help="Record the MCP tool declarations and exit")
+    parser.add_argument("--live", action="store_true", help="Measure tokens and time to first token on the model")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    args = parser.parse_args()
+    if args.record:
+        asyncio.run(_record(args.recorded))
+    else:
+        asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compares whole workload logs with ``search_workload_logs`` summaries, offline.
+
+Gives an application on ``FakeArgoCD`` synthetic logs, then measures what a
+troubleshooting question puts into the model's context: the whole log, as
+``get_application_workload_logs`` returns it, against the pattern summary,
+for a few typical searches.
+
+Run from the gitops directory:
+
+    python -m benchmarks.bench_workload_logs --lines 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import requests
+
+from gitops.tools.workload_logs import search_workload_logs
+
+from .fake_argocd import FakeArgoCD
+
+APPLICATION = "team0-app0"
+NAMESPACE = "team0"
+SEARCHES = {
+    "last hour": {},
+    "errors, last 15 minutes": {"level": "error", "since_minutes": 15},
+    "regex": {"pattern": r"timeout after \d+ms"},
+    "literal, 20 lines": {"pattern": "connection refused", "max_lines": 20},
+}
+
+
+def _whole_log(fake: FakeArgoCD) -> dict:
+    started = time.perf_counter()
+    response = requests.get(
+        f"{fake.url}/api/v1/applications/{APPLICATION}/logs",
+        params={"namespace": NAMESPACE, "sinceSeconds": "3600"},
+    )
+    text = "\n".join(
+        json.loads(line)["result"]["content"] for line in response.iter_lines() if line
+    )
+    return {"search": "whole log", "kib_to_model": round(len(text.encode("utf-8")) / 1024, 1),
+            "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+async def _search(name: str, arguments: dict) -> dict:
+    started = time.perf_counter()
+    results = [await search_workload_logs(APPLICATION, NAMESPACE, **arguments)]
+    while results[-1].get("cursor"):
+        results.append(await search_workload_logs(APPLICATION, NAMESPACE, cursor=results[-1]["cursor"]))
+    return {"search": name, "kib_to_model": round(sum(len(json.dumps(result)) for result in results) / 1024, 1),
+            "ms": round((time.perf_counter() - started) * 1000, 1), "calls": len(results),
+            "matched_lines": sum(result["matched_lines"] for result in results)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=50000, help="Log lines in the last hour")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with FakeArgoCD(applications=1) as fake:
+        os.environ["ARGOCD_BASE_URL"] = fake.url
+        fake.generate_logs(APPLICATION, lines=args.lines, error_rate=args.error_rate)
+        print(json.dumps(_whole_log(fake)))
+        for name, arguments in SEARCHES.items():
+            print(json.dumps(asyncio.run(_search(name, arguments))))
+
+
+if __name__ == "__main__":
+    main()
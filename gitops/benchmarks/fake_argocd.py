@@ -0,0 +1,480 @@
+"""Local stand-in for the ArgoCD API server.
+
+Serves the application list, single applications, resource trees, the
+application watch stream, workload logs and sync requests, so
+``gitops.tools.argocd_state`` and ``gitops.tools.workload_logs`` can be
+exercised and benchmarked offline. Point it at the fake with
+ARGOCD_BASE_URL, or use ``FakeArgoCD`` from Python:
+
+    with FakeArgoCD(applications=50) as argocd:
+        os.environ["ARGOCD_BASE_URL"] = argocd.url
+        argocd.sync("app-7", revision="abc123", duration_seconds=1.0)
+
+Every change (``set_status``, ``sync``, ``add_application``,
+``delete_application``) bumps the resource version and is pushed to open
+watch streams as ``{"result": {"type": ..., "application": ...}}`` lines.
+A stream opened with ``?resourceVersion=`` first replays the events after it.
+``drop_watchers`` closes the open streams to exercise reconnects.
+
+``generate_logs`` fills an application's pods with synthetic request,
+warning and error lines, served with ArgoCD's time window and ``filter``
+parameters.
+"""
+import copy
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+_CLOSE = object()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _timestamp(moment: datetime) -> str:
+    # ArgoCD's timeStampStr carries nanoseconds.
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f") + "000Z"
+
+
+def log_lines(name: str, count: int, seconds: float, error_rate: float = 0.02, seed: int = 0) -> list:
+    """Synthetic (time, pod, content) log entries over the last ``seconds``, oldest first."""
+    rng = random.Random(seed)
+    pods = [f"{name}-5d8f7c9b4-{suffix}" for suffix in ("x2x9k", "q7lmp")]
+    start = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    paths = ["/api/orders", "/api/orders/{}", "/api/users/{}", "/healthz", "/metrics"]
+    entries = []
+    for index in range(count):
+        moment = start + timedelta(seconds=seconds * index / count)
+        roll = rng.random()
+        if roll < error_rate:
+            content = rng.choice([
+                f"ERROR failed to connect to postgres at 10.0.{rng.randint(0, 9)}.{rng.randint(1, 254)}:5432: "
+                "connection refused",
+                f"ERROR request {rng.getrandbits(64):016x} failed: upstream timeout after {rng.randint(5000, 9000)}ms",
+            ])
+        elif roll < error_rate * 4:
+            content = f"WARN slow query took {rng.randint(500, 3000)}ms rows={rng.randint(1, 10000)}"
+        else:
+            path = rng.choice(paths).format(rng.randint(1, 99999))
+            content = json.dumps({
+                "level": "info", "ts": _timestamp(moment), "msg": f"GET {path} 200",
+                "duration_ms": rng.randint(1, 300), "trace_id": f"{rng.getrandbits(128):032x}",
+            })
+        entries.append((moment, pods[index % len(pods)], content))
+    return entries
+
+
+def application_payload(name: str, project: str = "default", revision: str = "0" * 40) -> dict:
+    """An application as ArgoCD returns it, synced and healthy."""
+    team = name.rsplit("-", 1)[0]
+    resources = [
+        {"group": "apps", "kind": "Deployment", "namespace": team, "name": name, "status": "Synced",
+         "health": {"status": "Healthy"}},
+        {"kind": "Service", "namespace": team, "name": name, "status": "Synced", "health": {"status": "Healthy"}},
+        {"kind": "ConfigMap", "namespace": team, "name": f"{name}-config", "status": "Synced"},
+    ]
+    return {
+        "metadata": {"name": name, "namespace": "argocd", "resourceVersion": "1", "labels": {"team": team}},
+        "spec": {
+            "project": project,
+            "source": {"repoURL": "https://github.com/example/gitops.git", "path": f"teams/{team}",
+                       "targetRevision": "main", "helm": {"valueFiles": ["values.yaml"]}},
+            "destination": {"server": "https://kubernetes.default.svc", "namespace": team},
+            "syncPolicy": {"automated": {"prune": True, "selfHeal": True}},
+        },
+        "status": {
+            "sync": {"status": "Synced", "revision": revision},
+            "health": {"status": "Healthy"},
+            "resources": resources,
+            "summary": {"images": ["nginx:1.21.5"]},
+            "reconciledAt": _now(),
+            "operationState": {
+                "phase": "Succeeded",
+                "message": "successfully synced (all tasks run)",
+                "startedAt": "2025-01-01T00:00:00Z",
+                "finishedAt": "2025-01-01T00:00:05Z",
+                "syncResult": {"revision": revision},
+            },
+            "history": [{"id": i, "revision": revision, "deployedAt": "2025-01-01T00:00:05Z"} for i in range(10)],
+        },
+    }
+
+
+def tree_payload(app: dict, replicas: int = 2) -> dict:
+    """The resource tree of an application: its resources plus a ReplicaSet and pods."""
+    name = app["metadata"]["name"]
+    namespace = app["spec"]["destination"]["namespace"]
+    health = app["status"]["health"]["status"]
+    images = app["status"].get("summary", {}).get("images", [])
+    nodes = [
+        {"kind": resource["kind"], "group": resource.get("group", ""), "namespace": namespace,
+         "name": resource["name"], "version": "v1", "uid": f"{name}-{resource['kind']}",
+         "health": resource.get("health")}
+        for resource in app["status"]["resources"]
+    ]
+    nodes.append({"kind": "ReplicaSet", "group": "apps", "namespace": namespace, "name": f"{name}-5d8f7",
+                  "version": "v1", "health": {"status": health},
+                  "parentRefs": [{"kind": "Deployment", "name": name, "namespace": namespace}]})
+    for index in range(replicas):
+        pod = {"kind": "Pod", "namespace": namespace, "name": f"{name}-5d8f7-{index}", "version": "v1",
+               "images": images, "health": {"status": health},
+               "info": [{"name": "Status Reason", "value": "Running"}, {"name": "Containers", "value": "1/1"}],
+               "parentRefs": [{"kind": "ReplicaSet", "name": f"{name}-5d8f7", "namespace": namespace}]}
+        if health != "Healthy":
+            pod["health"]["message"] = "Back-off restarting failed container"
+        nodes.append(pod)
+    return {"nodes": nodes}
+
+
+class FakeArgoCDHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        fake = self.server.fake
+        parts = urlsplit(self.path)
+        segments = parts.path.strip("/").split("/")
+        if segments[:3] == ["api", "v1", "applications"] and len(segments) == 3:
+            fake._count("list")
+            self._send_json(fake._list())
+        elif segments[:3] == ["api", "v1", "applications"] and len(segments) == 4:
+            fake._count("get")
+            app = fake.application(segments[3])
+            self._send_json(app if app else {"error": "not found"}, status=200 if app else 404)
+        elif segments[:3] == ["api", "v1", "applications"] and segments[4:] == ["resource-tree"]:
+            fake._count("tree")
+            app = fake.application(segments[3])
+            self._send_json(tree_payload(app) if app else {"error": "not found"}, status=200 if app else 404)
+        elif segments[:3] == ["api", "v1", "applications"] and segments[4:] == ["logs"]:
+            fake._count("logs")
+            self._logs(fake, segments[3], parse_qs(parts.query))
+        elif segments == ["api", "v1", "stream", "applications"]:
+            fake._count("watch")
+            version = parse_qs(parts.query).get("resourceVersion", [""])[0]
+            self._stream(fake, int(version) if version.isdigit() else None)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        fake = self.server.fake
+        segments = urlsplit(self.path).path.strip("/").split("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if segments[:3] == ["api", "v1", "applications"] and segments[4:] == ["sync"]:
+            fake._count("sync")
+            if fake.application(segments[3]) is None:
+                self._send_json({"error": "not found"}, status=404)
+                return
+            fake.sync(segments[3], revision=body.get("revision") or "")
+            self._send_json(fake.application(segments[3]))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _stream(self, fake: "FakeArgoCD", version: Optional[int]) -> None:
+        events = fake._subscribe(version)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            while True:
+                event = events.get()
+                if event is _CLOSE:
+                    break
+                line = json.dumps(event).encode("utf-8") + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+                fake._sent(len(line))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            fake._unsubscribe(events)
+            self.close_connection = True
+
+    def _logs(self, fake: "FakeArgoCD", name: str, params: dict) -> None:
+        def param(key: str) -> str:
+            return params.get(key, [""])[0]
+
+        since = None
+        if param("sinceTime.seconds"):
+            since = datetime.fromtimestamp(int(param("sinceTime.seconds")), timezone.utc)
+        elif param("sinceSeconds"):
+            since = datetime.now(timezone.utc) - timedelta(seconds=int(param("sinceSeconds")))
+        until = None
+        if param("untilTime"):
+            until = datetime.fromisoformat(param("untilTime").replace("Z", "+00:00"))
+        text_filter = param("filter")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = []
+        try:
+            for moment, pod, content in fake._log_entries(name):
+                if since is not None and moment < since:
+                    continue
+                if until is not None and moment > until:
+                    break
+                if param("podName") and pod != param("podName"):
+                    continue
+                if text_filter and text_filter not in content:
+                    continue
+                entry = {"content": content, "timeStamp": moment.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                         "timeStampStr": _timestamp(moment), "podName": pod, "last": False}
+                chunk.append(json.dumps({"result": entry}).encode("utf-8") + b"\n")
+                if len(chunk) == 100:
+                    self._write_chunk(fake, b"".join(chunk))
+                    chunk = []
+            chunk.append(json.dumps({"result": {"content": "", "podName": "", "last": True}}).encode("utf-8") + b"\n")
+            self._write_chunk(fake, b"".join(chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _write_chunk(self, fake: "FakeArgoCD", data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        fake._sent(len(data))
+
+    def _send_json(self, payload, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.fake._sent(len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _ignore_disconnects(handle_error):
+    def quiet_handle_error(request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            handle_error(request, client_address)
+
+    return quiet_handle_error
+
+
+class FakeArgoCD:
+    """Runs the fake on a background thread; usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, applications: int = 0, project: str = "default"):
+        self._server = ThreadingHTTPServer((host, port), FakeArgoCDHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._server.handle_error = _ignore_disconnects(self._server.handle_error)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._lock = threading.Lock()
+        self._apps = {}
+        self._version = 1
+        self._history = []
+        self._subscribers = []
+        self._logs = {}
+        self._request_counts = {}
+        self._bytes_sent = 0
+        for index in range(applications):
+            self.add_application(f"team{index % 10}-app{index}", project=project)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_counts(self) -> dict:
+        """Requests served so far, keyed by "list", "get", "tree", "watch", "logs" and "sync"."""
+        with self._lock:
+            return dict(self._request_counts)
+
+    @property
+    def bytes_sent(self) -> int:
+        """Response body bytes sent so far, watch events included."""
+        with self._lock:
+            return self._bytes_sent
+
+    def application(self, name: str) -> Optional[dict]:
+        with self._lock:
+            app = self._apps.get(name)
+            return copy.deepcopy(app) if app else None
+
+    def add_application(self, name: str, project: str = "default", revision: str = "0" * 40) -> None:
+        with self._lock:
+            self._apps[name] = application_payload(name, project, revision)
+            self._publish("ADDED", name)
+
+    def delete_application(self, name: str) -> None:
+        with self._lock:
+            app = self._apps.pop(name)
+            self._version += 1
+            app["metadata"]["resourceVersion"] = str(self._version)
+            self._record("DELETED", app)
+
+    def set_status(
+        self,
+        name: str,
+        sync: Optional[str] = None,
+        health: Optional[str] = None,
+        revision: Optional[str] = None,
+        health_message: str = "",
+    ) -> None:
+        """Changes an application's sync status, health or synced revision."""
+        with self._lock:
+            status = self._apps[name]["status"]
+            if sync is not None:
+                status["sync"]["status"] = sync
+            if revision is not None:
+                status["sync"]["revision"] = revision
+            if health is not None:
+                status["health"] = {"status": health}
+                if health_message:
+                    status["health"]["message"] = health_message
+                for resource in status["resources"]:
+                    if "health" in resource:
+                        resource["health"] = dict(status["health"])
+            status["reconciledAt"] = _now()
+            self._publish("MODIFIED", name)
+
+    def sync(self, name: str, revision: str = "", duration_seconds: float = 0.2, fail: bool = False) -> None:
+        """Starts a sync the way ArgoCD runs one, finishing after ``duration_seconds``.
+
+        The application gets a pending operation, then a Running operation
+        state while progressing, then Succeeded (Synced and Healthy at the
+        revision) or, with ``fail``, Failed.
+        """
+        with self._lock:
+            app = self._apps[name]
+            revision = revision or app["status"]["sync"]["revision"]
+            app["operation"] = {"sync": {"revision": revision}, "initiatedBy": {"username": "admin"}}
+            self._publish("MODIFIED", name)
+
+        def progress():
+            time.sleep(duration_seconds / 4)
+            with self._lock:
+                app = self._apps.get(name)
+                if app is None:
+                    return
+                app.pop("operation", None)
+                app["status"]["operationState"] = {
+                    "phase": "Running", "message": "one or more tasks are running", "startedAt": _now(),
+                    "operation": {"sync": {"revision": revision}},
+                }
+                app["status"]["health"] = {"status": "Progressing"}
+                self._publish("MODIFIED", name)
+            time.sleep(duration_seconds * 3 / 4)
+            with self._lock:
+                app = self._apps.get(name)
+                if app is None:
+                    return
+                state = app["status"]["operationState"]
+                state["finishedAt"] = _now()
+                if fail:
+                    state.update(phase="Failed", message="one or more objects failed to apply")
+                    app["status"]["health"] = {"status": "Degraded"}
+                    app["status"]["sync"]["status"] = "OutOfSync"
+                else:
+                    state.update(phase="Succeeded", message="successfully synced (all tasks run)",
+                                 syncResult={"revision": revision})
+                    app["status"]["health"] = {"status": "Healthy"}
+                    app["status"]["sync"] = {"status": "Synced", "revision": revision}
+                app["status"]["reconciledAt"] = _now()
+                self._publish("MODIFIED", name)
+
+        threading.Thread(target=progress, daemon=True).start()
+
+    def generate_logs(self, name: str, lines: int = 10000, seconds: float = 3600, error_rate: float = 0.02) -> None:
+        """Gives an application ``lines`` synthetic log lines spread over the last ``seconds``."""
+        with self._lock:
+            self._logs[name] = log_lines(name, lines, seconds, error_rate)
+
+    def drop_watchers(self) -> None:
+        """Ends every open watch stream, as a restarting ArgoCD server would."""
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.put(_CLOSE)
+
+    def start(self) -> "FakeArgoCD":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.drop_watchers()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeArgoCD":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _publish(self, kind: str, name: str) -> None:
+        # Called with the lock held.
+        self._version += 1
+        app = self._apps[name]
+        app["metadata"]["resourceVersion"] = str(self._version)
+        self._record(kind, app)
+
+    def _record(self, kind: str, app: dict) -> None:
+        event = {"result": {"type": kind, "application": copy.deepcopy(app)}}
+        self._history.append((self._version, event))
+        for subscriber in self._subscribers:
+            subscriber.put(event)
+
+    def _list(self) -> dict:
+        with self._lock:
+            return {
+                "metadata": {"resourceVersion": str(self._version)},
+                "items": [copy.deepcopy(app) for app in self._apps.values()],
+            }
+
+    def _log_entries(self, name: str) -> list:
+        with self._lock:
+            return self._logs.get(name, [])
+
+    def _subscribe(self, version: Optional[int]) -> queue.Queue:
+        events = queue.Queue()
+        with self._lock:
+            if version is not None:
+                for event_version, event in self._history:
+                    if event_version > version:
+                        events.put(event)
+            self._subscribers.append(events)
+        return events
+
+    def _unsubscribe(self, events: queue.Queue) -> None:
+        with self._lock:
+            if events in self._subscribers:
+                self._subscribers.remove(events)
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self._request_counts[kind] = self._request_counts.get(kind, 0) + 1
+
+    def _sent(self, size: int) -> None:
+        with self._lock:
+            self._bytes_sent += size
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--applications", type=int, default=20)
+    args = parser.parse_args()
+    fake = FakeArgoCD(port=args.port, applications=args.applications)
+    print(f"Serving a fake ArgoCD with {args.applications} applications on {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
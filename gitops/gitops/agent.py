@@ -1,11 +1,48 @@
 from google.adk.agents import Agent
 
-from .prompt import agent_instruction
+from . import telemetry
+from .prompt import agent_instruction, core_instruction, family_instructions
+from .tools.argocd_state import (
+    get_application_state,
+    get_application_tree,
+    list_application_states,
+    wait_for_application,
+)
+from .tools.batch_commit import commit_values_changes
+from .tools.fan_out import run_change_plan
+from .tools.fleet_tools import find_workloads
+from .tools.helm_values import preview_values_changes, validate_helm_values
+from .tools.tool_router import ToolRouter
 from .tools.tools import argocd_tools, github_tools
+from .tools.workload_logs import search_workload_logs
+
+# Exposes the core tools and loads the other tool families on demand.
+tool_router = ToolRouter(
+    tools=[
+        argocd_tools,
+        github_tools,
+        find_workloads,
+        commit_values_changes,
+        run_change_plan,
+        validate_helm_values,
+        preview_values_changes,
+        list_application_states,
+        get_application_state,
+        get_application_tree,
+        wait_for_application,
+        search_workload_logs,
+    ],
+    instruction=core_instruction,
+    family_instructions=family_instructions,
+    full_instruction=agent_instruction,
+)
 
 root_agent = Agent(
     model="gemini-2.5-flash",
     name="gitops",
-    instruction=agent_instruction,
-    tools=[argocd_tools, github_tools],
+    instruction=tool_router.instruction,
+    tools=[tool_router],
+    before_agent_callback=tool_router.remember_hints,
+    before_tool_callback=telemetry.before_tool,
+    after_tool_callback=telemetry.after_tool,
 )
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""Spans and counters for the agent's tool calls.
+
+``before_tool`` and ``after_tool`` are the agent's tool callbacks: together they
+time every tool call, tagged with the MCP server it went to (``local`` for
+function tools). ``span`` times any other block, such as listing an MCP
+server's tools. ``count`` adds to a named counter; failed tool calls are
+counted in ``tool.errors`` and ``upstream.errors``.
+
+``snapshot`` returns the counters and p50/p95/p99 of the recent durations per
+span name, upstream and status. With ``opentelemetry-api`` installed (google-adk
+depends on it), spans, durations and counters also go to the configured
+OpenTelemetry providers.
+"""
+import contextlib
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Optional
+
+try:
+    from opentelemetry import metrics as otel_metrics
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:
+    otel_metrics = otel_trace = None
+
+INSTRUMENTATION_NAME = "gitops"
+# Durations kept per series for the percentiles.
+MAX_SAMPLES = 1024
+# Tool calls whose after callback never ran, e.g. because the tool raised,
+# are dropped oldest first past this many.
+MAX_OPEN_SPANS = 1024
+
+_durations = {}
+_counters = {}
+_otel_counters = {}
+_otel_durations = None
+_tool_upstreams = {}
+_open_spans = OrderedDict()
+_lock = threading.Lock()
+
+
+def count(name: str, value: int = 1, **attributes) -> None:
+    """Adds to a counter, e.g. ``count("upstream.errors", upstream="github")``."""
+    key = (name, tuple(sorted(attributes.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        otel_counter = _otel_counters.get(name)
+        if otel_counter is None and otel_metrics is not None:
+            otel_counter = _otel_counters[name] = otel_metrics.get_meter(INSTRUMENTATION_NAME).create_counter(name)
+    if otel_counter is not None:
+        otel_counter.add(value, attributes=attributes)
+
+
+def set_tool_upstream(tool_name: str, upstream: str) -> None:
+    """Records which MCP server serves a tool, for the span attributes."""
+    with _lock:
+        _tool_upstreams[tool_name] = upstream
+
+
+def _start(name: str, upstream: str) -> tuple:
+    otel_span = None
+    if otel_trace is not None:
+        otel_span = otel_trace.get_tracer(INSTRUMENTATION_NAME).start_span(name, attributes={"upstream": upstream})
+    return name, upstream, otel_span, time.perf_counter()
+
+
+def _finish(opened: tuple, error: Optional[str] = None) -> None:
+    global _otel_durations
+    name, upstream, otel_span, started = opened
+    duration_ms = (time.perf_counter() - started) * 1e3
+    status = "ok" if error is None else "error"
+    with _lock:
+        samples = _durations.get((name, upstream, status))
+        if samples is None:
+            samples = _durations[(name, upstream, status)] = deque(maxlen=MAX_SAMPLES)
+        samples.append(duration_ms)
+        if _otel_durations is None and otel_metrics is not None:
+            _otel_durations = otel_metrics.get_meter(INSTRUMENTATION_NAME).create_histogram(
+                "span.duration_ms", unit="ms"
+            )
+    if _otel_durations is not None:
+        _otel_durations.record(duration_ms, attributes={"span": name, "upstream": upstream, "status": status})
+    if otel_span is not None:
+        if error is not None:
+            otel_span.set_status(Status(StatusCode.ERROR, error))
+        otel_span.end()
+
+
+@contextlib.contextmanager
+def span(name: str, upstream: str = "local"):
+    """Times a block; an exception escaping it marks the span as failed."""
+    opened = _start(name, upstream)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _finish(opened, error)
+
+
+def _call_key(tool, tool_context) -> tuple:
+    return (tool.name, getattr(tool_context, "function_call_id", None) or id(tool_context))
+
+
+def _tool_error(tool_response: Any) -> Optional[str]:
+    if hasattr(tool_response, "model_dump"):
+        tool_response = tool_response.model_dump()
+    if not isinstance(tool_response, dict):
+        return None
+    # MCP tools return the CallToolResult, function tools an error status.
+    if tool_response.get("isError"):
+        content = tool_response.get("content") or [{}]
+        return str(content[0].get("text", "tool error"))[:200]
+    if tool_response.get("status") == "error":
+        return str(tool_response.get("error_message", "error"))[:200]
+    return None
+
+
+def before_tool(tool, args: dict, tool_context) -> Optional[dict]:
+    """Agent ``before_tool_callback`` that opens a span for the call."""
+    with _lock:
+        upstream = _tool_upstreams.get(tool.name, "local")
+    opened = _start(tool.name, upstream)
+    with _lock:
+        _open_spans[_call_key(tool, tool_context)] = opened
+        while len(_open_spans) > MAX_OPEN_SPANS:
+            _open_spans.popitem(last=False)
+    return None
+
+
+def after_tool(tool, args: dict, tool_context, tool_response: Any) -> Optional[dict]:
+    """Agent ``after_tool_callback`` that closes the span of the call."""
+    with _lock:
+        opened = _open_spans.pop(_call_key(tool, tool_context), None)
+    if opened is None:
+        return None
+    error = _tool_error(tool_response)
+    if error is not None:
+        count("tool.errors", tool=tool.name)
+        count("upstream.errors", upstream=opened[1])
+    _finish(opened, error)
+    return None
+
+
+def _percentile(ordered: list, quantile: float) -> float:
+    return round(ordered[min(int(quantile * len(ordered)), len(ordered) - 1)], 3)
+
+
+def snapshot() -> dict:
+    """Returns the counters and the duration percentiles of every span series."""
+    with _lock:
+        series = [(key, sorted(samples)) for key, samples in _durations.items()]
+        counters = dict(_counters)
+    return {
+        "spans": [
+            {
+                "span": name,
+                "upstream": upstream,
+                "status": status,
+                "samples": len(ordered),
+                "p50_ms": _percentile(ordered, 0.50),
+                "p95_ms": _percentile(ordered, 0.95),
+                "p99_ms": _percentile(ordered, 0.99),
+            }
+            for (name, upstream, status), ordered in series
+        ],
+        "counters": [
+            {"name": name, "attributes": dict(attributes), "value": value}
+            for (name, attributes), value in counters.items()
+        ],
+    }
+
+
+def reset() -> None:
+    """Clears the recorded durations and counters."""
+    with _lock:
+        _durations.clear()
+        _counters.clear()
@@ -0,0 +1,577 @@
+"""In-memory ArgoCD application state, kept current by ArgoCD's watch stream.
+
+The agent used to poll ``list_applications``, ``get_application`` and
+``get_application_resource_tree`` through the ArgoCD MCP server, downloading
+every application and tree again on each poll, e.g. while waiting for a sync.
+``ArgoCDState`` lists the applications once and then follows
+``/api/v1/stream/applications``, applying each ADDED, MODIFIED and DELETED
+event to its copy:
+
+* application queries are answered from memory;
+* resource trees are fetched on first use and kept until the application's
+  status (sync, health, resources, operation or reconcile time) changes;
+* ``wait_for`` completes on the watch event that brings the application to
+  the wanted state, instead of polling;
+* a dropped stream is reopened after a relist, with backoff, so no event is
+  missed.
+
+Point ARGOCD_BASE_URL at ``benchmarks.fake_argocd.FakeArgoCD`` to run it
+offline.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import requests
+
+from .. import telemetry
+
+DEFAULT_WATCH_IDLE_SECONDS = 300.0
+DEFAULT_WAIT_TIMEOUT_SECONDS = 300.0
+DEFAULT_AFTER_SYNC_WINDOW_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+MAX_BACKOFF_SECONDS = 30.0
+OPERATION_RUNNING = ("Running", "Terminating")
+OPERATION_FAILED = ("Failed", "Error")
+
+logger = logging.getLogger(__name__)
+
+
+def _status_fingerprint(app: dict) -> str:
+    status = app.get("status") or {}
+    return json.dumps(
+        [
+            status.get("sync"),
+            status.get("health"),
+            status.get("resources"),
+            (status.get("operationState") or {}).get("phase"),
+            status.get("reconciledAt"),
+        ],
+        sort_keys=True,
+    )
+
+
+def _epoch(timestamp: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch of an ArgoCD timestamp such as "2025-01-01T00:00:05Z"."""
+    try:
+        return datetime.strptime(str(timestamp)[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+def _synced_since(operation: dict, revision: str, since: float) -> bool:
+    """Whether a finished operation synced ``revision`` or finished after ``since``."""
+    synced = str((operation.get("syncResult") or {}).get("revision") or "")
+    if revision and synced.startswith(revision):
+        return True
+    finished = _epoch(operation.get("finishedAt"))
+    return finished is not None and finished >= since
+
+
+def argocd_state_enabled() -> bool:
+    """Whether application queries are served by ``ArgoCDState`` instead of the MCP server."""
+    return bool(os.getenv("ARGOCD_BASE_URL")) and os.getenv("ARGOCD_STATE_CACHE_ENABLED", "true").lower() not in (
+        "0", "false", "no", "off",
+    )
+
+
+def summarize_application(app: dict) -> dict:
+    """Returns the fields of an application the agent reasons about."""
+    spec = app.get("spec") or {}
+    source = spec.get("source") or (spec.get("sources") or [{}])[0]
+    status = app.get("status") or {}
+    sync = status.get("sync") or {}
+    health = status.get("health") or {}
+    operation = status.get("operationState") or {}
+    summary = {
+        "name": app.get("metadata", {}).get("name"),
+        "project": spec.get("project"),
+        "namespace": (spec.get("destination") or {}).get("namespace"),
+        "server": (spec.get("destination") or {}).get("server") or (spec.get("destination") or {}).get("name"),
+        "repo": source.get("repoURL"),
+        "path": source.get("path") or source.get("chart"),
+        "target_revision": source.get("targetRevision"),
+        "sync_status": sync.get("status"),
+        "revision": sync.get("revision"),
+        "health_status": health.get("status"),
+        "operation_pending": bool(app.get("operation")),
+    }
+    if health.get("message"):
+        summary["health_message"] = health["message"]
+    if operation:
+        summary["operation_phase"] = operation.get("phase")
+        summary["operation_message"] = operation.get("message")
+        summary["operation_started_at"] = operation.get("startedAt")
+    images = (status.get("summary") or {}).get("images")
+    if images:
+        summary["images"] = images
+    conditions = [
+        f"{condition.get('type')}: {condition.get('message')}" for condition in status.get("conditions") or []
+    ]
+    if conditions:
+        summary["conditions"] = conditions
+    return summary
+
+
+def summarize_tree(tree: dict, kind: str = "", unhealthy_only: bool = False) -> list:
+    """Returns one compact entry per node of a resource tree."""
+    nodes = []
+    for node in tree.get("nodes") or []:
+        health = node.get("health") or {}
+        if kind and node.get("kind") != kind:
+            continue
+        if unhealthy_only and health.get("status") in (None, "Healthy"):
+            continue
+        entry = {
+            "kind": node.get("kind"),
+            "name": node.get("name"),
+            "namespace": node.get("namespace"),
+            "health": health.get("status"),
+        }
+        if health.get("message"):
+            entry["message"] = health["message"]
+        parents = node.get("parentRefs") or []
+        if parents:
+            entry["parent"] = f"{parents[0].get('kind')}/{parents[0].get('name')}"
+        if node.get("images"):
+            entry["images"] = node["images"]
+        nodes.append(entry)
+    return nodes
+
+
+class _Waiter:
+    __slots__ = ("name", "check", "loop", "future")
+
+    def __init__(self, name: str, check, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.name = name
+        self.check = check
+        self.loop = loop
+        self.future = future
+
+
+class ArgoCDState:
+    """All applications of one ArgoCD instance, plus their resource trees."""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: Optional[str] = None,
+        verify: bool = True,
+        watch_idle_seconds: float = DEFAULT_WATCH_IDLE_SECONDS,
+        after_sync_window_seconds: float = DEFAULT_AFTER_SYNC_WINDOW_SECONDS,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.watch_idle_seconds = watch_idle_seconds
+        self.after_sync_window_seconds = after_sync_window_seconds
+        self._session = requests.Session()
+        self._session.verify = verify
+        if token:
+            self._session.headers["Authorization"] = f"Bearer {token}"
+        self._apps = {}
+        self._fingerprints = {}
+        self._trees = {}
+        self._resource_version = None
+        self._waiters = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stream = None
+        self._counters = {
+            "lists": 0,
+            "watch_connects": 0,
+            "watch_errors": 0,
+            "events": 0,
+            "tree_fetches": 0,
+            "tree_hits": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> Optional["ArgoCDState"]:
+        """Builds the cache from ARGOCD_* environment variables, None if it is disabled."""
+        if not argocd_state_enabled():
+            return None
+        return cls(
+            base_url=os.environ["ARGOCD_BASE_URL"],
+            token=os.getenv("ARGOCD_API_TOKEN"),
+            verify=os.getenv("ARGOCD_INSECURE", "false").lower() not in ("1", "true", "yes", "on"),
+            watch_idle_seconds=float(os.getenv("ARGOCD_WATCH_IDLE_SECONDS", DEFAULT_WATCH_IDLE_SECONDS)),
+            after_sync_window_seconds=float(
+                os.getenv("ARGOCD_AFTER_SYNC_WINDOW_SECONDS", DEFAULT_AFTER_SYNC_WINDOW_SECONDS)
+            ),
+        )
+
+    def start(self) -> None:
+        """Lists the applications and starts following the watch stream; idempotent."""
+        with self._lock:
+            if self._started:
+                return
+        self._relist()
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._thread = threading.Thread(target=self._watch_loop, name="argocd-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        stream = self._stream
+        sock = getattr(getattr(getattr(stream, "raw", None), "connection", None), "sock", None)
+        if sock is not None:
+            # Closing the response would wait for the watch thread's read.
+            sock.shutdown(socket.SHUT_RDWR)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def applications(self) -> list:
+        with self._lock:
+            return list(self._apps.values())
+
+    def application(self, name: str) -> Optional[dict]:
+        with self._lock:
+            return self._apps.get(name)
+
+    def resource_tree(self, name: str) -> Optional[dict]:
+        """Returns the application's resource tree, fetching it only if its status changed since."""
+        with self._lock:
+            if name not in self._apps:
+                return None
+            cached = self._trees.get(name)
+            if cached is not None and cached[0] == self._fingerprints.get(name):
+                self._counters["tree_hits"] += 1
+                telemetry.count("cache.lookups", cache="argocd_tree", result="hit")
+                return cached[1]
+            fingerprint = self._fingerprints.get(name)
+        telemetry.count("cache.lookups", cache="argocd_tree", result="miss")
+        tree = self._get(f"/api/v1/applications/{name}/resource-tree")
+        with self._lock:
+            self._counters["tree_fetches"] += 1
+            # A newer status that arrived meanwhile keeps the entry stale.
+            if self._fingerprints.get(name) == fingerprint:
+                self._trees[name] = (fingerprint, tree)
+        return tree
+
+    async def wait_for(
+        self,
+        name: str,
+        sync_status: str = "Synced",
+        health_status: str = "Healthy",
+        revision: str = "",
+        after_sync: bool = False,
+        timeout_seconds: float = DEFAULT_WAIT_TIMEOUT_SECONDS,
+    ) -> dict:
+        """Waits until the application reaches a state, or its sync operation fails.
+
+        Args:
+            name (str): Application name.
+            sync_status (str): Wanted sync status, "" for any.
+            health_status (str): Wanted health status, "" for any.
+            revision (str): Wanted synced revision (prefix of the commit SHA), "" for any.
+            after_sync (bool): Only accept the state once a sync has
+                finished, e.g. right after triggering one: an operation newer
+                than the one seen when the wait started, or that one if it
+                synced ``revision`` or finished at most
+                ``after_sync_window_seconds`` before the wait started, since
+                a quick sync can finish before the wait begins.
+            timeout_seconds (float): Longest wait.
+
+        Returns:
+            dict: status ("success", "failed", "timeout" or "error") and the
+            application summary.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            app = self._apps.get(name)
+            if app is None:
+                return {"status": "error", "error_message": f"Application {name} not found"}
+            baseline = (app.get("status") or {}).get("operationState") or {}
+        baseline_synced = (
+            after_sync
+            and baseline.get("phase") not in OPERATION_RUNNING
+            and _synced_since(baseline, revision, time.time() - self.after_sync_window_seconds)
+        )
+
+        def check(app: Optional[dict]) -> Optional[dict]:
+            if app is None:
+                return {"status": "error", "error_message": f"Application {name} was deleted"}
+            status = app.get("status") or {}
+            operation = status.get("operationState") or {}
+            new_operation = operation.get("startedAt") != baseline.get("startedAt")
+            since_sync = new_operation or baseline.get("phase") in OPERATION_RUNNING or baseline_synced
+            if app.get("operation") or operation.get("phase") in OPERATION_RUNNING:
+                return None
+            if operation.get("phase") in OPERATION_FAILED and since_sync:
+                return {"status": "failed", "application": summarize_application(app)}
+            if after_sync and not since_sync:
+                return None
+            if sync_status and (status.get("sync") or {}).get("status") != sync_status:
+                return None
+            if health_status and (status.get("health") or {}).get("status") != health_status:
+                return None
+            if revision and not str((status.get("sync") or {}).get("revision") or "").startswith(revision):
+                return None
+            return {"status": "success", "application": summarize_application(app)}
+
+        with self._lock:
+            outcome = check(self._apps.get(name))
+            if outcome is not None:
+                outcome["waited_seconds"] = 0.0
+                return outcome
+            waiter = _Waiter(name, check, loop, future)
+            self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            outcome = await asyncio.wait_for(future, timeout_seconds)
+        except asyncio.TimeoutError:
+            outcome = {"status": "timeout", "application": summarize_application(self.application(name) or {})}
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        outcome["waited_seconds"] = round(time.perf_counter() - started, 3)
+        return outcome
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                applications=len(self._apps),
+                trees=len(self._trees),
+                waiters=len(self._waiters),
+                resource_version=self._resource_version,
+            )
+
+    def _get(self, path: str, **kwargs) -> dict:
+        response = self._session.get(self.base_url + path, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _relist(self) -> None:
+        data = self._get("/api/v1/applications")
+        apps = {app["metadata"]["name"]: app for app in data.get("items") or []}
+        with self._lock:
+            self._counters["lists"] += 1
+            self._resource_version = (data.get("metadata") or {}).get("resourceVersion")
+            self._apps = apps
+            self._fingerprints = {name: _status_fingerprint(app) for name, app in apps.items()}
+            self._trees = {name: tree for name, tree in self._trees.items() if name in apps}
+            self._notify(list(apps))
+
+    def _apply(self, event: dict) -> None:
+        result = event.get("result", event)
+        kind = result.get("type")
+        app = result.get("application")
+        if not kind or not app:
+            return
+        name = app["metadata"]["name"]
+        with self._lock:
+            self._counters["events"] += 1
+            version = app["metadata"].get("resourceVersion")
+            if version:
+                self._resource_version = version
+            if kind == "DELETED":
+                self._apps.pop(name, None)
+                self._fingerprints.pop(name, None)
+                self._trees.pop(name, None)
+            else:
+                self._apps[name] = app
+                self._fingerprints[name] = _status_fingerprint(app)
+            self._notify([name])
+        telemetry.count("argocd.watch_events", type=kind)
+
+    def _notify(self, names: list) -> None:
+        # Called with the lock held.
+        for waiter in list(self._waiters):
+            if waiter.name not in names or waiter.future.done():
+                continue
+            outcome = waiter.check(self._apps.get(waiter.name))
+            if outcome is not None:
+                self._waiters.remove(waiter)
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future, outcome)
+
+    def _watch_loop(self) -> None:
+        backoff = 1.0
+        reconnect = False
+        while not self._stopping.is_set():
+            try:
+                if reconnect:
+                    self._relist()
+                params = {"resourceVersion": self._resource_version} if self._resource_version else {}
+                with self._session.get(
+                    self.base_url + "/api/v1/stream/applications",
+                    params=params,
+                    stream=True,
+                    timeout=(REQUEST_TIMEOUT_SECONDS, self.watch_idle_seconds),
+                ) as response:
+                    response.raise_for_status()
+                    self._stream = response
+                    with self._lock:
+                        self._counters["watch_connects"] += 1
+                    received = False
+                    for line in response.iter_lines():
+                        if self._stopping.is_set():
+                            return
+                        line = line.strip()
+                        if line.startswith(b"data:"):
+                            line = line[5:].strip()
+                        if line:
+                            self._apply(json.loads(line))
+                            received = True
+                            backoff = 1.0
+                if not received:
+                    # A stream closed right away, e.g. by a proxy, is retried with backoff too.
+                    self._stopping.wait(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            except (requests.exceptions.RequestException, ValueError, OSError) as e:
+                if self._stopping.is_set():
+                    return
+                with self._lock:
+                    self._counters["watch_errors"] += 1
+                logger.info("ArgoCD watch stream ended, reconnecting in %.0fs: %s", backoff, e)
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            finally:
+                self._stream = None
+            reconnect = True
+
+
+def _resolve(future: asyncio.Future, outcome: dict) -> None:
+    if not future.done():
+        future.set_result(outcome)
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_argocd_state() -> Optional[ArgoCDState]:
+    """Returns the process-wide state cache, or None if it is disabled."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = ArgoCDState.from_env()
+        return _state
+
+
+async def _started_state():
+    state = get_argocd_state()
+    if state is None:
+        return None, {
+            "status": "error",
+            "error_message": "The ArgoCD state cache is disabled. Set ARGOCD_BASE_URL, or use the ArgoCD MCP tools.",
+        }
+    try:
+        await asyncio.to_thread(state.start)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, {"status": "error", "error_message": f"Could not list ArgoCD applications: {e}"}
+    return state, None
+
+
+async def list_application_states(project: str = "", sync_status: str = "", health_status: str = "") -> dict:
+    """Lists ArgoCD applications with their sync and health status, from the live state cache.
+
+    Args:
+        project (str): Only applications of this project.
+        sync_status (str): Only this sync status, e.g. "OutOfSync".
+        health_status (str): Only this health status, e.g. "Degraded".
+
+    Returns:
+        dict: status and one summary per application: project, destination,
+        source, sync status and revision, health and the last operation.
+    """
+    state, error = await _started_state()
+    if error:
+        return error
+    summaries = [summarize_application(app) for app in state.applications()]
+    summaries = [
+        summary for summary in summaries
+        if (not project or summary["project"] == project)
+        and (not sync_status or summary["sync_status"] == sync_status)
+        and (not health_status or summary["health_status"] == health_status)
+    ]
+    return {"status": "success", "count": len(summaries), "applications": sorted(summaries, key=lambda s: s["name"])}
+
+
+async def get_application_state(name: str) -> dict:
+    """Returns an ArgoCD application's current sync, health and operation status, from the live state cache.
+
+    Args:
+        name (str): Application name.
+
+    Returns:
+        dict: status and the application summary, including conditions and images.
+    """
+    state, error = await _started_state()
+    if error:
+        return error
+    app = state.application(name)
+    if app is None:
+        return {"status": "error", "error_message": f"Application {name} not found"}
+    return {"status": "success", "application": summarize_application(app)}
+
+
+async def get_application_tree(name: str, kind: str = "", unhealthy_only: bool = False) -> dict:
+    """Returns the resources an ArgoCD application manages, with their health.
+
+    Served from memory until the application's status changes.
+
+    Args:
+        name (str): Application name.
+        kind (str): Only resources of this kind, e.g. "Pod".
+        unhealthy_only (bool): Only resources whose health is not Healthy.
+
+    Returns:
+        dict: status and the resource nodes: kind, name, namespace, health,
+        parent and images.
+    """
+    state, error = await _started_state()
+    if error:
+        return error
+    try:
+        tree = await asyncio.to_thread(state.resource_tree, name)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {"status": "error", "error_message": f"Could not fetch the resource tree: {e}"}
+    if tree is None:
+        return {"status": "error", "error_message": f"Application {name} not found"}
+    nodes = summarize_tree(tree, kind, unhealthy_only)
+    return {"status": "success", "count": len(nodes), "nodes": nodes}
+
+
+async def wait_for_application(
+    name: str,
+    sync_status: str = "Synced",
+    health_status: str = "Healthy",
+    revision: str = "",
+    after_sync: bool = False,
+    timeout_seconds: int = 300,
+) -> dict:
+    """Blocks until an ArgoCD application is synced and healthy (or another wanted state), or its sync fails.
+
+    Use this after sync_application instead of checking the status repeatedly:
+    it returns as soon as ArgoCD reports the change.
+
+    Args:
+        name (str): Application name.
+        sync_status (str): Wanted sync status; "" accepts any.
+        health_status (str): Wanted health status; "" accepts any.
+        revision (str): Wanted synced commit SHA or prefix; "" accepts any.
+        after_sync (bool): Set to true after triggering a sync, so the state from before the sync is not accepted;
+            a sync that already finished is accepted if it synced the revision or finished moments ago.
+        timeout_seconds (int): Longest wait, in seconds.
+
+    Returns:
+        dict: status ("success", "failed", "timeout" or "error"), the
+        application summary and how long the wait took.
+    """
+    state, error = await _started_state()
+    if error:
+        return error
+    return await state.wait_for(name, sync_status, health_status, revision, after_sync, float(timeout_seconds))
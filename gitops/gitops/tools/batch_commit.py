@@ -0,0 +1,507 @@
+"""One commit, and one pull request, for a change spanning many values files.
+
+Updating N clusters through ``create_or_update_file`` takes N tool turns and
+makes N commits. ``commit_values_changes`` takes every edit at once, each a
+values file path plus a structured patch:
+
+    {"path": "teams/a/prod/us-west/cluster1/values.yaml",
+     "set": {"image.tag": "1.21.6"}, "unset": ["podAnnotations.legacy"]}
+
+(``"create": true`` starts a missing file from an empty document). It reads
+the files at the head of the base branch, applies the patches and writes the
+result as a single commit on a new branch.
+
+Two backends do the reading and writing:
+
+* ``GitHubDataBackend`` reads up to GITHUB_GRAPHQL_BATCH files per GraphQL
+  request and writes one tree, one commit and one ref through the Git Data
+  API, then opens the pull request. This is the default.
+* ``LocalGitBackend`` commits to a local repository with git plumbing and
+  opens no pull request, for trying changes offline. It is used when
+  GITOPS_COMMIT_BACKEND=local, on the repository at GITOPS_LOCAL_REPO_PATH.
+
+Patched keys that hold a plain scalar are rewritten in place, so comments and
+layout survive; other patches re-serialize the file. Either way the result is
+checked to parse to exactly the patched values before anything is written.
+"""
+import asyncio
+import copy
+import json
+import os
+import re
+import subprocess
+import tempfile
+from typing import Optional
+
+import requests
+import yaml
+
+from .github_cache import DEFAULT_API_URL, get_github_cache
+
+DEFAULT_GRAPHQL_BATCH = 50
+DEFAULT_MAX_FILES = 500
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+_KEY_LINE = re.compile(
+    r"^(?P<indent> *)(?P<quote>[\"']?)(?P<key>[^\"'#:\s][^\"'#:]*?)(?P=quote)\s*:"
+    r"(?P<space>\s*)(?P<value>[^#]*?)(?P<comment>\s+#.*)?$"
+)
+
+
+class BatchCommitError(Exception):
+    """A batch could not be read, patched, committed or opened as a pull request."""
+
+
+def _keys(dotted: str) -> list:
+    keys = [key for key in str(dotted).split(".") if key]
+    if not keys:
+        raise BatchCommitError(f"Invalid key {dotted!r}")
+    return keys
+
+
+def _set(data: dict, keys: list, value) -> None:
+    for key in keys[:-1]:
+        child = data.setdefault(key, {})
+        if not isinstance(child, dict):
+            raise BatchCommitError(f"Cannot set {'.'.join(keys)}: {key} is not a mapping")
+        data = child
+    data[keys[-1]] = value
+
+
+def _unset(data: dict, keys: list) -> None:
+    for key in keys[:-1]:
+        data = data.get(key)
+        if not isinstance(data, dict):
+            return
+    data.pop(keys[-1], None)
+
+
+def _indent_of(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def _is_content(line: str) -> bool:
+    stripped = line.strip()
+    return bool(stripped) and not stripped.startswith("#")
+
+
+def _find_key(lines: list, start: int, end: int, key: str) -> Optional[int]:
+    # The first content line fixes the indentation of the block's own keys.
+    indent = None
+    for index in range(start, end):
+        line = lines[index]
+        if not _is_content(line):
+            continue
+        current = _indent_of(line)
+        if indent is None:
+            indent = current
+        if current < indent:
+            return None
+        if current == indent:
+            match = _KEY_LINE.match(line)
+            if match and match.group("key") == key:
+                return index
+    return None
+
+
+def _block_end(lines: list, index: int) -> int:
+    indent = _indent_of(lines[index])
+    end = index + 1
+    while end < len(lines) and (not _is_content(lines[end]) or _indent_of(lines[end]) > indent):
+        end += 1
+    return end
+
+
+def _scalar(value, original: str) -> str:
+    if isinstance(value, str) and original.startswith('"'):
+        return json.dumps(value)
+    dumped = yaml.safe_dump([value], default_flow_style=True, width=10**6).strip()
+    return dumped[1:-1]
+
+
+def _replace_scalar(text: str, keys: list, value) -> Optional[str]:
+    """Rewrites one existing scalar in place, or returns None if it is not one."""
+    if isinstance(value, (dict, list)):
+        return None
+    lines = text.split("\n")
+    start, end = 0, len(lines)
+    index = None
+    for key in keys:
+        index = _find_key(lines, start, end, key)
+        if index is None:
+            return None
+        start, end = index + 1, _block_end(lines, index)
+    match = _KEY_LINE.match(lines[index])
+    original = match.group("value")
+    if not original or original[0] in "|>&*!{[" or end > index + 1 and any(
+        _is_content(line) for line in lines[index + 1:end]
+    ):
+        return None
+    lines[index] = (
+        lines[index][:match.start("value")] + _scalar(value, original) + (match.group("comment") or "")
+    )
+    return "\n".join(lines)
+
+
+def apply_patch(text: str, set_values: Optional[dict] = None, unset: Optional[list] = None) -> str:
+    """Returns ``text`` with dotted keys set and removed.
+
+    Args:
+        text (str): YAML document, a mapping.
+        set_values (dict): Dotted key to new value, e.g. {"image.tag": "1.21.6"}.
+        unset (list): Dotted keys to remove.
+
+    Returns:
+        str: The patched document; ``text`` itself if nothing changes.
+    """
+    try:
+        data = yaml.safe_load(text) or {}
+    except yaml.YAMLError as e:
+        raise BatchCommitError(f"Invalid YAML: {e}") from e
+    if not isinstance(data, dict):
+        raise BatchCommitError("Document is not a mapping")
+    expected = copy.deepcopy(data)
+    for dotted, value in (set_values or {}).items():
+        _set(expected, _keys(dotted), value)
+    for dotted in unset or ():
+        _unset(expected, _keys(dotted))
+    if expected == data:
+        return text
+    if not unset:
+        edited = text
+        for dotted, value in set_values.items():
+            edited = _replace_scalar(edited, _keys(dotted), value)
+            if edited is None:
+                break
+        if edited is not None and yaml.safe_load(edited) == expected:
+            return edited
+    return yaml.safe_dump(expected, sort_keys=False, default_flow_style=False)
+
+
+class GitHubDataBackend:
+    """Reads through GraphQL and writes through the GitHub Git Data API."""
+
+    def __init__(self, token: Optional[str], api_url: str = DEFAULT_API_URL, graphql_batch: int = DEFAULT_GRAPHQL_BATCH):
+        self.api_url = api_url.rstrip("/")
+        self.graphql_batch = graphql_batch
+        self._session = requests.Session()
+        self._session.headers["Accept"] = "application/vnd.github+json"
+        if token:
+            self._session.headers["Authorization"] = f"Bearer {token}"
+
+    @property
+    def graphql_url(self) -> str:
+        # GitHub Enterprise serves REST at /api/v3 and GraphQL at /api/graphql.
+        if self.api_url.endswith("/api/v3"):
+            return self.api_url[: -len("/v3")] + "/graphql"
+        return self.api_url + "/graphql"
+
+    def _request(self, method: str, path: str, **kwargs) -> dict:
+        response = self._session.request(method, self.api_url + path, timeout=REQUEST_TIMEOUT_SECONDS, **kwargs)
+        if response.status_code >= 400:
+            raise BatchCommitError(f"{method} {path} failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    def resolve(self, owner: str, repo: str, base: str) -> tuple:
+        """Returns the base branch name and its head commit SHA."""
+        if not base:
+            base = self._request("GET", f"/repos/{owner}/{repo}")["default_branch"]
+        ref = self._request("GET", f"/repos/{owner}/{repo}/git/ref/heads/{base}")
+        return base, ref["object"]["sha"]
+
+    def read_files(self, owner: str, repo: str, sha: str, paths: list) -> dict:
+        """Returns path to text for the files that exist at ``sha``."""
+        files = {}
+        for start in range(0, len(paths), self.graphql_batch):
+            chunk = paths[start:start + self.graphql_batch]
+            declarations = "".join(f", $e{index}: String!" for index in range(len(chunk)))
+            fields = " ".join(
+                f"f{index}: object(expression: $e{index}) {{ ... on Blob {{ text isBinary }} }}"
+                for index in range(len(chunk))
+            )
+            query = f"query($owner: String!, $name: String!{declarations}) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+            variables = {"owner": owner, "name": repo}
+            variables.update({f"e{index}": f"{sha}:{path}" for index, path in enumerate(chunk)})
+            response = self._session.post(
+                self.graphql_url, json={"query": query, "variables": variables}, timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            if response.status_code >= 400:
+                raise BatchCommitError(f"GraphQL read failed with {response.status_code}: {response.text[:200]}")
+            body = response.json()
+            if body.get("errors") or not (body.get("data") or {}).get("repository"):
+                raise BatchCommitError(f"GraphQL read failed: {body.get('errors')}")
+            repository = body["data"]["repository"]
+            for index, path in enumerate(chunk):
+                blob = repository.get(f"f{index}")
+                if blob is not None and not blob.get("isBinary") and blob.get("text") is not None:
+                    files[path] = blob["text"]
+        return files
+
+    def commit(self, owner: str, repo: str, base_sha: str, files: dict, message: str, branch: str) -> str:
+        """Writes ``files`` on top of ``base_sha`` as one commit on a new branch."""
+        base_commit = self._request("GET", f"/repos/{owner}/{repo}/git/commits/{base_sha}")
+        tree = self._request(
+            "POST",
+            f"/repos/{owner}/{repo}/git/trees",
+            json={
+                "base_tree": base_commit["tree"]["sha"],
+                "tree": [
+                    {"path": path, "mode": "100644", "type": "blob", "content": text}
+                    for path, text in files.items()
+                ],
+            },
+        )
+        commit = self._request(
+            "POST",
+            f"/repos/{owner}/{repo}/git/commits",
+            json={"message": message, "tree": tree["sha"], "parents": [base_sha]},
+        )
+        self._request("POST", f"/repos/{owner}/{repo}/git/refs", json={"ref": f"refs/heads/{branch}", "sha": commit["sha"]})
+        return commit["sha"]
+
+    def open_pull_request(self, owner: str, repo: str, branch: str, base: str, title: str, body: str) -> dict:
+        pull = self._request(
+            "POST",
+            f"/repos/{owner}/{repo}/pulls",
+            json={"title": title, "head": branch, "base": base, "body": body},
+        )
+        return {"number": pull["number"], "url": pull["html_url"]}
+
+
+class LocalGitBackend:
+    """Commits to a local repository with git plumbing; owner and repo are ignored."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _git(self, *args: str, input: Optional[str] = None, env: Optional[dict] = None) -> str:
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                cwd=self.path,
+                input=input,
+                capture_output=True,
+                text=True,
+                check=True,
+                env=dict(os.environ, **(env or {})),
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise BatchCommitError(f"git {args[0]} failed: {getattr(e, 'stderr', '') or e}") from e
+        return result.stdout
+
+    def resolve(self, owner: str, repo: str, base: str) -> tuple:
+        if not base:
+            base = self._git("symbolic-ref", "--short", "HEAD").strip()
+        return base, self._git("rev-parse", f"refs/heads/{base}^{{commit}}").strip()
+
+    def read_files(self, owner: str, repo: str, sha: str, paths: list) -> dict:
+        existing = set(self._git("ls-tree", "-r", "--name-only", sha, "--", *paths).splitlines())
+        return {path: self._git("show", f"{sha}:{path}") for path in paths if path in existing}
+
+    def commit(self, owner: str, repo: str, base_sha: str, files: dict, message: str, branch: str) -> str:
+        if self._git("for-each-ref", f"refs/heads/{branch}").strip():
+            raise BatchCommitError(f"Branch {branch} already exists")
+        with tempfile.TemporaryDirectory() as scratch:
+            # A private index leaves the work tree and the real index alone.
+            env = {"GIT_INDEX_FILE": os.path.join(scratch, "index")}
+            self._git("read-tree", base_sha, env=env)
+            for path, text in files.items():
+                blob = self._git("hash-object", "-w", "--stdin", input=text).strip()
+                self._git("update-index", "--add", "--cacheinfo", f"100644,{blob},{path}", env=env)
+            tree = self._git("write-tree", env=env).strip()
+        sha = self._git("commit-tree", tree, "-p", base_sha, "-m", message).strip()
+        self._git("update-ref", f"refs/heads/{branch}", sha, "0" * 40)
+        return sha
+
+    def open_pull_request(self, owner: str, repo: str, branch: str, base: str, title: str, body: str) -> Optional[dict]:
+        return None
+
+
+def get_commit_backend():
+    """Returns the backend selected by GITOPS_COMMIT_BACKEND ("github" or "local")."""
+    if os.getenv("GITOPS_COMMIT_BACKEND", "github").lower() == "local":
+        path = os.getenv("GITOPS_LOCAL_REPO_PATH")
+        if not path:
+            raise BatchCommitError("GITOPS_LOCAL_REPO_PATH must be set for the local commit backend")
+        return LocalGitBackend(path)
+    return GitHubDataBackend(
+        token=os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN"),
+        api_url=os.getenv("GITHUB_API_URL", DEFAULT_API_URL),
+        graphql_batch=int(os.getenv("GITHUB_GRAPHQL_BATCH", DEFAULT_GRAPHQL_BATCH)),
+    )
+
+
+def _patch_all(edits: list, files: dict) -> tuple:
+    changed, unchanged, errors = {}, [], []
+    for edit in edits:
+        path = edit["path"]
+        text = changed.get(path, files.get(path))
+        if text is None and edit.get("create"):
+            text = ""
+        if text is None:
+            errors.append({"path": path, "error": "File not found on the base branch"})
+            continue
+        try:
+            patched = apply_patch(text, edit.get("set"), edit.get("unset"))
+        except BatchCommitError as e:
+            errors.append({"path": path, "error": str(e)})
+            continue
+        if patched != files.get(path):
+            changed[path] = patched
+        elif path not in changed:
+            unchanged.append(path)
+    return changed, unchanged, errors
+
+
+def check_edits(edits: list) -> Optional[str]:
+    """Returns why a batch of edits is invalid, or None."""
+    if not edits:
+        return "No edits given."
+    if not isinstance(edits, list):
+        return "Edits must be a list of objects."
+    for number, edit in enumerate(edits, 1):
+        if not isinstance(edit, dict):
+            return f"Edit {number} must be an object with a path, got {type(edit).__name__}."
+        if not isinstance(edit.get("path"), str) or not edit["path"]:
+            return f"Edit {number} needs a path string."
+        if not isinstance(edit.get("set") or {}, dict):
+            return f"Edit {number}: set must map dotted keys to values."
+        if not isinstance(edit.get("unset") or [], list):
+            return f"Edit {number}: unset must be a list of dotted keys."
+    max_files = int(os.getenv("GITOPS_BATCH_MAX_FILES", DEFAULT_MAX_FILES))
+    paths = set(edit["path"] for edit in edits)
+    if len(paths) > max_files:
+        return f"At most {max_files} files per batch, got {len(paths)}."
+    return None
+
+
+def prepare_batch(backend, owner: str, repo: str, edits: list, base: str = "") -> dict:
+    """Reads the files of a batch at the head of ``base`` and patches them in memory.
+
+    Returns:
+        dict: base, base_sha, changed (path to new text), unchanged paths and
+        per-file errors.
+    """
+    base, base_sha = backend.resolve(owner, repo, base)
+    paths = list(dict.fromkeys(edit["path"] for edit in edits))
+    files = backend.read_files(owner, repo, base_sha, paths)
+    changed, unchanged, errors = _patch_all(edits, files)
+    return {"base": base, "base_sha": base_sha, "changed": changed, "unchanged": unchanged, "errors": errors}
+
+
+def write_batch(
+    backend,
+    owner: str,
+    repo: str,
+    prepared: dict,
+    branch: str,
+    message: str,
+    pull_request_title: str = "",
+    pull_request_body: str = "",
+) -> dict:
+    """Commits a prepared batch on a new branch and opens its pull request.
+
+    If the pull request cannot be opened, the status is "partial": the branch
+    and commit exist, and the error is in ``error_message``.
+    """
+    changed = prepared["changed"]
+    sha = backend.commit(owner, repo, prepared["base_sha"], changed, message, branch)
+    if isinstance(backend, GitHubDataBackend):
+        get_github_cache().invalidate("push_files", {"owner": owner, "repo": repo})
+    result = {
+        "status": "success",
+        "branch": branch,
+        "base": prepared["base"],
+        "commit": sha,
+        "changed": sorted(changed),
+        "unchanged": prepared["unchanged"],
+    }
+    try:
+        pull_request = backend.open_pull_request(
+            owner, repo, branch, prepared["base"], pull_request_title or message.splitlines()[0], pull_request_body
+        )
+    except Exception as e:
+        # The commit is pushed either way; losing its branch and SHA would
+        # make a retry fail on the existing branch.
+        result.update(
+            status="partial",
+            error_message=f"Committed {sha[:12]} to {branch}, but the pull request could not be opened: {e}",
+        )
+        return result
+    if pull_request is not None:
+        result["pull_request"] = pull_request
+    return result
+
+
+def apply_edits(
+    owner: str,
+    repo: str,
+    branch: str,
+    message: str,
+    edits: list,
+    base: str = "",
+    pull_request_title: str = "",
+    pull_request_body: str = "",
+    backend=None,
+) -> dict:
+    """Synchronous body of ``commit_values_changes``; ``backend`` defaults to ``get_commit_backend()``."""
+    invalid = check_edits(edits)
+    if invalid is not None:
+        return {"status": "error", "error_message": invalid}
+    try:
+        backend = backend or get_commit_backend()
+        prepared = prepare_batch(backend, owner, repo, edits, base)
+        if prepared["errors"]:
+            return {
+                "status": "error",
+                "error_message": f"{len(prepared['errors'])} edit(s) could not be applied; nothing was committed.",
+                "errors": prepared["errors"],
+            }
+        if not prepared["changed"]:
+            return {
+                "status": "success",
+                "message": "Every file already has the requested values.",
+                "unchanged": prepared["unchanged"],
+            }
+        return write_batch(backend, owner, repo, prepared, branch, message, pull_request_title, pull_request_body)
+    except (BatchCommitError, requests.exceptions.RequestException) as e:
+        return {"status": "error", "error_message": str(e)}
+
+
+async def commit_values_changes(
+    owner: str,
+    repo: str,
+    branch: str,
+    message: str,
+    edits: list[dict],
+    base: str = "",
+    pull_request_title: str = "",
+    pull_request_body: str = "",
+) -> dict:
+    """Applies YAML patches to many values files as one commit and one pull request.
+
+    Use this instead of repeated create_or_update_file calls whenever a change
+    touches more than one file, e.g. bumping an image tag across the fleet.
+
+    Args:
+        owner (str): Repository owner.
+        repo (str): Repository name.
+        branch (str): New branch to create for the commit, e.g. "bump-nginx-1.21.6".
+        message (str): Commit message.
+        edits (list[dict]): One entry per file: {"path": "teams/<team>/<env>/<region>/<cluster>/values.yaml",
+            "set": {"image.tag": "1.21.6", "replicaCount": 3}, "unset": ["some.key"]}.
+            Keys are dotted paths into the YAML document. Add "create": true to create
+            a file that does not exist yet.
+        base (str): Branch to start from; the repository's default branch if empty.
+        pull_request_title (str): Title of the pull request; the first line of the message if empty.
+        pull_request_body (str): Description of the pull request.
+
+    Returns:
+        dict: status, the commit SHA, the changed and unchanged paths and the
+        pull request number and URL. Nothing is committed if any edit fails.
+        status "partial" means the branch was committed but the pull request
+        could not be opened; open it for the branch rather than committing again.
+    """
+    return await asyncio.to_thread(
+        apply_edits, owner, repo, branch, message, edits, base, pull_request_title, pull_request_body
+    )
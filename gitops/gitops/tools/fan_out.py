@@ -0,0 +1,305 @@
+"""Runs a declarative change plan across many teams in one tool call.
+
+"Update all teams to nginx:1.21.6" or "Onboard ai-ml-team for dev, staging,
+prod" otherwise take a read, a patch, a branch, a write and a pull request per
+team, each a model turn. ``run_change_plan`` takes the whole change at once:
+
+    changes = [
+        {"team": "*", "environment": "prod", "image": "nginx", "below_tag": "1.21.6",
+         "set": {"image.tag": "1.21.6"}},
+        {"team": "ai-ml-team", "environment": ["dev", "staging", "prod"],
+         "region": "us-west", "cluster": "cluster1", "create": true,
+         "set": {"image.repository": "jupyterhub/k8s-hub", "image.tag": "3.0.0"}},
+    ]
+
+Each change selects values files by team, environment, region and cluster
+(a name, a list of names, or "*" for any) plus optional image filters, through
+the GitOps mirror; changes naming every location explicitly work without it.
+The selected edits are grouped by ``group_by`` (one branch and one pull
+request per team by default) and the groups run concurrently, at most
+GITOPS_FANOUT_CONCURRENCY at a time. Reads run in parallel; the writes to a
+repository are made one after another, as GitHub asks of content-creating
+requests.
+
+``stream_plan`` yields progress events as groups are prepared and committed;
+the tool logs them and returns them with the per-group results.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import re
+import subprocess
+import weakref
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Optional
+
+import requests
+
+from .batch_commit import BatchCommitError, check_edits, get_commit_backend, prepare_batch, write_batch
+from .repo_mirror import DEFAULT_TEAMS_DIR, get_repo_mirror, location_names, select_entries
+
+DEFAULT_CONCURRENCY = 4
+LOCATION_FIELDS = ("team", "environment", "region", "cluster")
+GROUP_BY = LOCATION_FIELDS + ("all",)
+
+logger = logging.getLogger(__name__)
+
+_plan_ids = itertools.count(1)
+# Per event loop, so a lock is never awaited from a loop it does not belong to.
+_repo_locks = weakref.WeakKeyDictionary()
+
+
+class PlanError(Exception):
+    """A change plan is invalid or cannot be expanded into edits."""
+
+
+def _repo_lock(owner: str, repo: str) -> asyncio.Lock:
+    locks = _repo_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get((owner, repo))
+    if lock is None:
+        lock = locks[(owner, repo)] = asyncio.Lock()
+    return lock
+
+
+def _explicit_paths(change: dict, teams_dir: str) -> Optional[list]:
+    names = [location_names(change.get(field)) for field in LOCATION_FIELDS]
+    if not all(names):
+        return None
+    return [
+        f"{teams_dir}/{team}/{environment}/{region}/{cluster}/values.yaml"
+        for team, environment, region, cluster in itertools.product(*names)
+    ]
+
+
+def expand_changes(changes: list, entries: Optional[list], teams_dir: str = DEFAULT_TEAMS_DIR) -> list:
+    """Turns plan changes into batch edits, one per selected values file.
+
+    Args:
+        changes (list): Plan changes, see the module docstring.
+        entries (list): Mirror index entries, or None without a mirror.
+        teams_dir (str): Directory holding the team trees.
+
+    Returns:
+        list: Edits for ``prepare_batch``, in plan order.
+    """
+    if not isinstance(changes, list):
+        raise PlanError("changes must be a list of objects")
+    edits = []
+    for number, change in enumerate(changes, 1):
+        if not isinstance(change, dict):
+            raise PlanError(f"Change {number} must be an object, got {type(change).__name__}")
+        if not change.get("set") and not change.get("unset"):
+            raise PlanError(f"Change {number} sets and unsets nothing")
+        explicit = _explicit_paths(change, teams_dir)
+        if change.get("create"):
+            if explicit is None:
+                raise PlanError(f"Change {number} creates files, so it must name every team, environment, region and cluster")
+            paths = explicit
+        elif entries is not None:
+            selected = select_entries(
+                entries,
+                change.get("image", ""),
+                change.get("below_tag", ""),
+                **{field: change.get(field) for field in LOCATION_FIELDS},
+            )
+            paths = [entry["path"] for entry in selected]
+        elif explicit is not None and not change.get("image") and not change.get("below_tag"):
+            paths = explicit
+        else:
+            raise PlanError(f"Change {number} uses wildcards or image filters, which need the GitOps mirror (GITOPS_REPO_URL)")
+        for path in paths:
+            edits.append({
+                "path": path,
+                "set": change.get("set") or {},
+                "unset": change.get("unset") or [],
+                "create": bool(change.get("create")),
+            })
+    return edits
+
+
+def group_edits(edits: list, group_by: str, teams_dir: str = DEFAULT_TEAMS_DIR) -> OrderedDict:
+    """Splits edits into the batches that each get a branch and a pull request."""
+    if group_by not in GROUP_BY:
+        raise PlanError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    groups = OrderedDict()
+    for edit in edits:
+        if group_by == "all":
+            key = "all"
+        else:
+            parts = edit["path"].split("/")
+            key = parts[1 + LOCATION_FIELDS.index(group_by)] if parts[0] == teams_dir and len(parts) == 6 else "other"
+        groups.setdefault(key, []).append(edit)
+    return groups
+
+
+def _branch_name(branch: str, group: str, group_by: str) -> str:
+    if group_by == "all":
+        return branch
+    return f"{branch}-{re.sub(r'[^A-Za-z0-9._-]+', '-', group)}"
+
+
+async def _run_group(plan: dict, group: str, edits: list, semaphore: asyncio.Semaphore, emit: Callable) -> dict:
+    owner, repo = plan["owner"], plan["repo"]
+    branch = _branch_name(plan["branch"], group, plan["group_by"])
+    async with semaphore:
+        try:
+            # A backend per group: the HTTP session is not shared across threads.
+            backend = get_commit_backend()
+            prepared = await asyncio.to_thread(prepare_batch, backend, owner, repo, edits, plan.get("base", ""))
+            if prepared["errors"]:
+                result = {
+                    "status": "error",
+                    "error_message": f"{len(prepared['errors'])} edit(s) could not be applied; nothing was committed.",
+                    "errors": prepared["errors"],
+                }
+            elif not prepared["changed"]:
+                result = {"status": "success", "message": "Already up to date.", "unchanged": prepared["unchanged"]}
+            else:
+                await emit({"event": "prepared", "group": group, "changed": len(prepared["changed"])})
+                title, _, rest = plan["message"].partition("\n")
+                if plan["group_by"] != "all":
+                    title = f"{title} ({group})"
+                message = title + ("\n" + rest if rest else "")
+                async with _repo_lock(owner, repo):
+                    result = await asyncio.to_thread(
+                        write_batch, backend, owner, repo, prepared, branch, message,
+                        "", plan.get("pull_request_body", ""),
+                    )
+        except (BatchCommitError, requests.exceptions.RequestException) as e:
+            result = {"status": "error", "error_message": str(e)}
+        except Exception as e:
+            # One group's failure must not hide what the other groups committed.
+            logger.exception("Change plan group %s failed", group)
+            result = {"status": "error", "error_message": f"{type(e).__name__}: {e}"}
+    result["group"] = group
+    if "commit" in result:
+        await emit({"event": "committed", "group": group, "branch": branch, "pull_request": result.get("pull_request")})
+    elif result["status"] == "success":
+        await emit({"event": "unchanged", "group": group})
+    if result["status"] != "success":
+        await emit({"event": "failed", "group": group, "error": result["error_message"]})
+    return result
+
+
+async def execute_plan(plan: dict, progress: Optional[Callable] = None) -> dict:
+    """Runs a change plan and returns the result of every group.
+
+    Args:
+        plan (dict): owner, repo, branch, message and changes, plus optional
+            group_by, base and pull_request_body; see ``run_change_plan``.
+        progress (Callable): Async callable receiving each progress event.
+    """
+    plan_id = next(_plan_ids)
+
+    async def emit(event: dict) -> None:
+        event = dict(event, plan=plan_id)
+        logger.info("Change plan %s: %s", plan_id, event)
+        if progress is not None:
+            await progress(event)
+
+    plan = dict(plan, group_by=plan.get("group_by") or "team")
+    mirror = get_repo_mirror()
+    teams_dir = mirror.teams_dir if mirror is not None else os.getenv("GITOPS_TEAMS_DIR", DEFAULT_TEAMS_DIR)
+    entries = None
+    if mirror is not None:
+        try:
+            entries = await asyncio.to_thread(mirror.entries)
+        except (OSError, subprocess.SubprocessError) as e:
+            return {"status": "error", "error_message": f"Could not sync the GitOps mirror: {e}"}
+    try:
+        edits = expand_changes(plan.get("changes") or [], entries, teams_dir)
+        groups = group_edits(edits, plan["group_by"], teams_dir)
+        for batch in groups.values():
+            invalid = check_edits(batch)
+            if invalid is not None:
+                raise PlanError(invalid)
+    except PlanError as e:
+        return {"status": "error", "error_message": str(e)}
+    if not groups:
+        return {"status": "error", "error_message": "The plan selects no values files."}
+    await emit({"event": "planned", "groups": len(groups), "files": len(edits)})
+    semaphore = asyncio.Semaphore(int(os.getenv("GITOPS_FANOUT_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    results = await asyncio.gather(
+        *(_run_group(plan, group, batch, semaphore, emit) for group, batch in groups.items())
+    )
+    failed = [result for result in results if result["status"] != "success"]
+    # A group whose pull request failed still committed, so the plan is partial.
+    nothing_done = len(failed) == len(results) and not any("commit" in result for result in failed)
+    await emit({"event": "done", "failed": len(failed)})
+    return {
+        "status": "success" if not failed else ("error" if nothing_done else "partial"),
+        "plan": plan_id,
+        "files": len(edits),
+        "groups": results,
+    }
+
+
+async def stream_plan(plan: dict) -> AsyncIterator[dict]:
+    """Runs a change plan, yielding progress events and finally ``{"event": "result", ...}``."""
+    queue = asyncio.Queue()
+    task = asyncio.ensure_future(execute_plan(plan, queue.put))
+    while not task.done() or not queue.empty():
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+        if getter.done():
+            yield getter.result()
+        else:
+            getter.cancel()
+    yield {"event": "result", "result": task.result()}
+
+
+async def run_change_plan(
+    owner: str,
+    repo: str,
+    branch: str,
+    message: str,
+    changes: list[dict],
+    group_by: str = "team",
+    base: str = "",
+    pull_request_body: str = "",
+) -> dict:
+    """Applies one declarative change across many teams, environments, regions and clusters.
+
+    Use this for multi-team work such as fleet-wide image updates or onboarding
+    a team into several environments, instead of reading and writing files one
+    by one. Edits are committed in one branch and pull request per group.
+
+    Args:
+        owner (str): Repository owner.
+        repo (str): Repository name.
+        branch (str): Branch name; each group's branch gets "-<group>" appended unless group_by is "all".
+        message (str): Commit message and pull request title.
+        changes (list[dict]): Each change selects values files with "team", "environment",
+            "region" and "cluster" (a name, a list of names, or "*" for any) and optionally
+            "image" and "below_tag", then applies "set" ({"image.tag": "1.21.6"}) and "unset"
+            (["some.key"]). With "create": true the files are created if missing; every
+            location must then be named explicitly.
+        group_by (str): "team", "environment", "region", "cluster" or "all" for a single pull request.
+        base (str): Branch to start from; the repository's default branch if empty.
+        pull_request_body (str): Description for the pull requests.
+
+    Returns:
+        dict: status ("success", "partial" or "error"), the number of files and,
+        per group, the branch, commit, changed files and pull request, plus the
+        progress events in order.
+    """
+    plan = {
+        "owner": owner,
+        "repo": repo,
+        "branch": branch,
+        "message": message,
+        "changes": changes,
+        "group_by": group_by,
+        "base": base,
+        "pull_request_body": pull_request_body,
+    }
+    events = []
+    result = None
+    async for event in stream_plan(plan):
+        if event["event"] == "result":
+            result = event["result"]
+        else:
+            events.append(event)
+    result["events"] = events
+    return result
@@ -0,0 +1,61 @@
+"""Fleet-wide queries answered from the local GitOps mirror."""
+import asyncio
+import subprocess
+
+from .repo_mirror import get_repo_mirror, select_entries
+
+MAX_RESULTS = 200
+
+
+async def find_workloads(
+    image: str = "",
+    below_tag: str = "",
+    team: str = "",
+    environment: str = "",
+    region: str = "",
+    cluster: str = "",
+) -> dict:
+    """Finds cluster values files in the GitOps repo by image, tag, team or location.
+
+    Answers fleet-wide questions such as "which clusters run nginx below
+    1.21.0" from a local, regularly refreshed mirror of the repository, much
+    faster than searching GitHub. Every filter is optional.
+
+    Args:
+        image (str): Image repository, e.g. "nginx".
+        below_tag (str): Only workloads whose image tag is an older version than this, e.g. "1.21.0".
+        team (str): Team name, e.g. "data-pipeline-team".
+        environment (str): Environment, e.g. "dev" or "prod".
+        region (str): Region, e.g. "us-west".
+        cluster (str): Cluster name, e.g. "cluster1".
+
+    Returns:
+        dict: status, the commit the answer is based on, and the matching
+        workloads with path, team, environment, region, cluster, image
+        repository and tag, replicas, resources and ingress hosts.
+    """
+    mirror = get_repo_mirror()
+    if mirror is None:
+        return {
+            "status": "error",
+            "error_message": "The GitOps mirror is not configured. Set GITOPS_REPO_URL, or use search_code instead.",
+        }
+    try:
+        entries = await asyncio.to_thread(mirror.entries)
+    except (OSError, subprocess.SubprocessError) as e:
+        return {"status": "error", "error_message": f"Could not sync the GitOps mirror: {e}"}
+    matches = select_entries(
+        entries, image, below_tag, team=team, environment=environment, region=region, cluster=cluster
+    )
+    result = {
+        "status": "success",
+        "commit": mirror.commit,
+        "count": len(matches),
+        "workloads": matches[:MAX_RESULTS],
+    }
+    if len(matches) > MAX_RESULTS:
+        result["truncated"] = True
+    invalid = [entry for entry in entries if "error" in entry]
+    if invalid:
+        result["invalid_files"] = invalid
+    return result
@@ -0,0 +1,262 @@
+"""Read-through cache for the read-only GitHub MCP tools.
+
+The agent reads the same values.yaml, Chart.yaml and directory listings many
+times per conversation, and every read is a round trip to the GitHub MCP
+server. ``CachedGitHubTool`` answers repeated ``get_file_contents`` and
+``get_directory_contents`` calls from memory, keyed by repo, path and the
+commit SHA the requested ref points at:
+
+* a ref that is already a full commit SHA is immutable and cached as is;
+* a branch, tag or the default branch is resolved to its head SHA through
+  the GitHub REST API, revalidated with ``If-None-Match`` at most every
+  GITHUB_REF_TTL_SECONDS. A 304 does not count against the rate limit, and
+  when the branch moves the key changes with it. The SHA is also passed to
+  the MCP call, so a branch that moves in between cannot put newer content
+  under the older key;
+* if the ref cannot be resolved, or the tool takes no commit SHA argument,
+  the entry is keyed by the ref name and kept for GITHUB_READ_TTL_SECONDS
+  only.
+
+``search_code`` results are kept for GITHUB_SEARCH_TTL_SECONDS. Write tools
+(``create_or_update_file``, ``create_branch``, ``merge_pull_request``, ...)
+drop the resolved refs and time-keyed entries of the repo they touch, so the
+next read sees the new commit. Entries keyed by SHA stay valid.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import requests
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+
+from .. import telemetry
+
+DEFAULT_API_URL = "https://api.github.com"
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_REF_TTL_SECONDS = 10.0
+DEFAULT_READ_TTL_SECONDS = 30.0
+DEFAULT_SEARCH_TTL_SECONDS = 60.0
+REF_TIMEOUT_SECONDS = 5.0
+
+# Tools whose result only depends on repo, ref and path.
+CONTENT_TOOLS = ("get_file_contents", "get_directory_contents", "get_file", "list_files")
+SEARCH_TOOLS = ("search_code",)
+# Content tools that take a commit SHA argument, used to pin a resolved ref.
+SHA_ARGUMENTS = {"get_file_contents": "sha"}
+WRITE_TOOLS = (
+    "create_or_update_file",
+    "delete_file",
+    "push_files",
+    "create_branch",
+    "merge_pull_request",
+    "update_pull_request_branch",
+)
+
+_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _args_key(args: dict, *skip: str) -> tuple:
+    return tuple(sorted((name, repr(value)) for name, value in args.items() if name not in skip))
+
+
+def _is_error(result: Any) -> bool:
+    if isinstance(result, dict):
+        return bool(result.get("isError")) or result.get("status") == "error"
+    return bool(getattr(result, "isError", False))
+
+
+class GitHubReadCache:
+    """LRU of GitHub read results plus the ref-to-SHA resolutions they are keyed by."""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        api_url: str = DEFAULT_API_URL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ref_ttl_seconds: float = DEFAULT_REF_TTL_SECONDS,
+        read_ttl_seconds: float = DEFAULT_READ_TTL_SECONDS,
+        search_ttl_seconds: float = DEFAULT_SEARCH_TTL_SECONDS,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.max_entries = max_entries
+        self.ref_ttl_seconds = ref_ttl_seconds
+        self.read_ttl_seconds = read_ttl_seconds
+        self.search_ttl_seconds = search_ttl_seconds
+        self._token = token
+        self._session = requests.Session()
+        # key -> (result, expires_at or None for SHA-keyed entries)
+        self._entries = OrderedDict()
+        # (owner, repo, ref) -> (sha, etag, checked_at)
+        self._refs = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "ref_checks": 0, "ref_not_modified": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls) -> "GitHubReadCache":
+        """Builds a cache configured from GITHUB_* environment variables."""
+        return cls(
+            token=os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN"),
+            api_url=os.getenv("GITHUB_API_URL", DEFAULT_API_URL),
+            max_entries=int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ref_ttl_seconds=float(os.getenv("GITHUB_REF_TTL_SECONDS", DEFAULT_REF_TTL_SECONDS)),
+            read_ttl_seconds=float(os.getenv("GITHUB_READ_TTL_SECONDS", DEFAULT_READ_TTL_SECONDS)),
+            search_ttl_seconds=float(os.getenv("GITHUB_SEARCH_TTL_SECONDS", DEFAULT_SEARCH_TTL_SECONDS)),
+        )
+
+    async def key_for(self, tool: str, args: dict) -> tuple:
+        """Returns the cache key, its TTL (None for immutable entries) and the call's args.
+
+        A ref resolved to a SHA is pinned in the returned args, so the
+        content fetched is the one the key names even if the branch moves.
+        """
+        if tool in SEARCH_TOOLS:
+            return (tool, _args_key(args)), self.search_ttl_seconds, args
+        owner, repo = args.get("owner"), args.get("repo")
+        ref = args.get("sha") or args.get("ref") or args.get("branch") or ""
+        rest = _args_key(args, "sha", "ref", "branch")
+        if _SHA.match(ref):
+            return (tool, owner, repo, ref, rest), None, args
+        sha_argument = SHA_ARGUMENTS.get(tool)
+        sha = await asyncio.to_thread(self.resolve_ref, owner, repo, ref) if sha_argument else None
+        if sha is not None:
+            pinned = {name: value for name, value in args.items() if name not in ("sha", "ref", "branch")}
+            pinned[sha_argument] = sha
+            return (tool, owner, repo, sha, rest), None, pinned
+        return (tool, owner, repo, "ref:" + ref, rest), self.read_ttl_seconds, args
+
+    def get(self, key: tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                result = entry[0]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self._counters["misses"] += 1
+                result = None
+        telemetry.count("cache.lookups", cache="github", result="miss" if result is None else "hit")
+        return result
+
+    def put(self, key: tuple, result: Any, ttl_seconds: Optional[float]) -> None:
+        expires_at = None if ttl_seconds is None else time.monotonic() + ttl_seconds
+        with self._lock:
+            self._entries[key] = (result, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve_ref(self, owner: Optional[str], repo: Optional[str], ref: str) -> Optional[str]:
+        """Returns the commit SHA a ref points at, "" meaning the default branch.
+
+        A resolution younger than ``ref_ttl_seconds`` is reused; older ones
+        are revalidated with their ETag. Returns None if the API cannot be
+        reached or does not know the ref; that answer is kept for
+        ``ref_ttl_seconds`` too.
+        """
+        if not owner or not repo:
+            return None
+        ref_key = (owner, repo, ref)
+        with self._lock:
+            known = self._refs.get(ref_key)
+        if known is not None and time.monotonic() - known[2] < self.ref_ttl_seconds:
+            return known[0]
+        headers = {"Accept": "application/vnd.github.sha"}
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+        if known is not None and known[1]:
+            headers["If-None-Match"] = known[1]
+        try:
+            response = self._session.get(
+                f"{self.api_url}/repos/{owner}/{repo}/commits/{ref or 'HEAD'}",
+                headers=headers,
+                timeout=REF_TIMEOUT_SECONDS,
+            )
+        except requests.exceptions.RequestException:
+            response = None
+        with self._lock:
+            self._counters["ref_checks"] += 1
+            if response is None:
+                # Remembered so an unreachable API is not retried on every read.
+                self._refs[ref_key] = (None, None, time.monotonic())
+                return None
+            if response.status_code == 304 and known is not None and known[0]:
+                self._counters["ref_not_modified"] += 1
+                self._refs[ref_key] = (known[0], known[1], time.monotonic())
+                return known[0]
+            sha = response.text.strip() if response.status_code == 200 else ""
+            if not _SHA.match(sha):
+                self._refs[ref_key] = (None, None, time.monotonic())
+                return None
+            self._refs[ref_key] = (sha, response.headers.get("ETag"), time.monotonic())
+            return sha
+
+    def invalidate(self, tool: str, args: dict) -> None:
+        """Forgets what a write tool may have changed in its repo."""
+        owner, repo = args.get("owner"), args.get("repo")
+        with self._lock:
+            self._counters["invalidations"] += 1
+            for ref_key in [key for key in self._refs if key[:2] == (owner, repo)]:
+                del self._refs[ref_key]
+            # SHA-keyed entries cannot change; drop the ref-keyed and search ones.
+            stale = [
+                key
+                for key, (_, expires_at) in self._entries.items()
+                if expires_at is not None and (key[0] in SEARCH_TOOLS or key[1:3] == (owner, repo))
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), refs=len(self._refs))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._refs.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_github_cache() -> GitHubReadCache:
+    """Returns the process-wide GitHub read cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GitHubReadCache.from_env()
+        return _cache
+
+
+def github_cache_enabled() -> bool:
+    return os.getenv("GITHUB_CACHE_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+
+class CachedGitHubTool(MCPTool):
+    """GitHub MCP tool that reads through, and writes invalidate, the read cache."""
+
+    async def run_async(self, *, args: dict, tool_context) -> Any:
+        if not github_cache_enabled():
+            return await super().run_async(args=args, tool_context=tool_context)
+        cache = get_github_cache()
+        if self.name in CONTENT_TOOLS or self.name in SEARCH_TOOLS:
+            key, ttl_seconds, call_args = await cache.key_for(self.name, args)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            result = await super().run_async(args=call_args, tool_context=tool_context)
+            if not _is_error(result):
+                cache.put(key, result, ttl_seconds)
+            return result
+        try:
+            return await super().run_async(args=args, tool_context=tool_context)
+        finally:
+            if self.name in WRITE_TOOLS:
+                cache.invalidate(self.name, args)
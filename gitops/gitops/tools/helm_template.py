@@ -0,0 +1,717 @@
+"""In-process renderer for the Go template subset used by Helm charts.
+
+Supports text with ``{{- ... -}}`` trim markers and comments, pipelines,
+``$`` variables, ``if``/``else if``/``else``, ``range`` (with ``else``),
+``with``, ``define``, ``template`` and ``include``, plus the Sprig functions
+charts commonly use (``default``, ``quote``, ``toYaml``, ``nindent``,
+``printf``, ``required``, ...). An unsupported construct or function is a
+``TemplateError`` naming the template and line, like a ``helm template``
+failure, rather than a silently wrong render.
+
+Parsing is separate from rendering so that a chart's templates can be parsed
+once and rendered against many values files:
+
+    templates = parse("deployment.yaml", text)
+    output = Renderer(templates).render("deployment.yaml", {"Values": values, ...})
+"""
+import base64
+import hashlib
+import json
+import re
+from typing import Any, Callable, Optional
+
+import yaml
+
+MAX_INCLUDE_DEPTH = 100
+
+_ACTION = re.compile(r"\{\{(-[ \t\r\n])?(.*?)([ \t\r\n]-)?\}\}", re.S)
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<raw>`[^`]*`)
+      | (?P<char>'(?:[^'\\]|\\.)')
+      | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+      | (?P<declare>:=)
+      | (?P<assign>=)
+      | (?P<field>(?:\.[A-Za-z_][A-Za-z0-9_]*)+)
+      | (?P<dot>\.)
+      | (?P<variable>\$[A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)
+      | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<punct>[()|,])
+    )""",
+    re.X,
+)
+
+
+class TemplateError(Exception):
+    """A template could not be parsed or rendered."""
+
+
+class Struct(dict):
+    """A built-in object such as ``.Chart`` or ``.Release``: unknown fields are errors, as in Go."""
+
+
+# --- Parsing -----------------------------------------------------------------
+
+
+class _Node:
+    __slots__ = ("kind", "line", "args")
+
+    def __init__(self, kind: str, line: int, **args):
+        self.kind = kind
+        self.line = line
+        self.args = args
+
+    def __getattr__(self, name):
+        try:
+            return self.args[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _tokenize(source: str, name: str, line: int) -> list:
+    tokens = []
+    position = 0
+    source = source.rstrip()
+    while position < len(source):
+        match = _TOKEN.match(source, position)
+        if match is None or match.end() == position:
+            raise TemplateError(f"{name}:{line}: unexpected {source[position:].strip()[:20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        # ".Field" right after ")" chains onto the parenthesized value.
+        chained = kind == "field" and match.start(kind) == position and tokens and tokens[-1] == ("punct", ")")
+        tokens.append(("chain" if chained else kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Parses the tokens of one action into a pipeline."""
+
+    def __init__(self, tokens: list, name: str, line: int):
+        self.tokens = tokens
+        self.position = 0
+        self.name = name
+        self.line = line
+
+    def error(self, message: str) -> TemplateError:
+        return TemplateError(f"{self.name}:{self.line}: {message}")
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def done(self) -> bool:
+        return self.position >= len(self.tokens)
+
+    def pipeline(self, allow_declaration: bool = True, allow_two: bool = False) -> dict:
+        variables, mode = [], None
+        if allow_declaration and self.peek()[0] == "variable":
+            # Look ahead for "$x :=", "$x =" or "$k, $v :=".
+            saved = self.position
+            names = [self.take()[1]]
+            if allow_two and self.peek() == ("punct", ","):
+                self.take()
+                kind, value = self.take()
+                if kind != "variable":
+                    raise self.error("expected a variable after ','")
+                names.append(value)
+            if self.peek()[0] in ("declare", "assign"):
+                mode = self.take()[0]
+                variables = names
+            else:
+                self.position = saved
+        commands = [self.command()]
+        while self.peek() == ("punct", "|"):
+            self.take()
+            commands.append(self.command())
+        return {"variables": variables, "mode": mode, "commands": commands}
+
+    def command(self) -> list:
+        operands = []
+        while not self.done() and self.peek() not in (("punct", "|"), ("punct", ")")):
+            operands.append(self.operand())
+        if not operands:
+            raise self.error("missing value for command")
+        return operands
+
+    def operand(self) -> tuple:
+        kind, value = self.take()
+        if kind == "punct" and value == "(":
+            inner = self.pipeline(allow_declaration=False)
+            if self.take() != ("punct", ")"):
+                raise self.error("unclosed '('")
+            term = ("pipeline", inner)
+        elif kind == "string":
+            term = ("literal", json.loads(value))
+        elif kind == "raw":
+            term = ("literal", value[1:-1])
+        elif kind == "char":
+            term = ("literal", ord(json.loads('"' + value[1:-1] + '"')))
+        elif kind == "number":
+            term = ("literal", float(value) if any(c in value for c in ".eE") else int(value))
+        elif kind == "ident":
+            if value in ("true", "false"):
+                term = ("literal", value == "true")
+            elif value == "nil":
+                term = ("literal", None)
+            else:
+                term = ("function", value)
+        elif kind == "dot":
+            term = ("field", ())
+        elif kind == "field":
+            term = ("field", tuple(value[1:].split(".")))
+        elif kind == "variable":
+            name, *fields = value.split(".")
+            term = ("variable", name, tuple(fields))
+        else:
+            raise self.error(f"unexpected {value!r}")
+        while self.peek()[0] == "chain":
+            fields = tuple(self.take()[1][1:].split("."))
+            term = ("chain", term, fields)
+        return term
+
+
+def parse(name: str, text: str) -> dict:
+    """Parses a template file.
+
+    Returns:
+        dict: Template name to node list: ``name`` itself plus every
+        ``define`` in the file.
+    """
+    templates = {}
+    # Stack of (kind, node, body being filled) for the open blocks.
+    root = []
+    stack = [("root", None, root)]
+    position = 0
+    trim_next = False
+    line = 1
+    for match in _ACTION.finditer(text):
+        chunk = text[position:match.start()]
+        if trim_next:
+            chunk = chunk.lstrip()
+        if match.group(1):
+            chunk = chunk.rstrip()
+        if chunk:
+            stack[-1][2].append(_Node("text", line, text=chunk))
+        line += text.count("\n", position, match.start())
+        position = match.end()
+        trim_next = bool(match.group(3))
+        body = match.group(2).strip()
+        action_line = line
+        line += match.group(0).count("\n")
+        if body.startswith("/*"):
+            if not body.endswith("*/"):
+                raise TemplateError(f"{name}:{action_line}: unclosed comment")
+            continue
+        keyword, _, rest = body.partition(" ")
+        rest = rest.strip()
+        if keyword in ("if", "range", "with"):
+            parser = _Parser(_tokenize(rest, name, action_line), name, action_line)
+            pipeline = parser.pipeline(allow_two=keyword == "range")
+            node = _Node(keyword, action_line, branches=[(pipeline, [])], otherwise=None)
+            stack[-1][2].append(node)
+            stack.append((keyword, node, node.branches[0][1]))
+        elif keyword == "else":
+            kind, node, _ = stack[-1]
+            if kind not in ("if", "range", "with") or node.otherwise is not None:
+                raise TemplateError(f"{name}:{action_line}: unexpected else")
+            if rest.startswith("if ") and kind == "if":
+                parser = _Parser(_tokenize(rest[3:], name, action_line), name, action_line)
+                node.branches.append((parser.pipeline(), []))
+                stack[-1] = (kind, node, node.branches[-1][1])
+            elif rest.startswith("with ") and kind == "with":
+                parser = _Parser(_tokenize(rest[5:], name, action_line), name, action_line)
+                node.branches.append((parser.pipeline(), []))
+                stack[-1] = (kind, node, node.branches[-1][1])
+            else:
+                node.args["otherwise"] = []
+                stack[-1] = (kind, node, node.otherwise)
+        elif keyword == "end":
+            if len(stack) == 1:
+                raise TemplateError(f"{name}:{action_line}: unexpected end")
+            kind, node, _ = stack.pop()
+            if kind == "define":
+                templates[node.name] = node.body
+        elif keyword == "define":
+            tokens = _tokenize(rest, name, action_line)
+            if len(tokens) != 1 or tokens[0][0] not in ("string", "raw"):
+                raise TemplateError(f"{name}:{action_line}: define needs a template name")
+            define_name = json.loads(tokens[0][1]) if tokens[0][0] == "string" else tokens[0][1][1:-1]
+            node = _Node("define", action_line, name=define_name, body=[])
+            stack.append(("define", node, node.body))
+        elif keyword in ("template", "block"):
+            tokens = _tokenize(rest, name, action_line)
+            if not tokens or tokens[0][0] not in ("string", "raw"):
+                raise TemplateError(f"{name}:{action_line}: {keyword} needs a template name")
+            call_name = json.loads(tokens[0][1]) if tokens[0][0] == "string" else tokens[0][1][1:-1]
+            parser = _Parser(tokens[1:], name, action_line)
+            pipeline = None if parser.done() else parser.pipeline(allow_declaration=False)
+            node = _Node("template", action_line, name=call_name, pipeline=pipeline)
+            stack[-1][2].append(node)
+            if keyword == "block":
+                define = _Node("define", action_line, name=call_name, body=[])
+                stack.append(("define", define, define.body))
+        elif keyword in ("break", "continue"):
+            stack[-1][2].append(_Node(keyword, action_line))
+        else:
+            parser = _Parser(_tokenize(body, name, action_line), name, action_line)
+            pipeline = parser.pipeline()
+            if not parser.done():
+                raise TemplateError(f"{name}:{action_line}: unexpected {parser.peek()[1]!r}")
+            stack[-1][2].append(_Node("action", action_line, pipeline=pipeline))
+    if len(stack) > 1:
+        raise TemplateError(f"{name}:{stack[-1][1].line}: unclosed {stack[-1][0]}")
+    chunk = text[position:]
+    if trim_next:
+        chunk = chunk.lstrip()
+    if chunk:
+        root.append(_Node("text", line, text=chunk))
+    templates[name] = root
+    return templates
+
+
+def value_paths(templates: dict) -> set:
+    """Returns the ``.Values`` field paths the templates read, e.g. ("image", "tag")."""
+    paths = set()
+
+    def visit_term(term):
+        if term[0] == "field" and term[1][:1] == ("Values",):
+            paths.add(term[1][1:])
+        elif term[0] == "variable" and term[1] == "$" and term[2][:1] == ("Values",):
+            paths.add(term[2][1:])
+        elif term[0] == "pipeline":
+            visit_pipeline(term[1])
+        elif term[0] == "chain":
+            visit_term(term[1])
+
+    def visit_pipeline(pipeline):
+        if pipeline is None:
+            return
+        for command in pipeline["commands"]:
+            for term in command:
+                visit_term(term)
+
+    def visit(nodes):
+        for node in nodes:
+            if node.kind == "action":
+                visit_pipeline(node.pipeline)
+            elif node.kind in ("if", "range", "with"):
+                for pipeline, body in node.branches:
+                    visit_pipeline(pipeline)
+                    visit(body)
+                visit(node.otherwise or [])
+            elif node.kind == "template":
+                visit_pipeline(node.pipeline)
+
+    for nodes in templates.values():
+        visit(nodes)
+    return paths
+
+
+# --- Rendering ---------------------------------------------------------------
+
+
+def truthy(value: Any) -> bool:
+    """Go template truth: false, 0, nil and empty strings and collections are false."""
+    if value is None or value is False:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value != 0
+    if isinstance(value, (str, list, tuple, dict)):
+        return len(value) > 0
+    return True
+
+
+def to_string(value: Any) -> str:
+    """Formats a value the way Go's template output does."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e21 else repr(value)
+    if isinstance(value, dict):
+        return "map[" + " ".join(f"{key}:{to_string(value[key])}" for key in sorted(value)) + "]"
+    if isinstance(value, (list, tuple)):
+        return "[" + " ".join(to_string(item) for item in value) + "]"
+    return str(value)
+
+
+def to_yaml(value: Any) -> str:
+    if value is None:
+        return "null"
+    return yaml.safe_dump(value, default_flow_style=False, sort_keys=True, width=10**6).rstrip("\n").removesuffix("\n...")
+
+
+def _printf(fmt: str, *args) -> str:
+    args = list(args)
+
+    def verb(match):
+        if match.group(0) == "%%":
+            return "%"
+        if not args:
+            return "%!" + match.group(2) + "(MISSING)"
+        value = args.pop(0)
+        flags, kind = match.group(1), match.group(2)
+        if kind == "q":
+            return json.dumps(to_string(value))
+        if kind in "dxXob" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return ("%" + flags + {"b": "d"}.get(kind, kind)) % int(value)
+        if kind in "feEgG" and isinstance(value, (int, float)):
+            return ("%" + flags + kind) % value
+        return ("%" + flags + "s") % to_string(value)
+
+    return re.sub(r"%([-+# 0]*\d*(?:\.\d+)?)([vsdqtfeEgGxXob%])|%%", verb, fmt)
+
+
+def _empty(value) -> bool:
+    return not truthy(value)
+
+
+def _default(default, *value):
+    return value[0] if value and truthy(value[0]) else default
+
+
+def _required(message, value=None):
+    if value is None or value == "":
+        raise TemplateError(f"execution error: {message}")
+    return value
+
+
+def _fail(message):
+    raise TemplateError(f"execution error: {message}")
+
+
+def _index(collection, *keys):
+    for key in keys:
+        try:
+            collection = collection[key] if collection is not None else None
+        except (KeyError, IndexError, TypeError):
+            if isinstance(collection, dict):
+                collection = None
+            else:
+                raise TemplateError(f"error calling index: cannot index {to_string(collection)!r} with {key!r}")
+    return collection
+
+
+def _dict(*pairs):
+    return {to_string(pairs[index]): pairs[index + 1] if index + 1 < len(pairs) else "" for index in range(0, len(pairs), 2)}
+
+
+def _compare(name: str, check: Callable) -> Callable:
+    def compare(left, right):
+        try:
+            return check(left, right)
+        except TypeError:
+            raise TemplateError(f"error calling {name}: incompatible types for comparison") from None
+    return compare
+
+
+FUNCTIONS = {
+    "and": lambda *values: next((value for value in values if not truthy(value)), values[-1]),
+    "or": lambda *values: next((value for value in values if truthy(value)), values[-1]),
+    "not": lambda value: not truthy(value),
+    "eq": lambda left, *rights: any(left == right for right in rights),
+    "ne": lambda left, right: left != right,
+    "lt": _compare("lt", lambda left, right: left < right),
+    "le": _compare("le", lambda left, right: left <= right),
+    "gt": _compare("gt", lambda left, right: left > right),
+    "ge": _compare("ge", lambda left, right: left >= right),
+    "len": lambda value: len(value or ()),
+    "index": _index,
+    "print": lambda *values: "".join(to_string(value) for value in values),
+    "println": lambda *values: " ".join(to_string(value) for value in values) + "\n",
+    "printf": _printf,
+    "default": _default,
+    "empty": _empty,
+    "coalesce": lambda *values: next((value for value in values if truthy(value)), None),
+    "ternary": lambda yes, no, condition: yes if truthy(condition) else no,
+    "required": _required,
+    "fail": _fail,
+    "quote": lambda *values: " ".join(json.dumps(to_string(value)) for value in values if value is not None),
+    "squote": lambda *values: " ".join(f"'{to_string(value)}'" for value in values if value is not None),
+    "toString": to_string,
+    "toYaml": to_yaml,
+    "toJson": lambda value: json.dumps(value, separators=(",", ":"), sort_keys=True),
+    "fromYaml": lambda text: yaml.safe_load(text) or {},
+    "indent": lambda spaces, text: "\n".join(" " * int(spaces) + line for line in to_string(text).split("\n")),
+    "nindent": lambda spaces, text: "\n" + "\n".join(" " * int(spaces) + line for line in to_string(text).split("\n")),
+    "trim": lambda text: to_string(text).strip(),
+    "trimSuffix": lambda suffix, text: to_string(text).removesuffix(suffix),
+    "trimPrefix": lambda prefix, text: to_string(text).removeprefix(prefix),
+    "trunc": lambda length, text: to_string(text)[: int(length)] if int(length) >= 0 else to_string(text)[int(length):],
+    "lower": lambda text: to_string(text).lower(),
+    "upper": lambda text: to_string(text).upper(),
+    "title": lambda text: to_string(text).title(),
+    "replace": lambda old, new, text: to_string(text).replace(old, new),
+    "contains": lambda part, text: part in to_string(text),
+    "hasPrefix": lambda prefix, text: to_string(text).startswith(prefix),
+    "hasSuffix": lambda suffix, text: to_string(text).endswith(suffix),
+    "join": lambda separator, values: separator.join(to_string(value) for value in values or ()),
+    "split": lambda separator, text: {f"_{index}": part for index, part in enumerate(to_string(text).split(separator))},
+    "splitList": lambda separator, text: to_string(text).split(separator),
+    "list": lambda *values: list(values),
+    "dict": _dict,
+    "get": lambda mapping, key: (mapping or {}).get(key, ""),
+    "hasKey": lambda mapping, key: key in (mapping or {}),
+    "keys": lambda *mappings: [key for mapping in mappings for key in mapping],
+    "int": lambda value: int(float(value or 0)),
+    "int64": lambda value: int(float(value or 0)),
+    "float64": lambda value: float(value or 0),
+    "atoi": lambda value: int(value) if str(value).lstrip("-").isdigit() else 0,
+    "b64enc": lambda text: base64.b64encode(to_string(text).encode()).decode(),
+    "b64dec": lambda text: base64.b64decode(to_string(text)).decode(),
+    "sha256sum": lambda text: hashlib.sha256(to_string(text).encode()).hexdigest(),
+    "lookup": lambda *args: {},
+}
+
+
+class _Scope:
+    """Variables of one block, chained to the enclosing blocks' scopes.
+
+    ``:=`` declares in the current scope; ``=`` updates the scope that
+    declared the variable, so an assignment inside ``if``, ``with`` or
+    ``range`` is still visible after the block, as in Go.
+    """
+
+    __slots__ = ("variables", "parent")
+
+    def __init__(self, variables: Optional[dict] = None, parent: Optional["_Scope"] = None):
+        self.variables = variables or {}
+        self.parent = parent
+
+    def child(self) -> "_Scope":
+        return _Scope(parent=self)
+
+    def _owner(self, name: str) -> Optional["_Scope"]:
+        scope = self
+        while scope is not None and name not in scope.variables:
+            scope = scope.parent
+        return scope
+
+    def __contains__(self, name: str) -> bool:
+        return self._owner(name) is not None
+
+    def __getitem__(self, name: str) -> Any:
+        return self._owner(name).variables[name]
+
+    def declare(self, name: str, value: Any) -> None:
+        self.variables[name] = value
+
+    def assign(self, name: str, value: Any) -> bool:
+        """Sets a declared variable; False if it was never declared."""
+        owner = self._owner(name)
+        if owner is None:
+            return False
+        owner.variables[name] = value
+        return True
+
+
+class _Break(Exception):
+    pass
+
+
+class _Continue(Exception):
+    pass
+
+
+class Renderer:
+    """Renders parsed templates; ``fallbacks`` supply named templates a chart does not define."""
+
+    def __init__(self, templates: dict, fallbacks: Optional[Callable] = None):
+        self.templates = templates
+        self.fallbacks = fallbacks
+        self.missing = set()
+        self.functions = dict(FUNCTIONS, include=self._include, tpl=self._tpl)
+        self._depth = 0
+        self._name = None
+
+    def render(self, name: str, data: Any) -> str:
+        """Renders one template with ``data`` as dot and ``$``."""
+        self._name = name
+        output = []
+        self._run(self.templates[name], data, _Scope({"$": data}), output)
+        return "".join(output)
+
+    def _error(self, node: _Node, message: str) -> TemplateError:
+        return TemplateError(f"{self._name}:{node.line}: {message}")
+
+    def _run(self, nodes: list, dot: Any, variables: _Scope, output: list) -> None:
+        for node in nodes:
+            kind = node.kind
+            if kind == "text":
+                output.append(node.text)
+            elif kind == "action":
+                value = self._pipeline(node, node.pipeline, dot, variables)
+                if not node.pipeline["mode"]:
+                    output.append(to_string(value))
+            elif kind == "if":
+                scope = variables.child()
+                for pipeline, body in node.branches:
+                    if truthy(self._pipeline(node, pipeline, dot, scope)):
+                        self._run(body, dot, scope, output)
+                        break
+                else:
+                    self._run(node.otherwise or [], dot, scope, output)
+            elif kind == "with":
+                scope = variables.child()
+                for pipeline, body in node.branches:
+                    value = self._pipeline(node, pipeline, dot, scope)
+                    if truthy(value):
+                        self._run(body, value, scope, output)
+                        break
+                else:
+                    self._run(node.otherwise or [], dot, scope, output)
+            elif kind == "range":
+                self._range(node, dot, variables, output)
+            elif kind == "template":
+                value = dot if node.pipeline is None else self._pipeline(node, node.pipeline, dot, variables)
+                output.append(self._include(node.name, value, node=node))
+            elif kind == "break":
+                raise _Break()
+            elif kind == "continue":
+                raise _Continue()
+
+    def _range(self, node: _Node, dot: Any, variables: _Scope, output: list) -> None:
+        pipeline, body = node.branches[0]
+        scope = variables.child()
+        collection = self._pipeline(node, dict(pipeline, variables=[], mode=None), dot, scope)
+        if isinstance(collection, dict):
+            items = [(key, collection[key]) for key in sorted(collection)]
+        elif isinstance(collection, (list, tuple)):
+            items = list(enumerate(collection))
+        elif isinstance(collection, int) and not isinstance(collection, bool):
+            items = list(enumerate(range(collection)))
+        elif collection is None:
+            items = []
+        else:
+            raise self._error(node, f"range can't iterate over {to_string(collection)}")
+        if not items:
+            self._run(node.otherwise or [], dot, scope, output)
+            return
+        names = pipeline["variables"]
+        for key, value in items:
+            bound = [value] if len(names) == 1 else [key, value]
+            for name, item in zip(names, bound):
+                if pipeline["mode"] == "assign":
+                    if not scope.assign(name, item):
+                        raise self._error(node, f"undefined variable {name}")
+                else:
+                    scope.declare(name, item)
+            try:
+                # Variables declared in the body last for one iteration.
+                self._run(body, value, scope.child(), output)
+            except _Break:
+                break
+            except _Continue:
+                continue
+
+    def _pipeline(self, node: _Node, pipeline: dict, dot: Any, variables: _Scope) -> Any:
+        value = None
+        for index, command in enumerate(pipeline["commands"]):
+            piped = (value,) if index else ()
+            value = self._command(node, command, dot, variables, piped)
+        for name in pipeline["variables"]:
+            if pipeline["mode"] == "assign":
+                if not variables.assign(name, value):
+                    raise self._error(node, f"undefined variable {name}")
+            else:
+                variables.declare(name, value)
+        return value
+
+    def _command(self, node: _Node, command: list, dot: Any, variables: _Scope, piped: tuple) -> Any:
+        head = command[0]
+        if head[0] == "function":
+            function = self.functions.get(head[1])
+            if function is None:
+                raise self._error(node, f"function {head[1]!r} not supported")
+            args = [self._term(node, term, dot, variables) for term in command[1:]] + list(piped)
+            try:
+                return function(*args)
+            except TemplateError as e:
+                if str(e).startswith(f"{self._name}:"):
+                    raise
+                raise self._error(node, str(e)) from None
+            except (TypeError, ValueError, AttributeError) as e:
+                raise self._error(node, f"error calling {head[1]}: {e}") from None
+        if len(command) > 1 or piped:
+            raise self._error(node, f"can't give argument to non-function {self._describe(head)}")
+        return self._term(node, head, dot, variables)
+
+    def _term(self, node: _Node, term: tuple, dot: Any, variables: _Scope) -> Any:
+        kind = term[0]
+        if kind == "literal":
+            return term[1]
+        if kind == "field":
+            return self._fields(node, dot, term[1], "")
+        if kind == "variable":
+            if term[1] not in variables:
+                raise self._error(node, f"undefined variable {term[1]}")
+            return self._fields(node, variables[term[1]], term[2], term[1])
+        if kind == "pipeline":
+            # Parenthesized pipelines cannot declare variables.
+            return self._pipeline(node, term[1], dot, variables)
+        if kind == "chain":
+            return self._fields(node, self._term(node, term[1], dot, variables), term[2], "(...)")
+        if kind == "function":
+            # A bare function name, e.g. {{ now }}.
+            return self._command(node, [term], dot, variables, ())
+        raise self._error(node, f"unexpected {kind}")
+
+    def _fields(self, node: _Node, value: Any, fields: tuple, prefix: str) -> Any:
+        path = prefix
+        for field in fields:
+            if isinstance(value, Struct):
+                if field not in value:
+                    raise self._error(node, f"can't evaluate field {field} in {path or 'dot'}")
+                value = value[field]
+            elif isinstance(value, dict):
+                value = value.get(field)
+            elif value is None:
+                raise self._error(node, f"nil pointer evaluating {path or 'dot'}.{field}")
+            else:
+                raise self._error(node, f"can't evaluate field {field} in type {type(value).__name__}")
+            path += "." + field
+        return value
+
+    @staticmethod
+    def _describe(term: tuple) -> str:
+        if term[0] == "field":
+            return "." + ".".join(term[1])
+        if term[0] == "variable":
+            return ".".join((term[1],) + term[2])
+        return to_string(term[1])
+
+    def _include(self, name: str, data: Any = None, node: Optional[_Node] = None) -> str:
+        body = self.templates.get(name)
+        if body is None and self.fallbacks is not None:
+            fallback = self.fallbacks(name, data)
+            if fallback is not None:
+                self.missing.add(name)
+                return fallback
+        if body is None:
+            raise TemplateError(f"{self._name}: no template {name!r} associated with template")
+        if self._depth >= MAX_INCLUDE_DEPTH:
+            raise TemplateError(f"{self._name}: rendering template {name!r} has a nested reference depth of {self._depth}")
+        self._depth += 1
+        output = []
+        try:
+            self._run(body, data, _Scope({"$": data}), output)
+        finally:
+            self._depth -= 1
+        return "".join(output)
+
+    def _tpl(self, text: str, data: Any) -> str:
+        # Defines in the text are visible to it, as with Helm's tpl.
+        saved = self.templates
+        self.templates = dict(saved, **parse("tpl", to_string(text)))
+        try:
+            return self._include("tpl", data)
+        finally:
+            self.templates = saved
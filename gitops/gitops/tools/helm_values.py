@@ -0,0 +1,557 @@
+"""Validates and renders Helm values files locally, before anything is committed.
+
+Checking a values change used to mean opening a pull request and waiting for
+ArgoCD to sync it. ``check_values`` does the same checks in process, in
+milliseconds:
+
+* the values, merged over the chart's ``values.yaml`` as Helm merges them,
+  are validated against the chart's ``values.schema.json`` or, if it has
+  none, a schema derived from ``values.yaml`` (types of every default, maps
+  of similar entries such as ``regions``);
+* every template is rendered with ``helm_template`` and each manifest must be
+  YAML with an apiVersion, a kind and a name.
+
+A loaded chart (metadata, defaults, schema and parsed templates) is cached per
+chart directory and version, and reloaded when a file of the chart changes,
+so checking hundreds of cluster values files parses the chart once.
+
+``preview_values_changes`` applies the patches of a change plan to the values
+files in the GitOps mirror and returns, per file, the validation result and a
+diff of the rendered manifests.
+"""
+import asyncio
+import copy
+import difflib
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import jsonschema
+import yaml
+
+from .batch_commit import BatchCommitError, apply_patch
+from .helm_template import Renderer, Struct, TemplateError, parse, value_paths
+from .repo_mirror import get_repo_mirror
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CHART_PATH = os.path.join(PACKAGE_DIR, "Chart")
+DEFAULT_RELEASE_NAME = "release-name"
+MAX_CACHED_CHARTS = 16
+MAX_MANIFEST_CHARS = 20000
+MAX_DIFF_LINES = 80
+MAX_PREVIEW_FILES = 100
+
+# libyaml's loader, when PyYAML was built with it, parses rendered manifests
+# about ten times faster.
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Fields of Helm's chart.Metadata; any other .Chart field is an error.
+_CHART_FIELDS = (
+    "Name", "Home", "Sources", "Version", "Description", "Keywords", "Maintainers", "Icon", "APIVersion",
+    "Condition", "Tags", "AppVersion", "Deprecated", "Annotations", "KubeVersion", "Dependencies", "Type",
+)
+
+
+class ChartError(Exception):
+    """A chart directory cannot be loaded."""
+
+
+# --- Schema ------------------------------------------------------------------
+
+_JSON_TYPES = (
+    (bool, "boolean"),
+    (int, "integer"),
+    (float, "number"),
+    (str, "string"),
+    (list, "array"),
+    (dict, "object"),
+)
+
+
+def _json_type(value: Any) -> Optional[str]:
+    for python_type, json_type in _JSON_TYPES:
+        if isinstance(value, python_type):
+            return json_type
+    return None
+
+
+def derive_schema(value: Any) -> dict:
+    """Derives a JSON schema from default values.
+
+    Every default fixes the type of its key (null is always allowed, since it
+    removes a default in Helm); list items only get the kind of the first
+    default item. A mapping whose values are two or more
+    mappings with the same keys, such as per-region settings, accepts any
+    further key with the same shape.
+    """
+    json_type = _json_type(value)
+    if json_type is None:
+        return {}
+    schema = {"type": [json_type, "null"]}
+    if json_type == "object" and value:
+        schema["properties"] = {key: derive_schema(item) for key, item in value.items()}
+        items = list(value.values())
+        if len(items) > 1 and all(isinstance(item, dict) and item.keys() == items[0].keys() for item in items):
+            schema["additionalProperties"] = derive_schema(items[0])
+    elif json_type == "array" and value:
+        # Only the kind of the items: one example does not type their fields.
+        item_type = _json_type(value[0])
+        if item_type is not None:
+            schema["items"] = {"type": [item_type, "null"]}
+    return schema
+
+
+def _matches_type(value: Any, json_type: str) -> bool:
+    if json_type == "null":
+        return value is None
+    if json_type == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if json_type == "integer":
+        return isinstance(value, int) and not isinstance(value, bool) or isinstance(value, float) and value.is_integer()
+    return _json_type(value) == json_type
+
+
+def validate_schema(value: Any, schema: dict, path: str = "") -> list:
+    """Validates against the JSON schema keywords ``derive_schema`` uses.
+
+    type, properties, additionalProperties, items, required, enum, minimum
+    and maximum are checked; other keywords are ignored.
+    """
+    errors = []
+    where = path or "(root)"
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        if not any(_matches_type(value, json_type) for json_type in types):
+            return [f"{where}: expected {' or '.join(t for t in types if t != 'null')}, got {_json_type(value) or 'null'}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{where}: must be one of {schema['enum']}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{where}: must be at least {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{where}: must be at most {schema['maximum']}")
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        additional = schema.get("additionalProperties", True)
+        for key in schema.get("required", ()):
+            if key not in value:
+                errors.append(f"{where}: missing required key {key}")
+        for key, item in value.items():
+            child = f"{path}.{key}" if path else str(key)
+            if key in properties:
+                errors.extend(validate_schema(item, properties[key], child))
+            elif additional is False:
+                errors.append(f"{child}: not allowed by the schema")
+            elif isinstance(additional, dict):
+                errors.extend(validate_schema(item, additional, child))
+    elif isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for index, item in enumerate(value):
+            errors.extend(validate_schema(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def merge_values(defaults: Any, overrides: Any) -> Any:
+    """Merges values over chart defaults like Helm: maps deeply, null deletes a default."""
+    if not isinstance(defaults, dict) or not isinstance(overrides, dict):
+        return copy.deepcopy(overrides)
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_values(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+# --- Charts ------------------------------------------------------------------
+
+
+class LoadedChart:
+    """A chart's metadata, defaults, schema and parsed templates."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.warnings = []
+        self.parse_errors = {}
+        self.metadata = self._load_yaml("Chart.yaml")
+        if not self.metadata:
+            self.warnings.append("Chart.yaml is missing; .Chart fields are empty")
+        self.name = str(self.metadata.get("name") or os.path.basename(path.rstrip("/")))
+        self.version = str(self.metadata.get("version") or "")
+        self.defaults = self._load_yaml("values.yaml")
+        schema_path = os.path.join(path, "values.schema.json")
+        if os.path.exists(schema_path):
+            with open(schema_path, encoding="utf-8") as f:
+                self.schema = json.load(f)
+            self.schema_source = "values.schema.json"
+        else:
+            self.schema = derive_schema(self.defaults)
+            self.schema_source = "values.yaml"
+        self.templates = {}
+        self.files = []
+        for name in template_files(path):
+            with open(os.path.join(path, name), encoding="utf-8") as f:
+                text = f.read()
+            try:
+                self.templates.update(parse(name, text))
+            except TemplateError as e:
+                self.parse_errors[name] = str(e)
+                continue
+            base = os.path.basename(name)
+            if not base.startswith("_") and base != "NOTES.txt":
+                self.files.append(name)
+        self.value_paths = value_paths(self.templates)
+        self.top_level_keys = {path[0] for path in self.value_paths if path}
+
+    def _load_yaml(self, name: str) -> dict:
+        try:
+            with open(os.path.join(self.path, name), encoding="utf-8") as f:
+                data = yaml.load(f, Loader=_Loader)
+        except FileNotFoundError:
+            return {}
+        except yaml.YAMLError as e:
+            raise ChartError(f"{name} is not valid YAML: {e}") from e
+        return data if isinstance(data, dict) else {}
+
+    def chart_object(self) -> Struct:
+        chart = Struct.fromkeys(_CHART_FIELDS, "")
+        for key, value in self.metadata.items():
+            field = "APIVersion" if key == "apiVersion" else key[:1].upper() + key[1:]
+            chart[field] = value
+        chart["Name"] = self.name
+        return chart
+
+    def describe(self) -> dict:
+        return {
+            "path": self.path,
+            "name": self.name,
+            "version": self.version,
+            "schema": self.schema_source,
+            "templates": self.files,
+        }
+
+
+def template_files(path: str) -> list:
+    """Returns the chart's template files relative to the chart, e.g. "templates/deployment.yaml"."""
+    files = []
+    root = os.path.join(path, "templates")
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files.append(os.path.relpath(os.path.join(directory, name), path).replace(os.sep, "/"))
+    return sorted(files)
+
+
+def _signature(path: str) -> tuple:
+    signature = []
+    for name in ["Chart.yaml", "values.yaml", "values.schema.json"] + template_files(path):
+        try:
+            stat = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            continue
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+
+
+def load_chart(path: str) -> LoadedChart:
+    """Returns the loaded chart, parsing it only if its version or files changed."""
+    path = os.path.abspath(path)
+    if not os.path.isdir(os.path.join(path, "templates")):
+        raise ChartError(f"{path} is not a chart: it has no templates directory")
+    signature = _signature(path)
+    with _charts_lock:
+        cached = _charts.get(path)
+        if cached is not None and cached[0] == signature:
+            _charts.move_to_end(path)
+            return cached[1]
+    chart = LoadedChart(path)
+    with _charts_lock:
+        _charts[path] = (signature, chart)
+        while len(_charts) > MAX_CACHED_CHARTS:
+            _charts.popitem(last=False)
+    return chart
+
+
+def resolve_chart_path(chart: str = "") -> str:
+    """Resolves a chart argument.
+
+    Relative paths are looked up in the GitOps mirror, then in this package
+    ("Chart/app") and then in the project directory above it ("gitops/Chart").
+    """
+    if not chart:
+        return os.getenv("GITOPS_CHART_PATH", DEFAULT_CHART_PATH)
+    if os.path.isabs(chart):
+        return chart
+    mirror = get_repo_mirror()
+    for root in (mirror.path if mirror is not None else None, PACKAGE_DIR, os.path.dirname(PACKAGE_DIR)):
+        if root is not None and os.path.isdir(os.path.join(root, chart)):
+            return os.path.join(root, chart)
+    return os.path.join(PACKAGE_DIR, chart)
+
+
+# --- Checking ----------------------------------------------------------------
+
+
+def _helper_fallback(chart: LoadedChart):
+    # Output of the helpers "helm create" generates, for charts that use them
+    # without shipping _helpers.tpl.
+    def fallback(name: str, data: Any) -> Optional[str]:
+        _, _, helper = name.rpartition(".")
+        release = data.get("Release", {}).get("Name", DEFAULT_RELEASE_NAME) if isinstance(data, dict) else DEFAULT_RELEASE_NAME
+        chart_name = chart.name[:63].rstrip("-")
+        if helper == "name":
+            return chart_name
+        if helper == "fullname":
+            return (release if chart.name in release else f"{release}-{chart.name}")[:63].rstrip("-")
+        if helper == "chart":
+            return f"{chart.name}-{chart.version}".replace("+", "_")[:63].rstrip("-")
+        selector = f"app.kubernetes.io/name: {chart_name}\napp.kubernetes.io/instance: {release}"
+        if helper == "selectorLabels":
+            return selector
+        if helper == "labels":
+            labels = f"helm.sh/chart: {chart.name}-{chart.version}\n{selector}"
+            if chart.metadata.get("appVersion"):
+                labels += f"\napp.kubernetes.io/version: {json.dumps(str(chart.metadata['appVersion']))}"
+            return labels + "\napp.kubernetes.io/managed-by: Helm"
+        if helper == "serviceAccountName":
+            return "default"
+        return None
+
+    return fallback
+
+
+def _check_manifest(name: str, text: str) -> list:
+    errors = []
+    try:
+        documents = list(yaml.load_all(text, Loader=_Loader))
+    except yaml.YAMLError as e:
+        return [f"{name}: rendered output is not valid YAML: {e}"]
+    for number, document in enumerate(documents, 1):
+        if document is None:
+            continue
+        if not isinstance(document, dict):
+            errors.append(f"{name}: document {number} is not a mapping")
+            continue
+        missing = [
+            key for key, present in (
+                ("apiVersion", document.get("apiVersion")),
+                ("kind", document.get("kind")),
+                ("metadata.name", (document.get("metadata") or {}).get("name")),
+            ) if not present
+        ]
+        if missing:
+            errors.append(f"{name}: document {number} has no {', '.join(missing)}")
+    return errors
+
+
+def _validate(chart: LoadedChart, values: dict) -> list:
+    if chart.schema_source == "values.schema.json":
+        validator = jsonschema.Draft7Validator(chart.schema)
+        return [
+            f"{'.'.join(str(part) for part in error.absolute_path) or '(root)'}: {error.message}"
+            for error in validator.iter_errors(values)
+        ]
+    return validate_schema(values, chart.schema)
+
+
+def render_chart(chart: LoadedChart, values: dict, release_name: str = DEFAULT_RELEASE_NAME) -> tuple:
+    """Renders every template of the chart with already merged values.
+
+    Returns:
+        tuple: (template name to manifest text, render errors, helpers that
+        were not defined and fell back to the "helm create" defaults).
+    """
+    renderer = Renderer(chart.templates, _helper_fallback(chart))
+    base = {
+        "Values": values,
+        "Chart": chart.chart_object(),
+        "Release": Struct(
+            Name=release_name, Namespace="default", Service="Helm", IsInstall=True, IsUpgrade=False, Revision=1
+        ),
+        "Capabilities": Struct(KubeVersion=Struct(Version="v1.29.0", Major="1", Minor="29"), APIVersions=[]),
+        "Files": Struct(),
+    }
+    manifests, errors = {}, []
+    for name in chart.files:
+        data = dict(base, Template=Struct(Name=f"{chart.name}/{name}", BasePath=f"{chart.name}/templates"))
+        try:
+            manifests[name] = renderer.render(name, data)
+        except TemplateError as e:
+            errors.append(str(e))
+    return manifests, errors, sorted(renderer.missing)
+
+
+def check_values(values: Any, chart_path: str = "", render: bool = True) -> dict:
+    """Validates a values document against a chart and renders the chart with it.
+
+    Args:
+        values: The values, as YAML text or already parsed.
+        chart_path (str): Chart directory; see ``resolve_chart_path``.
+        render (bool): Also render the templates.
+
+    Returns:
+        dict: status, chart, errors, warnings and, if rendered, the manifests
+        per template.
+    """
+    try:
+        chart = load_chart(resolve_chart_path(chart_path))
+    except (ChartError, OSError, ValueError) as e:
+        return {"status": "error", "error_message": str(e)}
+    if isinstance(values, str):
+        try:
+            values = yaml.load(values, Loader=_Loader) or {}
+        except yaml.YAMLError as e:
+            return {"status": "error", "chart": chart.describe(), "errors": [f"values are not valid YAML: {e}"]}
+    if not isinstance(values, dict):
+        return {"status": "error", "chart": chart.describe(), "errors": ["values must be a mapping"]}
+    merged = merge_values(chart.defaults, values)
+    errors = _validate(chart, merged)
+    warnings = list(chart.warnings)
+    unused = sorted(key for key in values if key not in chart.defaults and key not in chart.top_level_keys)
+    if unused:
+        warnings.append(f"keys not used by the chart: {', '.join(unused)}")
+    result = {"chart": chart.describe()}
+    if chart.parse_errors:
+        result["chart_errors"] = list(chart.parse_errors.values())
+    if render:
+        manifests, render_errors, missing = render_chart(chart, merged)
+        errors.extend(render_errors)
+        for name, text in manifests.items():
+            errors.extend(_check_manifest(name, text))
+        if missing:
+            warnings.append(f"helpers not defined by the chart, rendered with helm create defaults: {', '.join(missing)}")
+        result["manifests"] = manifests
+    result.update(status="error" if errors or chart.parse_errors else "success", errors=errors, warnings=warnings)
+    return result
+
+
+def _joined(manifests: dict) -> list:
+    lines = []
+    for name in sorted(manifests):
+        lines.append(f"# Source: {name}")
+        lines.extend(manifests[name].strip("\n").splitlines())
+    return lines
+
+
+def preview_file(path: str, before_text: Optional[str], edit: dict, chart_path: str = "") -> dict:
+    """Checks one patched values file and diffs its rendered manifests against the current ones."""
+    try:
+        after_text = apply_patch(before_text or "", edit.get("set"), edit.get("unset"))
+    except BatchCommitError as e:
+        return {"path": path, "status": "error", "errors": [str(e)]}
+    after = check_values(after_text, chart_path)
+    result = {"path": path, "status": after["status"], "errors": after.get("errors", [])}
+    if "error_message" in after:
+        result["errors"] = [after["error_message"]]
+        return result
+    if after.get("warnings"):
+        result["warnings"] = after["warnings"]
+    before_manifests = {}
+    if before_text is not None:
+        before = check_values(before_text, chart_path)
+        before_manifests = before.get("manifests", {})
+    diff = list(difflib.unified_diff(
+        _joined(before_manifests), _joined(after.get("manifests", {})), "before", "after", lineterm="", n=1
+    ))
+    result["changed_lines"] = sum(1 for line in diff[2:] if line[:1] in "+-")
+    result["diff"] = diff[:MAX_DIFF_LINES]
+    if len(diff) > MAX_DIFF_LINES:
+        result["diff_truncated"] = True
+    return result
+
+
+async def validate_helm_values(values_yaml: str, chart: str = "") -> dict:
+    """Validates a proposed Helm values file and renders the chart with it, locally.
+
+    Use this before committing any values change: it checks the values
+    against the chart's schema and renders every template in milliseconds,
+    instead of waiting for a pull request and an ArgoCD sync.
+
+    Args:
+        values_yaml (str): The complete proposed values file, as YAML.
+        chart (str): Chart directory, e.g. "Chart/app"; relative paths are looked up in the
+            GitOps repository mirror first. Defaults to the agent's chart.
+
+    Returns:
+        dict: status, errors (schema violations and render failures),
+        warnings, chart details and the rendered manifests per template.
+    """
+    result = await asyncio.to_thread(check_values, values_yaml, chart)
+    manifests = result.get("manifests")
+    if manifests:
+        text = "\n---\n".join(f"# Source: {name}\n{manifest.strip()}" for name, manifest in manifests.items())
+        result["manifests"] = text[:MAX_MANIFEST_CHARS]
+        if len(text) > MAX_MANIFEST_CHARS:
+            result["manifests_truncated"] = True
+    return result
+
+
+def _preview(changes: list, chart: str) -> dict:
+    # Imported here: fan_out imports the commit backends, which this module
+    # only needs for previews.
+    from .fan_out import PlanError, expand_changes
+
+    mirror = get_repo_mirror()
+    if mirror is None:
+        return {"status": "error", "error_message": "The GitOps mirror is not configured. Set GITOPS_REPO_URL."}
+    try:
+        entries = mirror.entries()
+    except (OSError, subprocess.SubprocessError) as e:
+        return {"status": "error", "error_message": f"Could not sync the GitOps mirror: {e}"}
+    try:
+        edits = expand_changes(changes, entries, mirror.teams_dir)
+    except PlanError as e:
+        return {"status": "error", "error_message": str(e)}
+    results = []
+    for edit in edits:
+        try:
+            with open(os.path.join(mirror.path, edit["path"]), encoding="utf-8") as f:
+                before_text = f.read()
+        except FileNotFoundError:
+            before_text = None
+        if before_text is None and not edit.get("create"):
+            results.append({"path": edit["path"], "status": "error", "errors": ["File not found in the mirror"]})
+            continue
+        results.append(preview_file(edit["path"], before_text, edit, chart))
+    failed = [result for result in results if result["status"] != "success"]
+    changed = [result for result in results if result["status"] == "success" and result.get("changed_lines")]
+    # Failures first, then files whose manifests change; unchanged files are only counted.
+    reported = (failed + changed)[:MAX_PREVIEW_FILES]
+    return {
+        "status": "error" if failed else "success",
+        "commit": mirror.commit,
+        "files": len(results),
+        "failed": len(failed),
+        "changed": len(changed),
+        "unchanged": len(results) - len(failed) - len(changed),
+        "results": reported,
+        "truncated": len(failed) + len(changed) > MAX_PREVIEW_FILES,
+    }
+
+
+async def preview_values_changes(changes: list[dict], chart: str = "") -> dict:
+    """Dry-runs a change plan: patches values files locally, validates them and diffs the rendered manifests.
+
+    Takes the same changes as run_change_plan and commits nothing. Run it
+    before run_change_plan or commit_values_changes to catch schema errors and
+    see exactly which manifests change in every cluster.
+
+    Args:
+        changes (list[dict]): Changes as for run_change_plan: "team", "environment", "region",
+            "cluster", optional "image"/"below_tag", and "set"/"unset"/"create".
+        chart (str): Chart directory, e.g. "Chart/app"; defaults to the agent's chart.
+
+    Returns:
+        dict: status, counts of failed, changed and unchanged files, and per
+        failed or changed file its errors, warnings and manifest diff.
+    """
+    return await asyncio.to_thread(_preview, changes, chart)
@@ -0,0 +1,319 @@
+"""Process-wide pool of warm MCP sessions for the ArgoCD and GitHub servers.
+
+``MCPToolset`` opens a new MCP session, with its initialize handshake, and
+lists the server's tools again for every agent run, which costs hundreds of
+milliseconds before the first tool call. ``PooledMCPToolset`` instead takes
+its session from a ``PooledSessionManager`` shared by every toolset that
+talks to the same URL with the same headers:
+
+* one session per event loop is kept open across agent runs, owned by a
+  background task so it can be closed from anywhere; when the loop shuts
+  down, e.g. at the end of ``asyncio.run``, the task is cancelled, which ends
+  the session, and the closed loop is dropped from the pool, so runs that
+  each start a loop of their own each connect anew;
+* the owner pings the server every MCP_KEEPALIVE_SECONDS while idle; a failed
+  ping, a dropped stream or ``close()`` ends the session, and the next call
+  reconnects;
+* the ``tools/list`` result is cached until the server sends
+  ``notifications/tools/list_changed`` or MCP_TOOLS_TTL_SECONDS pass.
+
+Closing a toolset at the end of a run leaves its session in the pool;
+``close_pools`` shuts every pooled session down. ``pool_stats`` reports
+connects, reuses and tool list cache hits per server.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import AsyncExitStack
+from datetime import timedelta
+
+from google.adk.tools.mcp_tool import MCPToolset, StreamableHTTPConnectionParams
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
+from mcp import ClientSession, types
+from mcp.client.streamable_http import streamablehttp_client
+
+DEFAULT_KEEPALIVE_SECONDS = 30.0
+DEFAULT_PING_TIMEOUT_SECONDS = 5.0
+DEFAULT_TOOLS_TTL_SECONDS = 3600.0
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+    """One MCP session on one event loop, owned by a background task."""
+
+    def __init__(self, manager: "PooledSessionManager"):
+        self.manager = manager
+        self.session = None
+        self.opened = False
+        self.lock = asyncio.Lock()
+        self._task = None
+        self._closing = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def open(self) -> ClientSession:
+        ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._own(ready))
+        session = await ready
+        self.opened = True
+        return session
+
+    async def close(self) -> None:
+        task = self._task
+        if task is None:
+            return
+        self._closing.set()
+        # Awaiting the owner would raise its CancelledError if it was
+        # cancelled, e.g. by asyncio.run at exit, and cancel it along with
+        # the caller; wait() does neither.
+        await asyncio.wait({task})
+        self._task = None
+
+    async def _own(self, ready: asyncio.Future) -> None:
+        # The streams are entered and exited in this task, as anyio requires.
+        manager = self.manager
+        params = manager.connection_params
+        try:
+            async with AsyncExitStack() as stack:
+                read, write, _ = await stack.enter_async_context(
+                    streamablehttp_client(
+                        url=params.url,
+                        headers=params.headers,
+                        timeout=timedelta(seconds=params.timeout),
+                        sse_read_timeout=timedelta(seconds=params.sse_read_timeout),
+                    )
+                )
+                session = await stack.enter_async_context(
+                    ClientSession(read, write, message_handler=manager._on_message)
+                )
+                await session.initialize()
+                self.session = session
+                ready.set_result(session)
+                await self._keep_alive(session)
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning("MCP session to %s ended", manager.name, exc_info=True)
+        finally:
+            self.session = None
+
+    async def _keep_alive(self, session: ClientSession) -> None:
+        manager = self.manager
+        while True:
+            try:
+                await asyncio.wait_for(self._closing.wait(), manager.keepalive_seconds)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(session.send_ping(), manager.ping_timeout_seconds)
+            except Exception:
+                manager._count("health_check_failures")
+                logger.warning("MCP server %s stopped answering pings; reconnecting on next use", manager.name)
+                return
+
+
+class PooledSessionManager:
+    """Hands out a warm MCP session per event loop and caches the tool list.
+
+    Duck-types ADK's MCPSessionManager: ``create_session`` returns a ready
+    ``ClientSession`` and ``close`` drops it, so MCPTool works unchanged.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connection_params: StreamableHTTPConnectionParams,
+        errlog=sys.stderr,
+        keepalive_seconds: float = DEFAULT_KEEPALIVE_SECONDS,
+        ping_timeout_seconds: float = DEFAULT_PING_TIMEOUT_SECONDS,
+        tools_ttl_seconds: float = DEFAULT_TOOLS_TTL_SECONDS,
+    ):
+        self.name = name
+        self.connection_params = connection_params
+        self._errlog = errlog
+        self.keepalive_seconds = keepalive_seconds
+        self.ping_timeout_seconds = ping_timeout_seconds
+        self.tools_ttl_seconds = tools_ttl_seconds
+        # Keyed by loop, not id(loop): a new loop can reuse a closed one's id.
+        self._connections = weakref.WeakKeyDictionary()
+        self._tools = None
+        self._tools_expires_at = 0.0
+        self._tools_version = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "connects": 0,
+            "reconnects": 0,
+            "reuses": 0,
+            "health_check_failures": 0,
+            "tool_list_fetches": 0,
+            "tool_list_hits": 0,
+            "tool_list_changes": 0,
+        }
+
+    async def create_session(self) -> ClientSession:
+        """Returns the warm session for the running loop, connecting if needed."""
+        connection = self._connection()
+        async with connection.lock:
+            if connection.alive:
+                self._count("reuses")
+                return connection.session
+            reconnect = connection.opened
+            await connection.close()
+            session = await connection.open()
+            self._count("reconnects" if reconnect else "connects")
+            return session
+
+    async def list_tools(self) -> tuple:
+        """Returns the server's tools and the version of the cached list."""
+        with self._lock:
+            if self._tools is not None and time.monotonic() < self._tools_expires_at:
+                self._counters["tool_list_hits"] += 1
+                return self._tools, self._tools_version
+            version = self._tools_version
+        session = await self.create_session()
+        tools = (await session.list_tools()).tools
+        with self._lock:
+            self._counters["tool_list_fetches"] += 1
+            # A list_changed notification that arrived meanwhile wins.
+            if version == self._tools_version:
+                self._tools = tools
+                self._tools_expires_at = time.monotonic() + self.tools_ttl_seconds
+                self._tools_version += 1
+            return tools, self._tools_version
+
+    def invalidate_tools(self) -> None:
+        """Forgets the cached tool list."""
+        with self._lock:
+            self._tools = None
+            self._tools_version += 1
+
+    async def close(self) -> None:
+        """Drops the session of the running loop; the next call reconnects."""
+        with self._lock:
+            connection = self._connections.get(asyncio.get_running_loop())
+        if connection is not None:
+            async with connection.lock:
+                await connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, cached_tools=len(self._tools or ()))
+
+    def _connection(self) -> _Connection:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # A connection refers to its loop through its task and locks, so
+            # the weak key alone never expires; closed loops are dropped here.
+            for closed in [other for other in self._connections if other.is_closed()]:
+                del self._connections[closed]
+            connection = self._connections.get(loop)
+            if connection is None:
+                connection = self._connections[loop] = _Connection(self)
+            return connection
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    async def _on_message(self, message) -> None:
+        if isinstance(message, types.ServerNotification) and isinstance(
+            message.root, types.ToolListChangedNotification
+        ):
+            self._count("tool_list_changes")
+            self.invalidate_tools()
+        elif isinstance(message, Exception):
+            logger.debug("MCP server %s sent an error: %s", self.name, message)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def _env_settings() -> dict:
+    return {
+        "keepalive_seconds": float(os.getenv("MCP_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS)),
+        "ping_timeout_seconds": float(os.getenv("MCP_PING_TIMEOUT_SECONDS", DEFAULT_PING_TIMEOUT_SECONDS)),
+        "tools_ttl_seconds": float(os.getenv("MCP_TOOLS_TTL_SECONDS", DEFAULT_TOOLS_TTL_SECONDS)),
+    }
+
+
+def get_session_manager(
+    name: str, connection_params: StreamableHTTPConnectionParams, errlog=sys.stderr
+) -> PooledSessionManager:
+    """Returns the pooled manager for a server URL and header set."""
+    key = (connection_params.url, tuple(sorted((connection_params.headers or {}).items())))
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = PooledSessionManager(
+                name, connection_params, errlog, **_env_settings()
+            )
+        return manager
+
+
+def pool_stats() -> dict:
+    """Returns the counters of every pooled server, keyed by name."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    return {manager.name: manager.stats() for manager in managers}
+
+
+async def close_pools() -> None:
+    """Closes the pooled sessions of the running loop, e.g. at shutdown."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        await manager.close()
+
+
+class PooledMCPToolset(MCPToolset):
+    """MCPToolset whose session and tool list outlive a single agent run.
+
+    ``tool_class`` lets a toolset wrap its tools in an MCPTool subclass, e.g.
+    one that caches results.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        connection_params: StreamableHTTPConnectionParams,
+        tool_filter=None,
+        errlog=sys.stderr,
+        tool_class: type = MCPTool,
+    ):
+        super().__init__(connection_params=connection_params, tool_filter=tool_filter, errlog=errlog)
+        self._mcp_session_manager = get_session_manager(name, connection_params, errlog)
+        self._tool_class = tool_class
+        self._tools = None
+
+    async def get_tools(self, readonly_context=None) -> list:
+        mcp_tools, version = await self._mcp_session_manager.list_tools()
+        if self._tools is None or self._tools[0] != version:
+            wrapped = [
+                self._tool_class(mcp_tool=tool, mcp_session_manager=self._mcp_session_manager)
+                for tool in mcp_tools
+            ]
+            self._tools = (version, wrapped)
+        return [tool for tool in self._tools[1] if self._selected(tool, readonly_context)]
+
+    async def close(self) -> None:
+        # The session belongs to the pool, not to this run.
+        pass
+
+    def _selected(self, tool, readonly_context) -> bool:
+        if self.tool_filter is None:
+            return True
+        if callable(self.tool_filter):
+            return self.tool_filter(tool, readonly_context)
+        return tool.name in self.tool_filter
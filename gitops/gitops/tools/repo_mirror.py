@@ -0,0 +1,389 @@
+"""Local mirror of the GitOps repository with an index of every values file.
+
+Fleet-wide questions ("which clusters run nginx below 1.21.0") used to take a
+``search_code`` call plus one ``get_file_contents`` per cluster, against a
+search index that lags behind the branch. ``RepoMirror`` keeps a shallow clone
+of GITOPS_REPO_URL and, for every file matching
+``<GITOPS_TEAMS_DIR>/<team>/<env>/<region>/<cluster>/values.yaml``, an index
+entry with the image repository and tag, replicas, resources and ingress
+hosts.
+
+The mirror is fetched again at most every GITOPS_MIRROR_REFRESH_SECONDS, with
+depth 1, and only the values files changed between the old and the new head
+are parsed again. The index is saved next to the clone, keyed by commit SHA,
+so a restart does not re-parse the tree.
+"""
+import base64
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from typing import Optional
+
+import yaml
+
+DEFAULT_MIRROR_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gitops", "mirror")
+DEFAULT_BRANCH = "main"
+DEFAULT_TEAMS_DIR = "teams"
+DEFAULT_REFRESH_SECONDS = 60.0
+GIT_TIMEOUT_SECONDS = 120
+INDEX_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+class GitError(subprocess.SubprocessError):
+    """A git command failed; the message names the subcommand and git's stderr, never the credentials."""
+
+
+def version_key(tag: str) -> Optional[tuple]:
+    """Returns the numeric part of an image tag for ordering, e.g. "v1.21.6-alpine" -> (1, 21, 6).
+
+    Tags without a leading version ("latest", a digest) return None.
+    """
+    match = re.match(r"^v?(\d+(?:\.\d+)*)", str(tag).strip())
+    if match is None:
+        return None
+    return tuple(int(part) for part in match.group(1).split("."))
+
+
+def compare_versions(left: tuple, right: tuple) -> int:
+    """Compares two version keys, treating missing components as 0."""
+    size = max(len(left), len(right))
+    left = left + (0,) * (size - len(left))
+    right = right + (0,) * (size - len(right))
+    return (left > right) - (left < right)
+
+
+def image_matches(repository: str, image: str) -> bool:
+    """Tells if an image repository is ``image``, e.g. "nginx" matches "docker.io/library/nginx"."""
+    return repository == image or repository.endswith("/" + image)
+
+
+def location_names(value) -> list:
+    """Normalizes a location filter to a list of names; [] matches any."""
+    if value is None or value == "" or value == "*":
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [item for item in value if item and item != "*"]
+
+
+def select_entries(entries: list, image: str = "", below_tag: str = "", **locations) -> list:
+    """Filters index entries, sorted by path.
+
+    Args:
+        entries (list): Index entries, see ``index_values``.
+        image (str): Image repository to match, see ``image_matches``.
+        below_tag (str): Keep only image tags that are an older version than this.
+        **locations: team, environment, region and cluster, each a name or a
+            list of names; empty or "*" matches any.
+    """
+    below = version_key(below_tag) if below_tag else None
+    wanted = {field: location_names(value) for field, value in locations.items()}
+    selected = []
+    for entry in entries:
+        if "error" in entry:
+            continue
+        if any(names and entry[field] not in names for field, names in wanted.items()):
+            continue
+        if image and not image_matches(entry["image_repository"], image):
+            continue
+        if below is not None:
+            current = version_key(entry["image_tag"])
+            if current is None or compare_versions(current, below) >= 0:
+                continue
+        selected.append(entry)
+    return sorted(selected, key=lambda entry: entry["path"])
+
+
+def _ingress_hosts(ingress) -> list:
+    if not isinstance(ingress, dict):
+        return []
+    hosts = []
+    if ingress.get("host"):
+        hosts.append(str(ingress["host"]))
+    for host in ingress.get("hosts") or []:
+        if isinstance(host, dict) and host.get("host"):
+            hosts.append(str(host["host"]))
+        elif isinstance(host, str):
+            hosts.append(host)
+    return hosts
+
+
+def _scalar_text(node, *keys: str) -> Optional[str]:
+    """The text of the scalar at ``keys`` in a YAML node tree, as written."""
+    for key in keys:
+        if not isinstance(node, yaml.MappingNode):
+            return None
+        # The last occurrence wins, as when constructing the mapping.
+        node = next(
+            (value for name, value in reversed(node.value) if isinstance(name, yaml.ScalarNode) and name.value == key),
+            None,
+        )
+    return node.value if isinstance(node, yaml.ScalarNode) else None
+
+
+def _load_values(text: str) -> tuple:
+    """Parses a values file; returns the values and the image tag as written, e.g. "1.20" rather than 1.2."""
+    loader = yaml.SafeLoader(text)
+    try:
+        node = loader.get_single_node()
+        values = loader.construct_document(node) if node is not None else None
+    finally:
+        loader.dispose()
+    return values, _scalar_text(node, "image", "tag")
+
+
+def index_values(path: str, text: str, teams_dir: str = DEFAULT_TEAMS_DIR) -> Optional[dict]:
+    """Builds the index entry of one values file, or None if it is not a cluster values file.
+
+    Args:
+        path (str): Path of the file relative to the repository root.
+        text (str): The YAML content.
+        teams_dir (str): Directory holding the team trees.
+
+    Returns:
+        dict: Team, environment, region, cluster, image, replicas, resources
+        and ingress hosts.
+    """
+    parts = path.split("/")
+    if len(parts) != 6 or parts[0] != teams_dir or parts[-1] not in ("values.yaml", "values.yml"):
+        return None
+    try:
+        values, tag_text = _load_values(text)
+    except yaml.YAMLError as e:
+        return {"path": path, "error": f"Invalid YAML: {e}"}
+    values = values or {}
+    if not isinstance(values, dict):
+        return {"path": path, "error": "values file is not a mapping"}
+    image = values.get("image") if isinstance(values.get("image"), dict) else {}
+    repository = str(image.get("repository") or "")
+    # An unquoted tag such as 1.20 is a float to YAML; the index keeps the text.
+    tag = str(tag_text if tag_text is not None else image.get("tag")) if image.get("tag") else ""
+    if not tag and ":" in repository.rsplit("/", 1)[-1]:
+        repository, tag = repository.rsplit(":", 1)
+    ingress = values.get("ingress") if isinstance(values.get("ingress"), dict) else {}
+    return {
+        "path": path,
+        "team": parts[1],
+        "environment": parts[2],
+        "region": parts[3],
+        "cluster": parts[4],
+        "image_repository": repository,
+        "image_tag": tag,
+        "replicas": values.get("replicaCount", values.get("replicas")),
+        "resources": values.get("resources") or {},
+        "ingress_enabled": bool(ingress.get("enabled", bool(ingress))),
+        "ingress_hosts": _ingress_hosts(ingress),
+    }
+
+
+class RepoMirror:
+    """Shallow clone of the GitOps repository plus its values index."""
+
+    def __init__(
+        self,
+        repo_url: str,
+        branch: str = DEFAULT_BRANCH,
+        path: str = DEFAULT_MIRROR_DIR,
+        teams_dir: str = DEFAULT_TEAMS_DIR,
+        refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+        token: Optional[str] = None,
+    ):
+        self.repo_url = repo_url
+        self.branch = branch
+        self.path = path
+        self.teams_dir = teams_dir.strip("/")
+        self.refresh_seconds = refresh_seconds
+        self._token = token
+        self._index = {}
+        self._commit = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"syncs": 0, "sync_errors": 0, "files_parsed": 0}
+
+    @classmethod
+    def from_env(cls) -> Optional["RepoMirror"]:
+        """Builds the mirror from GITOPS_* environment variables, None if no repo is set."""
+        repo_url = os.getenv("GITOPS_REPO_URL")
+        if not repo_url:
+            return None
+        return cls(
+            repo_url=repo_url,
+            branch=os.getenv("GITOPS_REPO_BRANCH", DEFAULT_BRANCH),
+            path=os.getenv("GITOPS_MIRROR_DIR", DEFAULT_MIRROR_DIR),
+            teams_dir=os.getenv("GITOPS_TEAMS_DIR", DEFAULT_TEAMS_DIR),
+            refresh_seconds=float(os.getenv("GITOPS_MIRROR_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)),
+            token=os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN"),
+        )
+
+    @property
+    def commit(self) -> Optional[str]:
+        return self._commit
+
+    def entries(self) -> list:
+        """Returns the index entries, syncing first if the mirror is due a refresh."""
+        self.ensure_fresh()
+        with self._lock:
+            return list(self._index.values())
+
+    def ensure_fresh(self) -> None:
+        """Syncs the mirror if it was last synced more than refresh_seconds ago.
+
+        A failed sync keeps serving the previous index; it only raises when
+        there is no index at all.
+        """
+        if time.monotonic() - self._synced_at < self.refresh_seconds and self._commit is not None:
+            return
+        with self._lock:
+            if time.monotonic() - self._synced_at < self.refresh_seconds and self._commit is not None:
+                return
+            try:
+                self._sync()
+            except (OSError, subprocess.SubprocessError) as e:
+                self._counters["sync_errors"] += 1
+                # Retry on the next refresh rather than on every query.
+                self._synced_at = time.monotonic()
+                if self._commit is None:
+                    raise
+                logger.warning("Could not refresh the GitOps mirror, serving %s: %s", self._commit[:12], e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                commit=self._commit,
+                files=len(self._index),
+                age_seconds=round(time.monotonic() - self._synced_at, 1) if self._commit else None,
+            )
+
+    def _git(self, *args: str, cwd: Optional[str] = None) -> str:
+        env = None
+        if self._token:
+            # Sent as a header from the environment, so the token is neither in
+            # .git/config nor on the command line that git errors repeat.
+            credentials = base64.b64encode(f"x-access-token:{self._token}".encode()).decode()
+            env = dict(
+                os.environ,
+                GIT_CONFIG_COUNT="1",
+                GIT_CONFIG_KEY_0="http.extraHeader",
+                GIT_CONFIG_VALUE_0=f"Authorization: Basic {credentials}",
+            )
+        try:
+            result = subprocess.run(
+                ["git", *args],
+                cwd=cwd or self.path,
+                capture_output=True,
+                text=True,
+                timeout=GIT_TIMEOUT_SECONDS,
+                check=True,
+                env=env,
+            )
+        except subprocess.CalledProcessError as e:
+            raise GitError(f"git {args[0]} failed: {(e.stderr or '').strip()}") from None
+        except subprocess.TimeoutExpired:
+            raise GitError(f"git {args[0]} timed out after {GIT_TIMEOUT_SECONDS}s") from None
+        return result.stdout
+
+    def _sync(self) -> None:
+        if not os.path.isdir(os.path.join(self.path, ".git")):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._git(
+                "clone", "--depth", "1", "--single-branch", "--branch", self.branch,
+                self.repo_url, self.path, cwd=os.path.dirname(self.path) or ".",
+            )
+            previous = None
+        else:
+            previous = self._git("rev-parse", "HEAD").strip()
+            self._git("fetch", "--depth", "1", "origin", self.branch)
+            self._git("reset", "--hard", "--quiet", "FETCH_HEAD")
+        head = self._git("rev-parse", "HEAD").strip()
+        self._counters["syncs"] += 1
+        self._synced_at = time.monotonic()
+        if head == self._commit:
+            return
+        if self._commit is None and self._load_saved_index(head):
+            return
+        if self._commit is not None and previous == self._commit:
+            self._update_index(previous, head)
+        else:
+            self._rebuild_index()
+        self._commit = head
+        self._save_index()
+
+    def _values_paths(self) -> list:
+        output = self._git("ls-files", "--", f"{self.teams_dir}/*/*/*/*/values.yaml", f"{self.teams_dir}/*/*/*/*/values.yml")
+        return [line for line in output.splitlines() if line]
+
+    def _parse(self, path: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.path, path), encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        self._counters["files_parsed"] += 1
+        return index_values(path, text, self.teams_dir)
+
+    def _rebuild_index(self) -> None:
+        index = {}
+        for path in self._values_paths():
+            entry = self._parse(path)
+            if entry is not None:
+                index[path] = entry
+        self._index = index
+
+    def _update_index(self, old: str, new: str) -> None:
+        try:
+            changed = self._git("diff", "--name-only", old, new, "--", self.teams_dir).splitlines()
+        except GitError:
+            # The old commit is gone, e.g. after a force push.
+            self._rebuild_index()
+            return
+        for path in changed:
+            entry = self._parse(path)
+            if entry is None:
+                self._index.pop(path, None)
+            else:
+                self._index[path] = entry
+
+    def _index_file(self) -> str:
+        return self.path.rstrip("/") + ".index.json"
+
+    def _load_saved_index(self, head: str) -> bool:
+        try:
+            with open(self._index_file(), encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("version") != INDEX_VERSION or saved.get("commit") != head:
+            return False
+        self._index = saved["entries"]
+        self._commit = head
+        return True
+
+    def _save_index(self) -> None:
+        data = {"version": INDEX_VERSION, "commit": self._commit, "entries": self._index}
+        tmp = self._index_file() + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self._index_file())
+        except OSError as e:
+            logger.warning("Could not save the GitOps index: %s", e)
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_repo_mirror() -> Optional[RepoMirror]:
+    """Returns the process-wide mirror, or None if GITOPS_REPO_URL is not set."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = RepoMirror.from_env()
+        return _mirror
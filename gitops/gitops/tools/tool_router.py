@@ -0,0 +1,285 @@
+"""Loads the agent's tools by family, as the conversation needs them.
+
+With every toolset registered directly, each model call carries the
+declarations of 12 ArgoCD, 21 GitHub and 10 local tools plus a 200-line
+instruction. Most requests, values changes across teams, need a handful of
+them. ``ToolRouter`` is a toolset wrapping all the others; on every model
+call it exposes:
+
+* the core tools: fleet queries, file reads, change plans and commits,
+  application status, and ``load_tools``;
+* the families named in ``FAMILIES`` that are loaded for the rest of the
+  session: by the model through ``load_tools``, or when a user message
+  mentions them (``FAMILY_HINTS``, e.g. "logs" or "sync"). ``remember_hints``,
+  the agent's ``before_agent_callback``, stores hinted families in the
+  session state, so the tools of calls already in the history stay declared
+  on later turns.
+
+``instruction`` is the matching instruction provider: ``core_instruction``
+plus the sections of the loaded families. Tools no family names are core.
+
+Declarations are also trimmed: indentation is collapsed, ``Returns:``
+sections are dropped, and schema titles and examples are removed, since
+they do not help the model call a tool.
+
+GITOPS_TOOL_ROUTING=false exposes everything with the full instruction;
+GITOPS_TOOL_FAMILIES preloads families ("all" for every family).
+"""
+import os
+import re
+import weakref
+from typing import Optional
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools.tool_context import ToolContext
+
+from .. import telemetry
+
+STATE_KEY = "tool_families"
+CORE = "core"
+MAX_DESCRIPTION_CHARS = 1200
+MAX_PARAMETER_DESCRIPTION_CHARS = 200
+
+FAMILIES = {
+    "files": ["get_file", "list_files", "create_or_update_file", "create_branch", "validate_helm_values"],
+    "pull_requests": [
+        "list_pull_requests",
+        "get_pull_request",
+        "create_pull_request",
+        "update_pull_request",
+        "merge_pull_request",
+        "update_pull_request_branch",
+        "pull_request_review_write",
+        "add_comment_to_pending_review",
+        "request_copilot_review",
+        "create_pull_request_with_copilot",
+    ],
+    "issues": ["search_issues", "list_issues", "get_issue"],
+    "code_search": ["search_code", "search_repositories"],
+    "argocd_ops": [
+        "create_application",
+        "update_application",
+        "delete_application",
+        "sync_application",
+        "wait_for_application",
+        "get_resource_actions",
+        "run_resource_action",
+    ],
+    "troubleshooting": [
+        "get_application_tree",
+        "get_application_resource_tree",
+        "get_application_managed_resources",
+        "get_resource_events",
+        "search_workload_logs",
+        "get_application_workload_logs",
+    ],
+}
+
+# Families a user message clearly needs, loaded without a load_tools call.
+FAMILY_HINTS = {
+    "files": re.compile(
+        r"\b(templates?|chart\.yaml|statefulset|daemonset|cronjob|workload type|convert|chart version|appVersion|helm chart)\b",
+        re.IGNORECASE,
+    ),
+    "pull_requests": re.compile(r"\b(pull requests?|PRs?|merge|review|approve)\b", re.IGNORECASE),
+    "issues": re.compile(r"\b(issues?|tickets?)\b", re.IGNORECASE),
+    "code_search": re.compile(r"\b(search|grep|references?|usages?)\b", re.IGNORECASE),
+    "argocd_ops": re.compile(r"\b(sync\w*|deploy\w*|roll ?out|rollback|argo ?cd|promot\w*)\b", re.IGNORECASE),
+    "troubleshooting": re.compile(
+        r"\b(logs?|crash\w*|broken|fail\w*|errors?|unhealthy|degraded|troubleshoot\w*|debug\w*|events?|pods?)\b",
+        re.IGNORECASE,
+    ),
+}
+
+_TOOL_FAMILIES = {name: family for family, names in FAMILIES.items() for name in names}
+
+
+def family_of(tool_name: str) -> str:
+    return _TOOL_FAMILIES.get(tool_name, CORE)
+
+
+def hinted_families(text: str) -> set:
+    """The families whose hints match a user message."""
+    return {family for family, hint in FAMILY_HINTS.items() if hint.search(text or "")}
+
+
+def _message_text(content) -> str:
+    return " ".join(part.text for part in getattr(content, "parts", None) or [] if getattr(part, "text", None))
+
+
+def routing_enabled() -> bool:
+    return os.getenv("GITOPS_TOOL_ROUTING", "true").lower() not in ("0", "false", "no", "off")
+
+
+def preloaded_families() -> set:
+    names = {name.strip() for name in os.getenv("GITOPS_TOOL_FAMILIES", "").split(",") if name.strip()}
+    return set(FAMILIES) if "all" in names else names & set(FAMILIES)
+
+
+def trim_description(text: str, limit: int = MAX_DESCRIPTION_CHARS) -> str:
+    """Collapses a docstring's indentation and drops its Returns/Raises sections."""
+    text = re.split(r"\n\s*(?:Returns|Raises|Yields|Example|Examples):", text or "")[0]
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    text = re.sub(r"\n{2,}", "\n", text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind(".\n"))
+    return cut[: end + 1] if end > limit // 2 else cut.rstrip() + "..."
+
+
+def _trim_schema(schema) -> None:
+    if schema is None:
+        return
+    for field in ("title", "example"):
+        if getattr(schema, field, None) is not None:
+            setattr(schema, field, None)
+    if getattr(schema, "description", None):
+        schema.description = trim_description(schema.description, MAX_PARAMETER_DESCRIPTION_CHARS)
+    for child in (getattr(schema, "properties", None) or {}).values():
+        _trim_schema(child)
+    _trim_schema(getattr(schema, "items", None))
+    for child in getattr(schema, "any_of", None) or []:
+        _trim_schema(child)
+
+
+def trim_declaration(declaration):
+    """Returns a copy of a FunctionDeclaration with shorter descriptions and no titles or examples."""
+    if declaration is None:
+        return None
+    declaration = declaration.model_copy(deep=True)
+    declaration.description = trim_description(declaration.description or "")
+    _trim_schema(declaration.parameters)
+    return declaration
+
+
+class TrimmedTool(BaseTool):
+    """Declares a tool with its trimmed declaration and runs the tool itself."""
+
+    def __init__(self, tool: BaseTool):
+        super().__init__(
+            name=tool.name,
+            description=trim_description(tool.description),
+            is_long_running=tool.is_long_running,
+        )
+        self.tool = tool
+        self._declaration = None
+
+    def _get_declaration(self):
+        if self._declaration is None:
+            self._declaration = trim_declaration(self.tool._get_declaration())
+        return self._declaration
+
+    async def run_async(self, *, args: dict, tool_context: ToolContext):
+        return await self.tool.run_async(args=args, tool_context=tool_context)
+
+
+async def load_tools(families: list[str], tool_context: ToolContext) -> dict:
+    """Makes more tool families available for the rest of the conversation.
+
+    Args:
+        families (list[str]): Any of "files", "pull_requests", "issues",
+            "code_search", "argocd_ops" and "troubleshooting".
+
+    Returns:
+        dict: status and the families now loaded.
+    """
+    unknown = [family for family in families if family not in FAMILIES]
+    if unknown:
+        return {
+            "status": "error",
+            "error_message": f"Unknown tool families {unknown}; choose from {sorted(FAMILIES)}",
+        }
+    loaded = sorted(set(tool_context.state.get(STATE_KEY) or []) | set(families))
+    tool_context.state[STATE_KEY] = loaded
+    for family in families:
+        telemetry.count("tool_router.loads", family=family)
+    return {"status": "success", "loaded": loaded}
+
+
+class ToolRouter(BaseToolset):
+    """Toolset exposing the core tools plus the loaded families of the tools it wraps.
+
+    Args:
+        tools (list): Toolsets, tools and functions, as an agent's ``tools``.
+        instruction (str): Instruction for the core tools.
+        family_instructions (dict): Instruction section per family.
+        full_instruction (str): Instruction used when routing is off.
+    """
+
+    def __init__(
+        self,
+        tools: list,
+        instruction: str,
+        family_instructions: Optional[dict] = None,
+        full_instruction: Optional[str] = None,
+    ):
+        super().__init__()
+        self._tools = [tool if isinstance(tool, (BaseTool, BaseToolset)) else FunctionTool(tool) for tool in tools]
+        self._load_tool = FunctionTool(load_tools)
+        self._core_instruction = instruction
+        self._family_instructions = family_instructions or {}
+        self._full_instruction = full_instruction or instruction
+        self._trimmed = weakref.WeakKeyDictionary()
+
+    @property
+    def tools(self) -> list:
+        """The wrapped toolsets and tools, functions wrapped in FunctionTool."""
+        return list(self._tools)
+
+    def active_families(self, readonly_context) -> set:
+        """Core, preloaded, loaded in the session state, and hinted by the current user message."""
+        if not routing_enabled() or readonly_context is None:
+            return {CORE} | set(FAMILIES)
+        families = {CORE} | preloaded_families() | set(readonly_context.state.get(STATE_KEY) or [])
+        return families | hinted_families(_message_text(getattr(readonly_context, "user_content", None)))
+
+    def remember_hints(self, callback_context) -> None:
+        """Agent ``before_agent_callback`` that loads the families the user's message hints at for the session."""
+        if not routing_enabled():
+            return None
+        loaded = set(callback_context.state.get(STATE_KEY) or [])
+        hinted = hinted_families(_message_text(callback_context.user_content)) - loaded
+        if hinted:
+            callback_context.state[STATE_KEY] = sorted(loaded | hinted)
+            for family in hinted:
+                telemetry.count("tool_router.hints", family=family)
+        return None
+
+    async def get_tools(self, readonly_context=None) -> list:
+        families = self.active_families(readonly_context)
+        tools = []
+        for tool in self._tools:
+            if isinstance(tool, BaseToolset):
+                tools.extend(await tool.get_tools(readonly_context))
+            else:
+                tools.append(tool)
+        selected = [tool for tool in tools if family_of(tool.name) in families]
+        if not routing_enabled():
+            return selected
+        if families != {CORE} | set(FAMILIES):
+            selected.append(self._load_tool)
+        return [self._trim(tool) for tool in selected]
+
+    def instruction(self, readonly_context) -> str:
+        """Agent instruction provider matching the exposed tools."""
+        if not routing_enabled():
+            return self._full_instruction
+        families = self.active_families(readonly_context)
+        sections = [self._family_instructions[family] for family in FAMILIES
+                    if family in families and family in self._family_instructions]
+        return self._core_instruction + "".join(sections)
+
+    async def close(self) -> None:
+        for tool in self._tools:
+            if isinstance(tool, BaseToolset):
+                await tool.close()
+
+    def _trim(self, tool: BaseTool) -> BaseTool:
+        trimmed = self._trimmed.get(tool)
+        if trimmed is None:
+            trimmed = self._trimmed[tool] = TrimmedTool(tool)
+        return trimmed
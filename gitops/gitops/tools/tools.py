@@ -1,15 +1,52 @@
 import os
 
-from google.adk.tools.mcp_tool import MCPToolset, StreamableHTTPConnectionParams
+from google.adk.tools.mcp_tool import StreamableHTTPConnectionParams
 from google.adk.tools.mcp_tool.mcp_session_manager import StdioConnectionParams
 # from kubernetes_tools import MCPToolset, StreamableHTTPConnectionParams, HTTPServerParameters
 from mcp import StdioServerParameters
 
 from dotenv import load_dotenv
 
+from .. import telemetry
+from .argocd_state import argocd_state_enabled
+from .github_cache import CachedGitHubTool
+from .mcp_pool import PooledMCPToolset
+from .workload_logs import log_search_enabled
+
 load_dotenv()
 
-argocd_tools = MCPToolset(
+
+class InstrumentedMCPToolset(PooledMCPToolset):
+    """Pooled MCP toolset that traces tool listing and tags its tools with an upstream.
+
+    The tool calls themselves are traced by the agent's tool callbacks, see
+    ``gitops.telemetry``.
+    """
+
+    def __init__(self, *, upstream: str, **kwargs):
+        super().__init__(name=upstream, **kwargs)
+        self.upstream = upstream
+
+    async def get_tools(self, readonly_context=None):
+        with telemetry.span("mcp list_tools", upstream=self.upstream):
+            tools = await super().get_tools(readonly_context)
+        for tool in tools:
+            telemetry.set_tool_upstream(tool.name, self.upstream)
+        return tools
+
+
+# Replaced by the watched state cache (argocd_state.py) when it is enabled.
+ARGOCD_READ_TOOLS = [] if argocd_state_enabled() else [
+    "list_applications",
+    "get_application",
+    "get_application_resource_tree",
+]
+
+# Replaced by search_workload_logs (workload_logs.py) when it is enabled.
+ARGOCD_LOG_TOOLS = [] if log_search_enabled() else ["get_application_workload_logs"]
+
+argocd_tools = InstrumentedMCPToolset(
+    upstream="argocd",
     connection_params=StreamableHTTPConnectionParams(
         url="http://localhost:3000/mcp/",
         headers={
@@ -19,15 +56,13 @@ argocd_tools = MCPToolset(
     ),
     # Read only tools
     tool_filter=[
-        "list_applications",
-        "get_application",
+        *ARGOCD_READ_TOOLS,
         "create_application",
         "update_application",
         "delete_application",
         "sync_application",
-        "get_application_resource_tree",
         "get_application_managed_resources",
-        "get_application_workload_logs",
+        *ARGOCD_LOG_TOOLS,
         "get_resource_events",
         "get_resource_actions",
         "run_resource_action",
@@ -71,7 +106,10 @@ argocd_tools = MCPToolset(
 #     ],
 # )
 
-github_tools = MCPToolset(
+github_tools = InstrumentedMCPToolset(
+    upstream="github",
+    # Reads are served from the read cache, writes invalidate it.
+    tool_class=CachedGitHubTool,
     errlog=None,    
     connection_params=StreamableHTTPConnectionParams(
         url="https://api.githubcopilot.com/mcp/",
@@ -0,0 +1,388 @@
+"""Log search over ArgoCD's workload log stream, summarized by pattern.
+
+``get_application_workload_logs`` returns whole log blobs, megabytes for a
+busy workload, all of which lands in the model's context.
+``search_workload_logs`` reads ``/api/v1/applications/{name}/logs`` as a
+stream instead and keeps only a summary:
+
+* the time window goes to ArgoCD (``sinceSeconds``/``sinceTime``,
+  ``untilTime``), and so does a literal search pattern (``filter``); regular
+  expressions and the minimum level are applied while streaming;
+* matching lines are reduced to patterns, with numbers, ids, addresses and
+  timestamps replaced by placeholders, and counted per pattern and level;
+* at most GITOPS_LOG_SCAN_LINES lines or GITOPS_LOG_SCAN_BYTES bytes are read
+  per call; if the window holds more, the result carries a ``cursor`` that
+  continues after the last line read.
+
+A call therefore returns a few kilobytes whatever the log volume.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import requests
+
+REQUEST_TIMEOUT_SECONDS = 30.0
+DEFAULT_SCAN_LINES = 20000
+DEFAULT_SCAN_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+MAX_TRACKED_PATTERNS = 1000
+MAX_EXAMPLE_CHARS = 300
+MAX_PODS_PER_PATTERN = 5
+LEVELS = {"trace": 0, "debug": 10, "info": 20, "warn": 30, "error": 40, "fatal": 50}
+LEVEL_ALIASES = {
+    "trc": "trace",
+    "dbg": "debug",
+    "information": "info",
+    "notice": "info",
+    "warning": "warn",
+    "wrn": "warn",
+    "err": "error",
+    "severe": "error",
+    "critical": "fatal",
+    "crit": "fatal",
+    "panic": "fatal",
+    "emergency": "fatal",
+}
+_LEVEL_WORD = re.compile(
+    r"\b(trace|trc|debug|dbg|info|information|notice|warn|warning|wrn|error|err|severe|fatal|critical|crit|panic)\b",
+    re.IGNORECASE,
+)
+_MESSAGE_KEYS = ("msg", "message", "log", "error")
+_LEVEL_KEYS = ("level", "severity", "lvl", "levelname")
+_PLACEHOLDERS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<uuid>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\b[a-z0-9-]+-[a-f0-9]{5,10}-[a-z0-9]{5}\b"), "<pod>"),
+    (re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{8,}\b"), "<hex>"),
+    (re.compile(r"\b\d+(?:\.\d+)?(?:ns|us|µs|ms|s|m|h|b|kb|mb|gb|%)?\b", re.IGNORECASE), "<num>"),
+]
+
+
+class LogQueryError(Exception):
+    """A log query or cursor is invalid."""
+
+
+def canonical_level(word: str) -> Optional[str]:
+    word = str(word).lower()
+    word = LEVEL_ALIASES.get(word, word)
+    return word if word in LEVELS else None
+
+
+def parse_line(content: str) -> tuple:
+    """Returns (level, message) of a log line, reading JSON-structured lines by field."""
+    stripped = content.strip()
+    if stripped.startswith("{"):
+        try:
+            record = json.loads(stripped)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            message = next((str(record[key]) for key in _MESSAGE_KEYS if key in record), stripped)
+            level = next((canonical_level(record[key]) for key in _LEVEL_KEYS if key in record), None)
+            return level or "info", message
+    match = _LEVEL_WORD.search(stripped[:120])
+    return (canonical_level(match.group(1)) if match else None) or "info", stripped
+
+
+def line_pattern(message: str) -> str:
+    """Replaces the variable parts of a log message with placeholders."""
+    for expression, placeholder in _PLACEHOLDERS:
+        message = expression.sub(placeholder, message)
+    return message[:MAX_EXAMPLE_CHARS]
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Parses ArgoCD's RFC 3339 log timestamps, which carry up to nanoseconds."""
+    if not value:
+        return None
+    match = re.match(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})?$", value)
+    if not match:
+        return None
+    moment, fraction, zone = match.groups()
+    text = f"{moment}.{(fraction or '0')[:6].ljust(6, '0')}{'+00:00' if zone in (None, 'Z') else zone}"
+    return datetime.fromisoformat(text).astimezone(timezone.utc)
+
+
+def encode_cursor(query: dict, after: datetime, skip: int) -> str:
+    state = dict(query, after=after.isoformat(), skip=skip)
+    return base64.urlsafe_b64encode(json.dumps(state, sort_keys=True).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        state["after"] = datetime.fromisoformat(state["after"])
+        return state
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise LogQueryError(f"Invalid cursor: {e}") from e
+
+
+class PatternSummary:
+    """Counts log lines per (level, pattern), in the order patterns first appear."""
+
+    def __init__(self, max_patterns: int = MAX_TRACKED_PATTERNS):
+        self.max_patterns = max_patterns
+        self.patterns = {}
+        self.untracked = 0
+
+    def add(self, level: str, message: str, pod: str, timestamp: str) -> None:
+        key = (level, line_pattern(message))
+        entry = self.patterns.get(key)
+        if entry is None:
+            if len(self.patterns) >= self.max_patterns:
+                self.untracked += 1
+                return
+            entry = self.patterns[key] = {
+                "level": level,
+                "pattern": key[1],
+                "count": 0,
+                "first_seen": timestamp,
+                "example": message[:MAX_EXAMPLE_CHARS],
+                "pods": [],
+            }
+        entry["count"] += 1
+        entry["last_seen"] = timestamp
+        if pod and pod not in entry["pods"] and len(entry["pods"]) < MAX_PODS_PER_PATTERN:
+            entry["pods"].append(pod)
+
+    def top(self, limit: int) -> list:
+        """The most frequent patterns, most severe first among equal counts."""
+        ranked = sorted(self.patterns.values(), key=lambda entry: (-entry["count"], -LEVELS[entry["level"]]))
+        return ranked[:limit]
+
+
+def _literal(pattern: str) -> bool:
+    return bool(pattern) and not re.search(r"[.^$*+?{}\[\]\\|()]", pattern)
+
+
+def _session() -> tuple:
+    base_url = os.getenv("ARGOCD_BASE_URL")
+    if not base_url:
+        raise LogQueryError("ARGOCD_BASE_URL is not set")
+    session = requests.Session()
+    session.verify = os.getenv("ARGOCD_INSECURE", "false").lower() not in ("1", "true", "yes", "on")
+    token = os.getenv("ARGOCD_API_TOKEN")
+    if token:
+        session.headers["Authorization"] = f"Bearer {token}"
+    return session, base_url.rstrip("/")
+
+
+def log_search_enabled() -> bool:
+    """Whether ``search_workload_logs`` replaces the MCP server's log tool."""
+    return bool(os.getenv("ARGOCD_BASE_URL")) and os.getenv("ARGOCD_LOG_SEARCH_ENABLED", "true").lower() not in (
+        "0", "false", "no", "off",
+    )
+
+
+def stream_log_entries(
+    session: requests.Session, base_url: str, query: dict, after: Optional[datetime]
+) -> Iterator[tuple]:
+    """Yields each ArgoCD log entry (content, timeStamp, podName) with its size, as it arrives.
+
+    A line that is not a JSON object with an object ``result``, e.g. from a
+    proxy's error page, is yielded as None.
+    """
+    params = {"namespace": query["namespace"], "follow": "false"}
+    for field, param in (("container", "container"), ("pod", "podName"), ("kind", "kind"), ("group", "group"),
+                         ("resource_name", "resourceName")):
+        if query.get(field):
+            params[param] = query[field]
+    if query.get("previous"):
+        params["previous"] = "true"
+    if after is not None:
+        params["sinceTime.seconds"] = str(int(after.timestamp()))
+    elif query.get("since_seconds"):
+        params["sinceSeconds"] = str(query["since_seconds"])
+    if query.get("until"):
+        params["untilTime"] = query["until"]
+    if query.get("server_filter"):
+        params["filter"] = query["server_filter"]
+        params["matchCase"] = "true"
+    with session.get(
+        f"{base_url}/api/v1/applications/{query['application']}/logs",
+        params=params,
+        stream=True,
+        timeout=REQUEST_TIMEOUT_SECONDS,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(chunk_size=STREAM_CHUNK_BYTES):
+            line = line.strip()
+            if line.startswith(b"data:"):
+                line = line[5:].strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+            entry = (event.get("result") or {}) if isinstance(event, dict) else None
+            yield entry if isinstance(entry, dict) else None, len(line)
+
+
+def search_logs(query: dict, cursor_state: Optional[dict] = None, max_patterns: int = 20, max_lines: int = 0) -> dict:
+    """Streams the logs a query selects and summarizes them; the body of ``search_workload_logs``."""
+    regex = re.compile(query["pattern"]) if query.get("pattern") else None
+    minimum = LEVELS[query["level"]] if query.get("level") else None
+    until = parse_timestamp(query.get("until", ""))
+    after = cursor_state["after"] if cursor_state else None
+    skip = cursor_state["skip"] if cursor_state else 0
+    scan_lines = int(os.getenv("GITOPS_LOG_SCAN_LINES", DEFAULT_SCAN_LINES))
+    scan_bytes = int(os.getenv("GITOPS_LOG_SCAN_BYTES", DEFAULT_SCAN_BYTES))
+
+    summary = PatternSummary()
+    lines = []
+    scanned = matched = size = malformed = 0
+    last, last_count = after, skip
+    complete = True
+    session, base_url = _session()
+    with session:
+        for entry, entry_size in stream_log_entries(session, base_url, query, after):
+            if entry is None:
+                malformed += 1
+                continue
+            if entry.get("last"):
+                break
+            moment = parse_timestamp(entry.get("timeStampStr") or entry.get("timeStamp") or "")
+            if after is not None and moment is not None:
+                # sinceTime has second precision: drop what the previous page already read.
+                if moment < after:
+                    continue
+                if moment == after and skip > 0:
+                    skip -= 1
+                    continue
+            if until is not None and moment is not None and moment > until:
+                break
+            if scanned >= scan_lines or size >= scan_bytes:
+                complete = False
+                break
+            scanned += 1
+            size += entry_size
+            if moment is not None:
+                last_count = last_count + 1 if moment == last else 1
+                last = moment
+            content = entry.get("content") or ""
+            level, message = parse_line(content)
+            if minimum is not None and LEVELS[level] < minimum:
+                continue
+            if regex is not None and not regex.search(content):
+                continue
+            matched += 1
+            timestamp = entry.get("timeStampStr") or entry.get("timeStamp") or ""
+            summary.add(level, message, entry.get("podName", ""), timestamp)
+            if len(lines) < max_lines:
+                lines.append(f"{timestamp} {entry.get('podName', '')} {content[:MAX_EXAMPLE_CHARS]}")
+
+    if malformed and not scanned:
+        return {
+            "status": "error",
+            "error_message": f"The log stream held no log entries, only {malformed} line(s) that are not ArgoCD log JSON.",
+        }
+    result = {
+        "status": "success",
+        "scanned_lines": scanned,
+        "scanned_kib": round(size / 1024, 1),
+        "matched_lines": matched,
+        "distinct_patterns": len(summary.patterns) + (1 if summary.untracked else 0),
+        "patterns": summary.top(max_patterns),
+        "complete": complete,
+    }
+    if summary.untracked:
+        result["untracked_lines"] = summary.untracked
+    if malformed:
+        result["malformed_lines"] = malformed
+    if lines:
+        result["lines"] = lines
+    if not complete and last is not None:
+        result["cursor"] = encode_cursor(query, last, last_count)
+    return result
+
+
+async def search_workload_logs(
+    application: str,
+    namespace: str,
+    resource_name: str = "",
+    kind: str = "",
+    pod: str = "",
+    container: str = "",
+    pattern: str = "",
+    level: str = "",
+    since_minutes: int = 60,
+    until: str = "",
+    previous: bool = False,
+    max_patterns: int = 20,
+    max_lines: int = 0,
+    cursor: str = "",
+) -> dict:
+    """Searches an ArgoCD application's workload logs and returns deduplicated message patterns with counts.
+
+    Use this instead of fetching whole logs. Each pattern is a log message with
+    its numbers, ids, addresses and timestamps replaced by placeholders, with
+    how often it occurred, its level, first and last time and an example.
+
+    Args:
+        application (str): ArgoCD application name.
+        namespace (str): Namespace of the workload.
+        resource_name (str): Only this resource, e.g. a Deployment name, together with kind.
+        kind (str): Kind of resource_name, e.g. "Deployment" or "StatefulSet".
+        pod (str): Only this pod.
+        container (str): Only this container.
+        pattern (str): Only lines matching this regular expression.
+        level (str): Minimum level: "debug", "info", "warn", "error" or "fatal".
+        since_minutes (int): How far back to search.
+        until (str): RFC 3339 end of the window, e.g. "2025-06-01T12:00:00Z"; now if empty.
+        previous (bool): Logs of the previous, crashed container instance.
+        max_patterns (int): Patterns to return, most frequent first.
+        max_lines (int): Also return up to this many matching raw lines.
+        cursor (str): The cursor of a previous result, to continue where it stopped. The
+            other filters are then taken from the cursor.
+
+    Returns:
+        dict: status, lines scanned and matched, the patterns, and a cursor
+        when the window holds more lines than one call reads.
+    """
+    if not log_search_enabled():
+        return {
+            "status": "error",
+            "error_message": "Log search is disabled. Set ARGOCD_BASE_URL, or use get_application_workload_logs.",
+        }
+    try:
+        if cursor:
+            cursor_state = decode_cursor(cursor)
+            query = {key: value for key, value in cursor_state.items() if key not in ("after", "skip")}
+        else:
+            cursor_state = None
+            if level and canonical_level(level) is None:
+                raise LogQueryError(f"Unknown level {level!r}; use debug, info, warn, error or fatal")
+            if until and parse_timestamp(until) is None:
+                raise LogQueryError(f"until must be an RFC 3339 time, e.g. 2025-06-01T12:00:00Z, not {until!r}")
+            if pattern:
+                re.compile(pattern)
+            query = {
+                "application": application,
+                "namespace": namespace,
+                "resource_name": resource_name,
+                "kind": kind,
+                "group": "apps" if kind in ("Deployment", "StatefulSet", "DaemonSet", "ReplicaSet") else "",
+                "pod": pod,
+                "container": container,
+                "pattern": pattern,
+                "server_filter": pattern if _literal(pattern) else "",
+                "level": canonical_level(level) if level else "",
+                "since_seconds": max(int(since_minutes), 1) * 60,
+                "until": until,
+                "previous": previous,
+            }
+        return await asyncio.to_thread(search_logs, query, cursor_state, max_patterns, max_lines)
+    except re.error as e:
+        return {"status": "error", "error_message": f"Invalid pattern: {e}"}
+    except LogQueryError as e:
+        return {"status": "error", "error_message": str(e)}
+    except requests.exceptions.RequestException as e:
+        return {"status": "error", "error_message": f"Could not read the logs: {e}"}
@@ -0,0 +1,114 @@
+"""Tests for the in-process Helm template renderer.
+
+The expected outputs are what Go's text/template renders for the same
+template and data. Run from the gitops directory:
+
+    python -m unittest discover tests
+"""
+import unittest
+
+from gitops.tools.helm_template import Renderer, Struct, TemplateError, parse, value_paths
+
+
+def render(text: str, data=None, name: str = "test.yaml") -> str:
+    return Renderer(parse(name, text)).render(name, data if data is not None else {})
+
+
+class VariableScopeTest(unittest.TestCase):
+    def test_assignment_in_range_and_if_is_kept(self):
+        text = '{{ $found := false }}{{ range .l }}{{ if eq . "b" }}{{ $found = true }}{{ end }}{{ end }}{{ $found }}'
+        self.assertEqual(render(text, {"l": ["a", "b"]}), "true")
+
+    def test_assignment_in_if_is_kept(self):
+        self.assertEqual(render("{{ $x := 1 }}{{ if true }}{{ $x = 2 }}{{ end }}{{ $x }}"), "2")
+
+    def test_assignment_in_with_and_else_is_kept(self):
+        self.assertEqual(render("{{ $x := 1 }}{{ with .a }}{{ $x = . }}{{ end }}{{ $x }}", {"a": "z"}), "z")
+        text = '{{ $x := "o" }}{{ with .a }}{{ else }}{{ $x = "e" }}{{ end }}{{ $x }}'
+        self.assertEqual(render(text, {"a": None}), "e")
+
+    def test_assignment_accumulates_across_iterations(self):
+        text = '{{ $s := "" }}{{ range .l }}{{ $s = print $s . }}{{ end }}{{ $s }}'
+        self.assertEqual(render(text, {"l": ["x", "y", "z"]}), "xyz")
+        text = "{{ $a := 1 }}{{ range .l }}{{ range . }}{{ $a = . }}{{ end }}{{ end }}{{ $a }}"
+        self.assertEqual(render(text, {"l": [[1, 2], [3]]}), "3")
+
+    def test_assignment_from_range_variables(self):
+        text = "{{ $n := 0 }}{{ range $i, $v := .l }}{{ $n = $i }}{{ end }}{{ $n }}"
+        self.assertEqual(render(text, {"l": [5, 6, 7]}), "2")
+
+    def test_assignment_before_break(self):
+        text = '{{ $x := "" }}{{ range .l }}{{ if eq . "b" }}{{ break }}{{ end }}{{ $x = . }}{{ end }}{{ $x }}'
+        self.assertEqual(render(text, {"l": ["a", "b", "c"]}), "a")
+
+    def test_declaration_shadows_inside_the_block_only(self):
+        self.assertEqual(render("{{ $x := 1 }}{{ if true }}{{ $x := 2 }}{{ $x }}{{ end }}{{ $x }}"), "21")
+        self.assertEqual(render("{{ $x := 1 }}{{ range .l }}{{ $x := . }}{{ end }}{{ $x }}", {"l": [9]}), "1")
+        self.assertEqual(render('{{ $v := "out" }}{{ range $v := .l }}{{ end }}{{ $v }}', {"l": [1]}), "out")
+
+    def test_declaration_in_body_lasts_one_iteration(self):
+        self.assertEqual(render("{{ range .l }}{{ $y := . }}{{ $y }}{{ end }}", {"l": [1, 2]}), "12")
+
+    def test_block_pipeline_declaration(self):
+        self.assertEqual(render("{{ with $v := .a }}{{ $v }}{{ end }}", {"a": "q"}), "q")
+        self.assertEqual(render("{{ if $v := .a }}{{ $v }}{{ else }}none{{ end }}", {"a": ""}), "none")
+
+    def test_undeclared_variables_are_errors(self):
+        with self.assertRaisesRegex(TemplateError, r"undefined variable \$x"):
+            render("{{ $x = 1 }}")
+        with self.assertRaises(TemplateError):
+            render("{{ if true }}{{ $z := 1 }}{{ end }}{{ $z }}")
+
+
+class RenderTest(unittest.TestCase):
+    def test_range_over_map_is_sorted_by_key(self):
+        text = "{{ range $k, $v := .m }}{{ $k }}={{ $v }};{{ end }}"
+        self.assertEqual(render(text, {"m": {"b": 2, "a": 1}}), "a=1;b=2;")
+
+    def test_range_else(self):
+        self.assertEqual(render("{{ range .l }}x{{ else }}empty{{ end }}", {"l": []}), "empty")
+
+    def test_trim_markers_and_comments(self):
+        self.assertEqual(render("a  {{- /* note */ -}}  b\n{{- 1 }}"), "ab1")
+
+    def test_define_and_include(self):
+        text = '{{ define "name" }}{{ .Values.name | default "app" }}{{ end }}name: {{ include "name" . | quote }}'
+        self.assertEqual(render(text, {"Values": {}}), 'name: "app"')
+        self.assertEqual(render(text, {"Values": {"name": "web"}}), 'name: "web"')
+
+    def test_to_yaml_and_nindent(self):
+        text = "labels:{{ toYaml .Values.labels | nindent 2 }}"
+        self.assertEqual(render(text, {"Values": {"labels": {"app": "web", "tier": "front"}}}), "labels:\n  app: web\n  tier: front")
+
+    def test_unknown_struct_field_is_an_error(self):
+        with self.assertRaisesRegex(TemplateError, "test.yaml:2"):
+            render("ok\n{{ .Chart.Missing }}", {"Chart": Struct(Name="app")})
+
+    def test_nil_pointer_is_an_error(self):
+        with self.assertRaisesRegex(TemplateError, r"nil pointer evaluating \.Values\.a"):
+            render("{{ .Values.a.b }}", {"Values": {}})
+
+    def test_unknown_function_is_a_parse_or_render_error(self):
+        with self.assertRaises(TemplateError):
+            render("{{ nosuchfunction 1 }}")
+
+    def test_unclosed_block_is_an_error(self):
+        with self.assertRaisesRegex(TemplateError, "unclosed if"):
+            parse("test.yaml", "{{ if true }}x")
+
+
+class ValuePathsTest(unittest.TestCase):
+    def test_collects_values_fields(self):
+        templates = parse(
+            "test.yaml",
+            "{{ .Values.image.tag }}{{ if .Values.enabled }}{{ $.Values.name }}{{ end }}"
+            "{{ with .Values.labels }}{{ . }}{{ end }}{{ .Release.Name }}",
+        )
+        self.assertEqual(
+            value_paths(templates),
+            {("image", "tag"), ("enabled",), ("name",), ("labels",)},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()